@@ -3,62 +3,335 @@ Main orchestration script for DroneDeploy GTM Exercise
 Can run as single pipeline or in stages for better control
 """
 import asyncio
+import contextlib
+import json
 import sys
 import time
 from pathlib import Path
 
-# Import stage modules
-from utils.stage1_classify import classify_all_speakers
-from utils.stage2_generate import generate_all_emails
-from utils.stage3_export import export_to_csv
+from utils import profiling, run_ledger
+
+# Stage modules are imported inside the command that needs them, so that
+# --help, --status and --export never load BeautifulSoup, Tavily or the LLM SDKs
+
+
+def get_option_value(flag: str):
+    """Return the float value following a command line flag, or None if absent"""
+    if flag in sys.argv:
+        index = sys.argv.index(flag)
+        if index + 1 < len(sys.argv):
+            return float(sys.argv[index + 1])
+        raise ValueError(f"{flag} requires a value")
+    return None
+
+
+def create_budget():
+    """Build a RunBudget from --deadline/--max-cost, or None if neither is set"""
+    deadline = get_option_value("--deadline")
+    max_cost = get_option_value("--max-cost")
+    if deadline is None and max_cost is None:
+        return None
+    
+    from utils.scheduler import RunBudget
+    return RunBudget(deadline=deadline, max_cost=max_cost)
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Profile (with --profile) and record a pipeline stage in the run ledger"""
+    with profiling.stage(name), run_ledger.stage(name):
+        yield
+
+
+def export_options() -> dict:
+    """Export keyword arguments from --delta, --delta-format and --snapshot"""
+    if "--delta" not in sys.argv:
+        return {}
+    delta_format = "csv"
+    if "--delta-format" in sys.argv:
+        index = sys.argv.index("--delta-format")
+        if index + 1 >= len(sys.argv):
+            raise ValueError("--delta-format requires a value")
+        delta_format = sys.argv[index + 1]
+    return {"delta": True, "delta_format": delta_format, "snapshot": "--snapshot" in sys.argv}
 
 
 async def run_all_stages():
     """Run all stages sequentially"""
+    from utils.stage1_classify import classify_all_speakers
+    from utils.stage2_generate import generate_all_emails
+    from utils.email_qa import qa_emails
+    from utils.stage3_export import export_to_csv
+    
+    budget = create_budget()
+    
     print("🚀 DroneDeploy GTM Email Generation Pipeline")
     print("=" * 70)
-    print("Running all stages: Classification → Email Generation → Export")
+    print("Running all stages: Classification → Email Generation → QA → Export")
     print("=" * 70)
     
     total_start = time.time()
     
     # Stage 1: Classification
     print("\n" + "🏷️ " * 20)
-    await classify_all_speakers(resume=False, batch_size=10)
+    with stage("stage1_classify"):
+        await classify_all_speakers(resume="--resume" in sys.argv, batch_size=10, budget=budget,
+                                    speculate="--speculate" in sys.argv,
+                                    incremental="--incremental" in sys.argv)
     
     # Stage 2: Email Generation
     print("\n" + "✉️ " * 20)
-    await generate_all_emails(resume=False, batch_size=15)
+    with stage("stage2_generate"):
+        await generate_all_emails(resume="--resume" in sys.argv, batch_size=15, budget=budget,
+                                  incremental="--incremental" in sys.argv)
+    
+    # Stage 2b: Email QA (regenerates only failing emails)
+    print("\n" + "🔎 " * 20)
+    with stage("stage2_qa"):
+        await qa_emails(regenerate="--check-only" not in sys.argv, budget=budget)
     
     # Stage 3: Export
     print("\n" + "📝 " * 20)
-    export_to_csv()
+    with stage("stage3_export"):
+        export_to_csv(**export_options())
     
     # Final summary
     total_elapsed = time.time() - total_start
     print("\n" + "=" * 70)
     print("🎉 PIPELINE COMPLETE!")
     print(f"⏱️  Total time: {total_elapsed:.1f} seconds ({total_elapsed/60:.1f} minutes)")
+    if budget:
+        print(f"💰 Budget: {budget.summary()}")
+        if budget.stopped:
+            print("⏹️  Stopped early on budget; run again with --resume to continue")
     print("📊 Check out/email_list.csv for final results")
     print("=" * 70)
 
 
 async def run_classification_only():
     """Run only classification stage"""
+    from utils.stage1_classify import classify_all_speakers
+    
     print("🏷️  Running Classification Only")
-    await classify_all_speakers(resume="--resume" in sys.argv, batch_size=10)
+    with stage("stage1_classify"):
+        await classify_all_speakers(resume="--resume" in sys.argv, batch_size=10, budget=create_budget(),
+                                    speculate="--speculate" in sys.argv,
+                                    incremental="--incremental" in sys.argv)
 
 
 async def run_email_generation_only():
     """Run only email generation stage"""
+    from utils.stage2_generate import generate_all_emails
+    
     print("✉️  Running Email Generation Only")
-    await generate_all_emails(resume="--resume" in sys.argv, batch_size=15)
+    with stage("stage2_generate"):
+        await generate_all_emails(resume="--resume" in sys.argv, batch_size=15, budget=create_budget(),
+                                  incremental="--incremental" in sys.argv)
+
+
+async def run_qa_only():
+    """Run only the email QA stage"""
+    from utils.email_qa import qa_emails
+    
+    print("🔎 Running Email QA Only")
+    with stage("stage2_qa"):
+        await qa_emails(regenerate="--check-only" not in sys.argv, budget=create_budget())
 
 
 def run_export_only():
     """Run only export stage"""
+    from utils.stage3_export import export_to_csv
+    
     print("📝 Running Export Only")
-    export_to_csv()
+    with stage("stage3_export"):
+        export_to_csv(**export_options())
+
+
+def run_status():
+    """Print progress of each stage from its output files (no provider imports)"""
+    print("📋 Pipeline Status")
+    print("=" * 70)
+    
+    stage_files = [
+        ("Stage 1 checkpoint", Path("out/checkpoint_classify.json")),
+        ("Stage 1 output", Path("out/speakers_classified.json")),
+        ("Stage 2 checkpoint", Path("out/checkpoint_emails.json")),
+        ("Stage 2 output", Path("out/speakers_with_emails.json")),
+    ]
+    
+    for label, path in stage_files:
+        if not path.exists():
+            print(f"   {label}: not found ({path})")
+            continue
+        
+        with open(path, 'r') as f:
+            data = json.load(f)
+        
+        if isinstance(data, dict):
+            # Checkpoints store results (stage 1) or processed ids (stage 2)
+            count = len(data.get('results', data.get('processed', [])))
+        else:
+            count = len(data)
+        
+        modified = time.strftime('%Y-%m-%d %H:%M', time.localtime(path.stat().st_mtime))
+        print(f"   {label}: {count} speakers ({path}, updated {modified})")
+    
+    qa_file = Path("out/email_qa.json")
+    if qa_file.exists():
+        with open(qa_file, 'r') as f:
+            qa = json.load(f)
+        print(f"   Email QA: {qa['checked']} checked, {qa['regenerated']} regenerated, "
+              f"{len(qa['still_failing'])} still failing ({qa_file})")
+    
+    csv_file = Path("out/email_list.csv")
+    if csv_file.exists():
+        modified = time.strftime('%Y-%m-%d %H:%M', time.localtime(csv_file.stat().st_mtime))
+        print(f"   Stage 3 output: {csv_file} (updated {modified})")
+    else:
+        print(f"   Stage 3 output: not found ({csv_file})")
+    
+    manifest_file = Path("out/export_manifest.json")
+    if manifest_file.exists():
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        exported = time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest.get('exported_at', 0)))
+        print(f"   Stage 3 delta manifest: {len(manifest.get('rows', {}))} rows (last delta {exported})")
+    
+    send_log = Path("out/send_log.db")
+    if send_log.exists():
+        import sqlite3
+        conn = sqlite3.connect(str(send_log))
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM sends GROUP BY status").fetchall())
+        conn.close()
+        print(f"   Stage 4 deliveries: {counts} ({send_log})")
+    
+    ledger_file = Path(run_ledger.DEFAULT_DB_PATH)
+    if ledger_file.exists():
+        ledger = run_ledger.RunLedger(str(ledger_file))
+        runs = ledger.runs(limit=1)
+        ledger.close()
+        if runs:
+            last = runs[0]
+            started = time.strftime('%Y-%m-%d %H:%M', time.localtime(last['started_at']))
+            print(f"   Last run: #{last['run_id']} {last['command']} ({last['status']}, {started}; "
+                  f"compare with --compare) ({ledger_file})")
+    
+    print("=" * 70)
+
+
+def run_compare():
+    """Compare two recorded runs (--compare [A B], default: the last two)"""
+    index = sys.argv.index("--compare")
+    run_ids = [arg for arg in sys.argv[index + 1:index + 3] if not arg.startswith("--")]
+    if len(run_ids) == 1:
+        raise ValueError("--compare takes two run ids (or none for the last two runs)")
+    run_ledger.compare_runs(*(int(run_id) for run_id in run_ids))
+
+
+async def run_service():
+    """Run the long-lived HTTP service with warm caches"""
+    from utils.service import serve
+    
+    port = get_option_value("--port")
+    await serve(port=int(port) if port is not None else 8080)
+
+
+def get_queue_path() -> str:
+    """Return the --queue database path (default out/work_queue.db)"""
+    if "--queue" in sys.argv:
+        index = sys.argv.index("--queue")
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+        raise ValueError("--queue requires a value")
+    return "out/work_queue.db"
+
+
+def run_distributed():
+    """Run classification and email generation across local worker processes, then export"""
+    from utils.work_queue import run_distributed
+    from utils.stage3_export import export_to_csv
+    
+    workers = get_option_value("--workers")
+    with stage("distributed"):
+        run_distributed(workers=int(workers) if workers is not None else 4, db_path=get_queue_path())
+    with stage("stage3_export"):
+        export_to_csv(**export_options())
+
+
+async def run_worker():
+    """Run a single queue worker (several can share one queue, across hosts)"""
+    from utils.work_queue import run_worker
+    
+    with stage("worker"):
+        await run_worker(db_path=get_queue_path())
+
+
+async def run_streaming():
+    """Run classification and email generation as one bounded-memory stream, then export"""
+    from utils.stream_pipeline import run_streaming
+    from utils.stage3_export import export_to_csv
+    
+    with stage("stream"):
+        output_file = await run_streaming(resume="--resume" in sys.argv, batch_size=10)
+    with stage("stage3_export"):
+        export_to_csv(output_file, **export_options())
+
+
+def run_plan():
+    """Estimate calls, tokens, cost and wall time per stage without calling any provider"""
+    from utils.planner import plan_run
+    
+    plan_run(resume="--resume" in sys.argv, incremental="--incremental" in sys.argv)
+
+
+def get_option_list(flag: str) -> list:
+    """Return the values following a command line flag, up to the next --option"""
+    if flag not in sys.argv:
+        return []
+    values = []
+    for arg in sys.argv[sys.argv.index(flag) + 1:]:
+        if arg.startswith("--"):
+            break
+        values.append(arg)
+    if not values:
+        raise ValueError(f"{flag} requires at least one value")
+    return values
+
+
+async def run_multi_event():
+    """Run stages 1-3 (with QA) for several events concurrently with shared caches"""
+    from utils.multi_event import run_events
+    
+    with stage("multi_event"):
+        await run_events(get_option_list("--events"), resume="--resume" in sys.argv,
+                         incremental="--incremental" in sys.argv, speculate="--speculate" in sys.argv,
+                         budget=create_budget(), regenerate="--check-only" not in sys.argv,
+                         export_options=export_options())
+
+
+def get_recipients_path() -> str:
+    """Return the --recipients CSV path (default in/recipients.csv)"""
+    if "--recipients" in sys.argv:
+        index = sys.argv.index("--recipients")
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+        raise ValueError("--recipients requires a value")
+    return "in/recipients.csv"
+
+
+async def run_send():
+    """Send generated emails over SMTP (Stage 4); never re-sends to a speaker"""
+    from utils.stage4_send import send_all_emails, DEFAULT_CONNECTIONS, DEFAULT_DOMAIN_RATE
+    
+    connections = get_option_value("--connections")
+    domain_rate = get_option_value("--domain-rate")
+    print("📤 Running Email Delivery")
+    with stage("stage4_send"):
+        await send_all_emails(
+            recipients_file=get_recipients_path(),
+            connections=int(connections) if connections is not None else DEFAULT_CONNECTIONS,
+            domain_rate=domain_rate if domain_rate is not None else DEFAULT_DOMAIN_RATE
+        )
 
 
 def print_usage():
@@ -73,21 +346,74 @@ Options:
   (no args)     Run all stages (default)
   --classify    Run classification only (Stage 1)
   --generate    Run email generation only (Stage 2)
+  --qa          Run email QA only: rule checks (booth #42, free gift, session,
+                3-4 sentences) and near-duplicate detection, then regenerate only
+                failing emails with the failure reasons (part of the default run;
+                add --check-only to report without regenerating)
   --export      Run CSV export only (Stage 3)
+  --delta       Export only rows inserted, updated or deleted since the last delta
+                export to out/deltas/ (manifest: out/export_manifest.json); add
+                --snapshot to also rewrite out/email_list.csv
+  --delta-format csv|jsonl  Delta file format (default csv)
   --resume      Resume from last checkpoint (use with stage options)
+  --incremental Recompute only speakers whose inputs changed (page, enrichment,
+                prompt template, model, temperature); changes cascade to emails
+  --status      Show progress of each stage from its output files
+  --plan        Dry run: estimate calls, tokens, cost and time per stage from the
+                caches, real prompt sizes and recorded latency (no API calls;
+                combine with --resume / --incremental)
+  --deadline N  Stop cleanly (with checkpoint) after about N seconds
+  --max-cost N  Stop cleanly once estimated API spend would exceed $N
+  --speculate   Draft emails during classification for near-certain Builders/Owners
+  --serve       Run as an HTTP service with warm caches (see --port, default 8080)
+  --distributed Run stages 1-2 across worker processes via a lease-based queue
+                (see --workers, default 4, and --queue, default out/work_queue.db)
+  --worker      Join a distributed run as an extra worker (e.g. on another host)
+  --events DIR [DIR ...]
+                Run several events (scraped page roots) concurrently with shared
+                enrichment/classification caches; outputs go to out/events/<name>/
+                (includes QA; --check-only, --delta and --snapshot apply to every event)
+  --stream      Stream speakers through all stages at a fixed memory ceiling
+                (writes out/speakers_with_emails.jsonl; combine with --resume)
+  --send        Send the generated emails over SMTP (Stage 4, never part of the
+                default run); recipients come from --recipients (default
+                in/recipients.csv), sends are logged in out/send_log.db
+  --connections N  Persistent SMTP connections / max concurrent sends (default 10)
+  --domain-rate N  Max messages per second per recipient domain (default 10)
+  --compare [A B]  Compare throughput, LLM latency, tokens, cache hit rates and
+                cost per stage between two recorded runs (default: the last two);
+                every run is recorded in out/run_ledger.db
+  --profile     Write per-stage CPU profiles, event-loop lag, blocking stacks and
+                awaited vs blocked time per call site to out/profile/<timestamp>/
   --help        Show this help message
 
 Examples:
   python main.py                    # Run complete pipeline
   python main.py --classify         # Classify all speakers
   python main.py --generate --resume # Resume email generation
+  python main.py --qa --check-only  # Report email defects without LLM calls
   python main.py --export           # Export to CSV
+  python main.py --export --delta --delta-format jsonl # Changed rows for a CRM upsert
+  python main.py --status           # Check what has been produced so far
+  python main.py --plan             # Estimate cost and time before running
+  python main.py --compare          # What changed between the last two runs
+  python main.py --compare 12 15    # Compare run #12 with run #15
+  python main.py --deadline 540     # Fit a 10-minute environment limit
+  python main.py --serve --port 9000 # Serve single-speaker/bulk requests
+  python main.py --distributed --workers 8
+  python main.py --events in/dcw2025/scraped_pages in/geo2025/scraped_pages
+  python main.py --worker --queue /shared/work_queue.db
+  python main.py --send --recipients in/recipients.csv
 
 Stages can be run independently:
   1. Classification creates: out/speakers_classified.json
   2. Email generation creates: out/speakers_with_emails.json
+     QA (--qa) fixes it in place and reports to: out/email_qa.json
   3. Export creates: out/email_list.csv
+  4. Delivery (--send only) records each send in: out/send_log.db
 
+Speakers most likely to be Builders/Owners are classified first, so a run
+stopped by --deadline or --max-cost has already reached the valuable speakers.
 For very large runs, consider running stages separately to avoid timeouts.
     """)
 
@@ -102,15 +428,65 @@ async def main():
         print_usage()
         return
     
-    if "--classify" in sys.argv:
-        await run_classification_only()
-    elif "--generate" in sys.argv:
-        await run_email_generation_only()
-    elif "--export" in sys.argv:
-        run_export_only()
-    else:
-        # Default: run all stages
-        await run_all_stages()
+    if "--status" in sys.argv:
+        run_status()
+        return
+    
+    if "--plan" in sys.argv:
+        run_plan()
+        return
+    
+    if "--compare" in sys.argv:
+        run_compare()
+        return
+    
+    profiler = None
+    if "--profile" in sys.argv:
+        profiler = profiling.Profiler()
+        profiler.start()
+    
+    # Every run is recorded in out/run_ledger.db (compare runs with --compare)
+    commands = ["--serve", "--distributed", "--worker", "--events", "--stream", "--classify",
+                "--generate", "--qa", "--export", "--send"]
+    command = next((flag[2:] for flag in commands if flag in sys.argv), "all")
+    run_ledger.start(command, run_ledger.run_config())
+    status, error = "failed", None
+    
+    try:
+        if "--serve" in sys.argv:
+            await run_service()
+        elif "--distributed" in sys.argv:
+            run_distributed()
+        elif "--worker" in sys.argv:
+            await run_worker()
+        elif "--events" in sys.argv:
+            await run_multi_event()
+        elif "--stream" in sys.argv:
+            await run_streaming()
+        elif "--classify" in sys.argv:
+            await run_classification_only()
+        elif "--generate" in sys.argv:
+            await run_email_generation_only()
+        elif "--qa" in sys.argv:
+            await run_qa_only()
+        elif "--export" in sys.argv:
+            run_export_only()
+        elif "--send" in sys.argv:
+            await run_send()
+        else:
+            # Default: run all stages
+            await run_all_stages()
+        status = "ok"
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        status = "interrupted"
+        raise
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        run_ledger.finish(status, error)
+        if profiler:
+            profiler.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+"""
+Offline stand-ins for the Tavily and OpenAI clients
+install() patches them into the pipeline; run as a script, this module installs them
+and then runs main.py with its own arguments (used to start stub queue workers).
+Every LLM call is appended to $STUB_CALL_LOG as "<schema>\t<speaker or company>".
+"""
+import json
+import os
+import re
+import sys
+import time
+import types
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+EMAIL_BODY = ("Hi {name}, your work at {company} caught our eye ahead of Digital Construction Week. "
+              "DroneDeploy helps teams capture site progress from the air in minutes. "
+              "Stop by booth #42 for a live demo and pick up a free gift. "
+              "Hope to see you there.")
+
+
+def _log_call(schema: str, content: str):
+    log_file = os.getenv("STUB_CALL_LOG")
+    if not log_file:
+        return
+    subject = re.search(r"^(?:- Name|Company): (.+)$", content, re.MULTILINE)
+    with open(log_file, 'a') as f:
+        f.write(f"{schema}\t{subject.group(1) if subject else ''}\n")
+
+
+class _Response:
+    def __init__(self, content: str):
+        message = types.SimpleNamespace(content=content, refusal=None)
+        self.choices = [types.SimpleNamespace(message=message, finish_reason="stop")]
+        self.usage = types.SimpleNamespace(prompt_tokens=500, completion_tokens=60, prompt_tokens_details=None)
+
+
+class _Completions:
+    def create(self, **kwargs):
+        schema = kwargs["response_format"]["json_schema"]["name"]
+        content = kwargs["messages"][-1]["content"]
+        _log_call(schema, content)
+        time.sleep(0.01)
+        if schema == "classify_company":
+            return _Response(json.dumps({"category": "Builder", "reasoning": "Contractor.", "confidence": 0.9}))
+        name = re.search(r"- Name: ([^\n]+)", content).group(1)
+        company = re.search(r"- Company: ([^\n]+)", content).group(1)
+        return _Response(json.dumps({"subject": f"{company} at booth #42",
+                                     "body": EMAIL_BODY.format(name=name.split()[0], company=company)}))
+
+
+class FakeOpenAI:
+    def __init__(self, *args, **kwargs):
+        self.chat = types.SimpleNamespace(completions=_Completions())
+
+
+class FakeTavily:
+    def __init__(self, api_key=None):
+        pass
+
+    def search(self, query, **kwargs):
+        return {"results": [{"title": f"{query[:40]} news", "url": f"https://example.com/{abs(hash(query))}",
+                             "content": "The contractor delivers infrastructure projects across the UK."}]}
+
+
+def install():
+    """Patch the stub clients into the pipeline (call before creating any client)"""
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["TAVILY_API_KEY"] = "stub"
+    os.environ.pop("ANTHROPIC_API_KEY", None)
+    import tavily
+    tavily.TavilyClient = FakeTavily
+    from utils.classifier import CompanyClassifier
+    from utils.email_generator import EmailGenerator
+    CompanyClassifier._init_llm_client = lambda self: FakeOpenAI()
+    EmailGenerator._init_llm_client = lambda self: FakeOpenAI()
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(REPO_ROOT))
+    install()
+    import asyncio
+    import main
+    asyncio.run(main.main())
@@ -0,0 +1,18 @@
+"""Delta files from exports in the same second never overwrite each other"""
+import pandas as pd
+
+from utils.delta_export import write_delta
+
+
+def test_deltas_written_in_the_same_second_get_distinct_files(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.delta_export.time.strftime", lambda fmt: "20261019-120000")
+    first = pd.DataFrame({"Change": ["insert"], "Speaker ID": ["speaker-1"]})
+    second = pd.DataFrame({"Change": ["update"], "Speaker ID": ["speaker-1"]})
+
+    files = [write_delta(first, tmp_path), write_delta(second, tmp_path), write_delta(first, tmp_path, "jsonl")]
+
+    assert [f.name for f in files] == ["email_list_delta_20261019-120000.csv",
+                                       "email_list_delta_20261019-120000-2.csv",
+                                       "email_list_delta_20261019-120000.jsonl"]
+    assert pd.read_csv(files[0])["Change"].tolist() == ["insert"]
+    assert pd.read_csv(files[1])["Change"].tolist() == ["update"]
@@ -0,0 +1,80 @@
+"""Tavily enrichment off the event loop"""
+import asyncio
+import time
+
+import pytest
+
+import stub_clients
+from utils.enrichment import CompanyEnricher
+
+SEARCH_SECONDS = 0.3
+
+
+@pytest.fixture
+def enricher(tmp_path, monkeypatch):
+    stub_clients.install()
+    queries = []
+
+    def slow_search(self, query, **kwargs):
+        queries.append(query)
+        time.sleep(SEARCH_SECONDS)
+        return {"results": [{"title": f"{query} news", "content": "A contractor.", "url": query}]}
+
+    monkeypatch.setattr(stub_clients.FakeTavily, "search", slow_search)
+    enricher = CompanyEnricher(cache_dir=str(tmp_path))
+    enricher.queries = queries
+    return enricher
+
+
+def test_searches_overlap_and_same_company_is_searched_once(enricher):
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            enricher.enrich_company("Mace", "Ann Lee", "Director"),
+            enricher.enrich_company("Mace Ltd", "Bo Ray", "Engineer"),
+            enricher.enrich_company("Skanska", "Cy Fox", "Manager"),
+        )
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+
+    assert len(enricher.queries) == 2
+    assert elapsed < 2 * SEARCH_SECONDS
+    assert results[1]["speaker_name"] == "Bo Ray" and results[1]["job_title"] == "Engineer"
+    assert results[1]["search_results"] == results[0]["search_results"]
+
+
+def test_event_loop_stays_responsive_during_a_search(enricher):
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while not search.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        search = asyncio.ensure_future(enricher.enrich_company("Mace", "Ann Lee", "Director"))
+        await asyncio.gather(search, ticker())
+        return ticks
+
+    assert asyncio.run(run()) >= SEARCH_SECONDS / 0.01 / 2
+
+
+def test_shared_enrichment_keeps_the_speakers_own_company(enricher):
+    async def run():
+        await enricher.enrich_speakers_batch([
+            {"name": "Ann Lee", "company": "Jacobs UK", "job_title": "Director"},
+            {"name": "Bo Ray", "company": "Turner & Townsend", "job_title": "Engineer"},
+        ])
+        return await enricher.enrich_speakers_batch([
+            {"name": "Cy Fox", "company": "Jacobs", "job_title": "Manager"},
+            {"name": "Di Poe", "company": "Turner and Townsend", "job_title": "Surveyor"},
+        ])
+
+    jacobs, turner = asyncio.run(run())
+
+    assert len(enricher.queries) == 2
+    assert jacobs["company"] == "Jacobs" and jacobs["job_title"] == "Manager"
+    assert turner["company"] == "Turner and Townsend" and turner["job_title"] == "Surveyor"
+    assert jacobs["search_results"] and turner["search_results"]
@@ -0,0 +1,24 @@
+"""Evidence selection for classification prompts"""
+from utils.evidence import EVIDENCE_TOKEN_BUDGET, estimate_tokens, select_evidence
+
+NO_CUES = [{
+    "title": "Quarterly update from the holding company",
+    "content": "Revenue grew in the third quarter. The board appointed a new chair in May. "
+               "Shares rose on the news across European markets. Dividends were held steady for the year.",
+}]
+
+
+def test_no_cue_hits_fill_budget_in_result_order():
+    evidence = select_evidence(NO_CUES, "Zeta Holdings")
+    assert evidence == ["Quarterly update from the holding company", "Revenue grew in the third quarter.",
+                        "The board appointed a new chair in May.", "Shares rose on the news across European markets.",
+                        "Dividends were held steady for the year."]
+
+
+def test_matching_snippets_come_first_and_fit_budget():
+    results = NO_CUES + [{"title": "Zeta Holdings signs DroneDeploy partnership",
+                          "content": "Zeta Holdings is a general contractor. " * 40}]
+    evidence = select_evidence(results, "Zeta Holdings")
+    assert evidence[0] == "Zeta Holdings signs DroneDeploy partnership"
+    assert "Revenue grew in the third quarter." not in evidence
+    assert sum(estimate_tokens(snippet) for snippet in evidence) <= EVIDENCE_TOKEN_BUDGET
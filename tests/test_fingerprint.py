@@ -0,0 +1,37 @@
+"""Email fingerprints follow the panel context that the prompt shows"""
+import pytest
+
+import stub_clients
+from utils.email_generator import EmailGenerator
+from utils.fingerprint import email_fingerprint
+from utils.parser import build_session_index
+
+SESSION = {"title": "Digital twins on site", "url": "https://example.com/sessions/twins"}
+
+
+@pytest.fixture(autouse=True)
+def stubs():
+    stub_clients.install()
+
+
+def fingerprint_of(speakers):
+    generator = EmailGenerator()
+    generator.add_sessions(build_session_index(speakers))
+    return email_fingerprint(speakers[0], generator)
+
+
+def panel(*companies):
+    return [{"speaker_id": f"s{i}", "name": f"Speaker {i}", "company": company, "category": "Builder",
+             "sessions": [SESSION]} for i, company in enumerate(companies)]
+
+
+def test_unchanged_panel_keeps_fingerprint():
+    assert fingerprint_of(panel("Mace", "Skanska")) == fingerprint_of(panel("Mace", "Skanska"))
+
+
+def test_new_panelist_changes_fingerprint():
+    assert fingerprint_of(panel("Mace", "Skanska")) != fingerprint_of(panel("Mace", "Skanska", "Balfour Beatty"))
+
+
+def test_copanelist_company_change_changes_fingerprint():
+    assert fingerprint_of(panel("Mace", "Skanska")) != fingerprint_of(panel("Mace", "Laing O'Rourke"))
@@ -0,0 +1,59 @@
+"""Incremental stage 1: reused classifications keep company-level fan-out"""
+import asyncio
+
+import pytest
+
+import stub_clients
+from utils.classifier import CompanyClassifier
+from utils.fingerprint import classification_fingerprint
+
+
+@pytest.fixture(autouse=True)
+def stubs():
+    stub_clients.install()
+
+
+def enriched(name, company, page_hash, url):
+    return {"speaker_id": name.lower().replace(" ", "-"), "name": name, "company": company,
+            "job_title": "Director", "page_hash": page_hash,
+            "search_results": [{"title": f"{company} news", "content": "A main contractor.", "url": url}]}
+
+
+def first_run(tmp_path):
+    classifier = CompanyClassifier(cache_dir=str(tmp_path))
+    speakers = [enriched("Ann Lee", "Mace", "a1", "https://example.com/mace-1"),
+                enriched("Bo Ray", "Mace Ltd", "b1", "https://example.com/mace-2")]
+    classified = asyncio.run(classifier.classify_batch(speakers))
+    for speaker in classified:
+        speaker['classification_fingerprint'] = classifier.input_fingerprint(speaker)
+    return classifier, {s['speaker_id']: s for s in classified}
+
+
+def test_fanned_out_speaker_is_fingerprinted_over_the_shared_enrichment(tmp_path):
+    classifier, previous = first_run(tmp_path)
+
+    assert classifier.llm_calls == 1 and classifier.fanouts == 1
+    # The company was classified from Ann Lee's search results, not Bo Ray's own
+    bo_ray = previous['bo-ray']
+    assert bo_ray['classification_fingerprint'] == classification_fingerprint(bo_ray, previous['ann-lee'], classifier)
+    assert bo_ray['classification_fingerprint'] != classification_fingerprint(bo_ray, bo_ray, classifier)
+
+
+def test_changed_coworker_fans_out_from_a_reused_result(tmp_path):
+    _, previous = first_run(tmp_path)
+    rerun = CompanyClassifier(cache_dir=None)
+
+    ann_lee = enriched("Ann Lee", "Mace", "a1", "https://example.com/mace-1")
+    bo_ray = enriched("Bo Ray", "Mace Ltd", "b2", "https://example.com/mace-2")  # page changed
+    assert rerun.reuse_previous(ann_lee, previous['ann-lee'], ann_lee)
+    assert not rerun.reuse_previous(bo_ray, previous['bo-ray'], bo_ray)
+
+    [classified] = asyncio.run(rerun.classify_batch([bo_ray]))
+
+    assert rerun.llm_calls == 0 and rerun.cache_hits == 0 and rerun.fanouts == 1
+    assert classified['category'] == previous['ann-lee']['category']
+    # The next run reuses Bo Ray too: fingerprinted over the enrichment Ann Lee's result came from
+    classified['classification_fingerprint'] = rerun.input_fingerprint(classified)
+    next_run = CompanyClassifier(cache_dir=None)
+    assert next_run.reuse_previous(ann_lee, previous['ann-lee'], ann_lee)
+    assert next_run.reuse_previous(bo_ray, classified, bo_ray)
@@ -0,0 +1,25 @@
+"""Local category prediction used for prioritisation and speculation"""
+import pytest
+
+from utils.scheduler import predict_category
+from utils.speculative import SPECULATION_THRESHOLD
+
+
+@pytest.mark.parametrize("company", ["Pharmaceutical Research Ltd", "Sisko Partners", "Bamboo Interiors",
+                                     "Graphenea", "Vincit Advisory"])
+def test_keywords_inside_other_words_do_not_match(company):
+    category, confidence = predict_category(company)
+    assert category != "Builder" and confidence < SPECULATION_THRESHOLD
+
+
+@pytest.mark.parametrize("company, category", [
+    ("Mace", "Builder"),
+    ("John Sisk & Son", "Builder"),
+    ("BAM Nuttall", "Builder"),
+    ("Kier Group", "Customer"),
+    ("Laing O’Rourke", "Customer"),
+    ("Severn Trent", "Owner"),
+    ("Loughborough University’s School of Civil Engineering", "Partner"),
+])
+def test_whole_word_matches(company, category):
+    assert predict_category(company)[0] == category
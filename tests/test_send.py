@@ -0,0 +1,97 @@
+"""Stage 4 delivery against a local aiosmtpd server"""
+import asyncio
+import csv
+import json
+import socket
+import sqlite3
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from utils.stage4_send import STATUS_BOUNCED, STATUS_SENT, send_all_emails
+
+BOUNCE_ADDRESS = "gone@bounce.example"
+
+
+class RecordingHandler:
+    """Accepts every recipient except BOUNCE_ADDRESS (550) and keeps the delivered messages"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == BOUNCE_ADDRESS:
+            return "550 5.1.1 Mailbox does not exist"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos[0], envelope.content.decode('utf-8')))
+        return "250 Message accepted for delivery"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_FROM", "gtm@dronedeploy.example")
+    for name in ("SMTP_USERNAME", "SMTP_PASSWORD", "SMTP_STARTTLS", "SMTP_TEST_DOMAIN"):
+        monkeypatch.delenv(name, raising=False)
+    yield handler
+    controller.stop()
+
+
+def write_inputs(tmp_path):
+    speakers = [
+        {"speaker_id": f"speaker-{i}", "name": f"Speaker {i}",
+         "email_subject": f"Speaker {i} at booth #42", "email_body": f"Hi Speaker {i}, see you at the show."}
+        for i in range(5)
+    ]
+    speakers.append({"speaker_id": "speaker-no-email", "name": "No Email", "email_subject": "", "email_body": ""})
+    input_file = tmp_path / "speakers_with_emails.json"
+    input_file.write_text(json.dumps(speakers))
+
+    recipients_file = tmp_path / "recipients.csv"
+    with open(recipients_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["speaker_id", "email"])
+        for i in range(4):
+            writer.writerow([f"speaker-{i}", f"speaker{i}@builder{i % 2}.example"])
+        writer.writerow(["speaker-4", BOUNCE_ADDRESS])
+        writer.writerow(["speaker-no-email", "noemail@builder0.example"])
+    return input_file, recipients_file
+
+
+def send(tmp_path, input_file, recipients_file):
+    return asyncio.run(send_all_emails(input_file=str(input_file), recipients_file=str(recipients_file),
+                                       ledger_path=str(tmp_path / "send_log.db"), connections=2, domain_rate=0))
+
+
+def test_delivery_rerun_and_bounce(tmp_path, monkeypatch, smtp_server):
+    monkeypatch.chdir(tmp_path)
+    input_file, recipients_file = write_inputs(tmp_path)
+
+    counts = send(tmp_path, input_file, recipients_file)
+
+    assert counts == {STATUS_SENT: 4, STATUS_BOUNCED: 1}
+    delivered = dict(smtp_server.messages)
+    assert set(delivered) == {f"speaker{i}@builder{i % 2}.example" for i in range(4)}
+    assert "Subject: Speaker 0 at booth #42" in delivered["speaker0@builder0.example"]
+    assert "Message-ID: <speaker-0." in delivered["speaker0@builder0.example"]
+
+    # Rerun: every speaker is already settled, so nothing is sent again
+    assert send(tmp_path, input_file, recipients_file) == counts
+    assert len(smtp_server.messages) == 4
+
+    conn = sqlite3.connect(str(tmp_path / "send_log.db"))
+    bounce = conn.execute("SELECT recipient, status, attempts, smtp_code, error FROM sends WHERE speaker_id = ?",
+                          ("speaker-4",)).fetchone()
+    conn.close()
+    assert bounce[:4] == (BOUNCE_ADDRESS, STATUS_BOUNCED, 1, 550)
+    assert "Mailbox does not exist" in bounce[4]
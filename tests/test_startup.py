@@ -0,0 +1,42 @@
+"""Startup cost of the light commands: no API client or HTML parser imports"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+MAIN = Path(__file__).resolve().parent.parent / "main.py"
+
+HEAVY_MODULES = ("openai", "anthropic", "tavily", "bs4")
+
+# Cumulative import time of main.py and everything it loads, in microseconds
+IMPORT_BUDGET_US = 1_000_000
+
+
+def import_times(tmp_path: Path, flag: str) -> dict:
+    """Run main.py under -X importtime and return {module: cumulative microseconds}"""
+    result = subprocess.run([sys.executable, "-X", "importtime", str(MAIN), flag], cwd=tmp_path,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("flag", ["--help", "--status"])
+def test_light_commands_skip_heavy_imports(tmp_path, flag):
+    times = import_times(tmp_path, flag)
+    modules = {name.strip() for name in times}
+
+    loaded = sorted(m for m in modules if m.split(".")[0] in HEAVY_MODULES)
+    assert not loaded, f"{flag} imported {loaded}"
+
+    # Top-level imports have a single space of indent; nested ones are counted inside them
+    total = sum(us for name, us in times.items() if not name.startswith("  "))
+    assert total < IMPORT_BUDGET_US, f"{flag} spent {total / 1000:.0f} ms importing modules"
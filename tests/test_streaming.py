@@ -0,0 +1,89 @@
+"""Streaming readers and the bounded-memory streaming pipeline"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from utils.streaming import iter_json_array
+
+TESTS_DIR = Path(__file__).resolve().parent
+
+# Runs the streaming pipeline over <count> synthetic speakers with the stub clients and the
+# rate-limit delays removed, then prints the peak RSS of the process (KiB on Linux)
+STREAM_SCRIPT = """
+import asyncio
+import resource
+import sys
+
+import stub_clients
+stub_clients.install()
+_sleep = asyncio.sleep
+asyncio.sleep = lambda delay, *args: _sleep(0, *args)
+
+from utils.parser import SpeakerParser
+from utils.stream_pipeline import run_streaming
+
+count = int(sys.argv[1])
+
+def synthetic_speakers(self):
+    for i in range(count):
+        yield {"speaker_id": f"speaker-{i:05d}", "name": f"Speaker {i:05d}",
+               "company": f"Company {i % 20:02d} Construction", "job_title": "Project Director",
+               "bio": f"Speaker {i} delivers major infrastructure projects. " * 80, "sessions": []}
+
+SpeakerParser.iter_speakers = synthetic_speakers
+asyncio.run(run_streaming(output_file="out/speakers_with_emails.jsonl", batch_size=10))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_scalars_cut_at_a_chunk_boundary_are_read_whole(tmp_path, chunk_size):
+    path = tmp_path / "numbers.json"
+    path.write_text("[1, 23, 456, -3.25e10, true, null]")
+
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == [1, 23, 456, -3.25e10, True, None]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_records_match_json_load_for_every_chunk_size(tmp_path, indent):
+    records = [{"speaker_id": f"speaker-{i}", "name": f"Zoë \"Z\" {i}", "score": i * 1.5, "sessions": [i] * (i % 3)}
+               for i in range(40)]
+    path = tmp_path / "records.json"
+    path.write_text(json.dumps(records, indent=indent, ensure_ascii=False), encoding='utf-8')
+
+    for chunk_size in range(1, 50):
+        assert list(iter_json_array(path, chunk_size=chunk_size)) == records
+
+
+def test_truncated_array_is_an_error(tmp_path):
+    path = tmp_path / "truncated.json"
+    path.write_text("[1, 2")
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(path, chunk_size=3))
+
+
+def peak_rss_kib(tmp_path: Path, count: int) -> int:
+    run_dir = tmp_path / str(count)
+    (run_dir / "out").mkdir(parents=True)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(TESTS_DIR.parent), str(TESTS_DIR)])}
+    result = subprocess.run([sys.executable, "-c", STREAM_SCRIPT, str(count)], cwd=run_dir, env=env,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+
+    with open(run_dir / "out" / "speakers_with_emails.jsonl", encoding='utf-8') as f:
+        assert sum(1 for _ in f) == count
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss is reported in KiB on Linux only")
+def test_streaming_peak_memory_does_not_grow_with_speaker_count(tmp_path):
+    small = peak_rss_kib(tmp_path, 300)
+    large = peak_rss_kib(tmp_path, 3000)
+
+    # Holding the 2700 extra speakers (~4 KB of bio each) would add over 10 MB
+    assert large - small < 4 * 1024, f"peak RSS grew from {small} KiB to {large} KiB"
@@ -0,0 +1,79 @@
+"""Distributed execution: several local worker processes draining one queue"""
+import os
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+import stub_clients
+from utils.email_generator import EmailGenerator
+from utils.fingerprint import email_fingerprint
+from utils.parser import build_session_index
+from utils.work_queue import STAGE_CLASSIFY, STAGE_EMAIL, WorkQueue, merge_results
+
+STUB_CLIENTS = Path(__file__).resolve().parent / "stub_clients.py"
+
+
+def seed_queue(db_path: Path, count: int, sessions=()):
+    speakers = [
+        {"speaker_id": f"speaker-{i:03d}", "name": f"Speaker {i:03d}", "company": f"Company {i:03d} Construction",
+         "job_title": "Project Director", "sessions": list(sessions)}
+        for i in range(count)
+    ]
+    queue = WorkQueue(str(db_path))
+    queue.enqueue(STAGE_CLASSIFY, [(s['speaker_id'], s) for s in speakers])
+    queue.close()
+    return speakers
+
+
+def run_workers(tmp_path: Path, db_path: Path, count: int, env: dict):
+    workers = [
+        subprocess.Popen([sys.executable, str(STUB_CLIENTS), "--worker", "--queue", str(db_path)],
+                         cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        for _ in range(count)
+    ]
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=300)
+        assert worker.returncode == 0, stderr.decode()
+
+
+def test_workers_process_every_item_exactly_once(tmp_path):
+    db_path = tmp_path / "out" / "work_queue.db"
+    call_log = tmp_path / "calls.log"
+    speakers = seed_queue(db_path, 60)
+
+    run_workers(tmp_path, db_path, 3, {**os.environ, "STUB_CALL_LOG": str(call_log)})
+
+    queue = WorkQueue(str(db_path))
+    counts = queue.counts()
+    classified = queue.results(STAGE_CLASSIFY)
+    emails = queue.results(STAGE_EMAIL)
+    queue.close()
+
+    assert counts == {STAGE_CLASSIFY: {"done": 60}, STAGE_EMAIL: {"done": 60}}
+    assert set(classified) == set(emails) == {s['speaker_id'] for s in speakers}
+
+    # One LLM call per company and per email across all workers: nothing ran twice
+    calls = Counter(tuple(line.split("\t")) for line in call_log.read_text().splitlines())
+    assert len(calls) == 120
+    assert set(calls.values()) == {1}
+
+
+def test_worker_emails_match_batch_mode_fingerprints(tmp_path, monkeypatch):
+    db_path = tmp_path / "out" / "work_queue.db"
+    panel = {"title": "Digital twins on site", "url": "https://example.com/sessions/twins"}
+    speakers = seed_queue(db_path, 3, sessions=[panel])
+
+    run_workers(tmp_path, db_path, 1, dict(os.environ))
+
+    monkeypatch.chdir(tmp_path)
+    queue = WorkQueue(str(db_path))
+    merged = {s['speaker_id']: s for s in merge_results(queue)}
+    queue.close()
+
+    # The batch stages register the session index, so the panel is part of the fingerprint
+    stub_clients.install()
+    generator = EmailGenerator()
+    generator.add_sessions(build_session_index(speakers))
+    for speaker in merged.values():
+        assert speaker['email_fingerprint'] == email_fingerprint(speaker, generator)
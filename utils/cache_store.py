@@ -0,0 +1,59 @@
+"""
+Shared JSON cache files (cache/*.json)
+Several processes (queue workers, concurrent runs) write the same cache files. A save
+holds an exclusive lock, re-reads the file and merges it with the in-memory entries,
+so no process discards searches or classifications that another one paid for.
+"""
+import contextlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+# New entries between saves: each save rewrites the whole file, so saving per entry is O(n^2)
+SAVE_EVERY = 50
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process runs only
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: Path):
+    """Exclusive lock on <path>.lock for the duration of a read-merge-write"""
+    lock_file = path.with_name(path.name + ".lock")
+    with open(lock_file, 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def merge_save(path: Path, merge: Callable[[Optional[dict]], dict], indent: Optional[int] = 2,
+               ensure_ascii: bool = True):
+    """
+    Merge the file's current contents into memory and write the result, under the lock
+
+    Args:
+        path: Cache file
+        merge: Called with the parsed file (None if it does not exist yet); adds the
+            entries other processes wrote to the in-memory cache and returns the data to save
+        indent: JSON indent of the written file
+        ensure_ascii: Escape non-ASCII characters (json.dump default)
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with file_lock(path):
+        current = None
+        if path.exists():
+            with open(path, 'r') as f:
+                current = json.load(f)
+        data = merge(current)
+        # Atomic rename, so readers without the lock never see a partial file
+        tmp_file = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=ensure_ascii)
+        os.replace(tmp_file, path)
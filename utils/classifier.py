@@ -3,19 +3,93 @@ Company classifier using LLM to categorize companies
 """
 import os
 import asyncio
-from typing import Dict, List, Optional
+import contextlib
+import functools
+import time
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional
 from dotenv import load_dotenv
 import json
 
+from .streaming import abatch
+from .cache_store import SAVE_EVERY, merge_save
+from .fingerprint import stable_hash, enrichment_hash, classification_fingerprint
+from .enrichment import normalize_company
+from .evidence import EvidenceBuilder
+from .usage import TokenUsage
+from .structured import CLASSIFICATION_SCHEMA, StructuredOutputError, request_structured
+
+
+SYSTEM_PROMPT = "You are an expert at classifying companies in the construction industry."
+
+# Static part of the classification prompt. It is identical for every call and sent
+# before the per-company context, so provider prompt caching can reuse the prefix.
+CLASSIFICATION_RUBRIC = """Classify the company described at the end of this message into one of these categories:
+
+1. Builder - Construction companies, general contractors, specialty contractors, engineering firms that PHYSICALLY BUILD projects. Examples: Multiplex, Laing O'Rourke, Turner Construction, AECOM (construction division)
+2. Owner - Property owners, developers, real estate companies, government agencies that COMMISSION/OWN construction projects
+3. Partner - Software companies, technology vendors, consultants that don't build but provide tools/services. Examples: Autodesk, Trimble, Oracle, Microsoft
+4. Competitor - Companies offering drone services, aerial imagery, or competing construction tech (Propeller, Pix4D, Skycatch)
+5. Customer - EXISTING DroneDeploy customers (look for mentions of "partnership with DroneDeploy", "uses DroneDeploy", "DroneDeploy customer")
+6. Other - Doesn't fit clearly into above categories
+
+IMPORTANT: 
+- If search results mention the company has a partnership with DroneDeploy or uses DroneDeploy, classify as CUSTOMER
+- If the company name contains "Construction", "Contractors", "Engineering" they are likely a BUILDER (unless they're already a DroneDeploy customer)
+- Kier Group is a known DroneDeploy customer (enterprise agreement mentioned)
+
+DroneDeploy provides drone-based reality capture and aerial data analytics for construction sites.
+
+Return the category, a one-sentence reasoning and a confidence between 0.0 and 1.0.
+
+Company information:"""
+
 
 class CompanyClassifier:
     """Classify companies into categories using LLM"""
     
     CATEGORIES = ["Builder", "Owner", "Partner", "Competitor", "Customer", "Other"]
     
-    def __init__(self):
+    OPENAI_MODEL = "gpt-4.1-mini-2025-04-14"
+    ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+    TEMPERATURE = 0.3
+    # Bump when the code that builds the prompt context changes (template text is hashed directly)
+    PROMPT_VERSION = 4
+    # Categories describe companies; the speaker's job title only enters the prompt (and the
+    # grouping key) when this is switched on
+    USE_JOB_TITLE = False
+    # Output cap: category + one sentence + confidence (doubled on a truncated reply)
+    MAX_OUTPUT_TOKENS = 200
+    
+    def __init__(self, offline: bool = False, cache_dir: Optional[str] = "cache"):
+        """
+        Args:
+            offline: Build prompts and fingerprints without an API client (used by --plan)
+            cache_dir: Directory of the classification cache shared across runs and
+                events (None disables it)
+        """
         load_dotenv()
-        self.llm_client = self._init_llm_client()
+        self.llm_client = None if offline else self._init_llm_client()
+        self.usage = TokenUsage()
+        self.cache_file = Path(cache_dir) / "classification_cache.json" if cache_dir else None
+        self.cache = self._load_cache()
+        # Ranked search-result evidence, built once per company and stored
+        self.evidence = EvidenceBuilder(cache_dir, read_only=offline)
+        self.cache_hits = 0
+        self.unsaved = 0
+        self.reasks = 0
+        self.failures = 0
+        # One classification per company for the lifetime of this classifier, fanned out to
+        # every speaker of that company (shared across events in multi-event runs)
+        self.company_results: Dict[str, Dict] = {}
+        # Enrichment each company's result was classified from (its speakers' fingerprints use it)
+        self.company_inputs: Dict[str, Dict] = {}
+        self.llm_calls = 0
+        self.fanouts = 0
+        # Classifications in flight, so concurrent requests for the same company share one call
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Optional semaphore shared with other clients to cap concurrent provider calls
+        self.semaphore: Optional[asyncio.Semaphore] = None
     
     def _init_llm_client(self):
         """Initialize LLM client based on available API keys"""
@@ -28,141 +102,284 @@ class CompanyClassifier:
         else:
             raise ValueError("No LLM API key found. Please set OPENAI_API_KEY or ANTHROPIC_API_KEY")
     
-    def _create_classification_prompt(self, enriched_data: Dict) -> str:
-        """Create prompt for classification"""
-        company = enriched_data.get("company", "Unknown Company")
-        job_title = enriched_data.get("job_title", "")
-        search_results = enriched_data.get("search_results", [])
+    def model_name(self) -> str:
+        """Model used by the configured provider (same preference as _init_llm_client offline)"""
+        if self.llm_client is None:
+            return self.OPENAI_MODEL if os.getenv("OPENAI_API_KEY") or not os.getenv("ANTHROPIC_API_KEY") else self.ANTHROPIC_MODEL
+        return self.OPENAI_MODEL if hasattr(self.llm_client, 'chat') else self.ANTHROPIC_MODEL
+    
+    def config_fingerprint(self) -> str:
+        """Hash of everything besides the input data that shapes a result"""
+        model = self.model_name()
+        return stable_hash(model, self.TEMPERATURE, self.PROMPT_VERSION, self.USE_JOB_TITLE,
+                           SYSTEM_PROMPT, CLASSIFICATION_RUBRIC, self.evidence.config_fingerprint())
+    
+    def _load_cache(self) -> Dict:
+        if not self.cache_file or not self.cache_file.exists():
+            return {}
+        with open(self.cache_file, 'r') as f:
+            return json.load(f)
+    
+    def _save_cache(self):
+        """Save cache to file, merged with entries other workers saved meanwhile"""
+        if not self.cache_file:
+            return
         
-        # Compile search results into context
-        context = f"Company: {company}\nSpeaker Job Title: {job_title}\n\n"
-        context += "Search Results:\n"
-        for i, result in enumerate(search_results[:3]):  # Use top 3 results
-            context += f"{i+1}. {result.get('title', '')}\n{result.get('content', '')[:200]}...\n\n"
+        def merge(current):
+            for key, result in (current or {}).items():
+                self.cache.setdefault(key, result)
+            return self.cache
         
-        prompt = f"""Based on the following information about a company, classify it into one of these categories:
-
-1. Builder - Construction companies, general contractors, specialty contractors, engineering firms that PHYSICALLY BUILD projects. Examples: Multiplex, Laing O'Rourke, Turner Construction, AECOM (construction division)
-2. Owner - Property owners, developers, real estate companies, government agencies that COMMISSION/OWN construction projects
-3. Partner - Software companies, technology vendors, consultants that don't build but provide tools/services. Examples: Autodesk, Trimble, Oracle, Microsoft
-4. Competitor - Companies offering drone services, aerial imagery, or competing construction tech (Propeller, Pix4D, Skycatch)
-5. Customer - EXISTING DroneDeploy customers (look for mentions of "partnership with DroneDeploy", "uses DroneDeploy", "DroneDeploy customer")
-6. Other - Doesn't fit clearly into above categories
-
-{context}
-
-IMPORTANT: 
-- If search results mention the company has a partnership with DroneDeploy or uses DroneDeploy, classify as CUSTOMER
-- If the company name contains "Construction", "Contractors", "Engineering" they are likely a BUILDER (unless they're already a DroneDeploy customer)
-- Kier Group is a known DroneDeploy customer (enterprise agreement mentioned)
-
-DroneDeploy provides drone-based reality capture and aerial data analytics for construction sites.
-
-Provide your classification in the following JSON format:
-{{
-    "category": "Builder|Owner|Partner|Competitor|Other",
-    "reasoning": "Brief explanation for the classification",
-    "confidence": 0.0-1.0
-}}"""
+        merge_save(self.cache_file, merge)
+        self.unsaved = 0
+    
+    def flush(self):
+        """Save new classifications and evidence now (at checkpoints and stage ends)"""
+        if self.unsaved:
+            self._save_cache()
+        self.evidence.flush()
+    
+    def company_key(self, enriched_data: Dict) -> str:
+        """Grouping key: the normalized company (plus the job title if USE_JOB_TITLE)"""
+        key = normalize_company(enriched_data.get("company", ""))
+        if self.USE_JOB_TITLE:
+            key += "|" + enriched_data.get("job_title", "").strip().lower()
+        return key
+    
+    def _cache_key(self, enriched_data: Dict) -> str:
+        """Key of a classification's inputs (independent of the event the speaker came from)"""
+        return stable_hash(
+            self.company_key(enriched_data),
+            enrichment_hash(enriched_data),
+            self.config_fingerprint()
+        )
+    
+    def get_cached(self, enriched_data: Dict) -> Optional[Dict]:
+        """Return a cached classification for these inputs without calling the API"""
+        cached = self.cache.get(self._cache_key(enriched_data))
+        return dict(cached) if cached else None
+    
+    async def _call_llm(self, create, **kwargs):
+        """Run a blocking SDK call in a worker thread so parallel calls really overlap"""
+        loop = asyncio.get_running_loop()
+        async with self.semaphore or contextlib.nullcontext():
+            start = time.perf_counter()
+            try:
+                return await loop.run_in_executor(None, functools.partial(create, **kwargs))
+            finally:
+                self.usage.record_latency(time.perf_counter() - start)
+    
+    def _create_classification_context(self, enriched_data: Dict) -> str:
+        """Create the per-company part of the prompt"""
+        company = enriched_data.get("company", "Unknown Company")
         
-        return prompt
+        # Most relevant snippets across all search results, within a fixed token budget
+        context = f"Company: {company}\n"
+        if self.USE_JOB_TITLE:
+            context += f"Speaker Job Title: {enriched_data.get('job_title', '')}\n"
+        context += "\n"
+        context += "Evidence from web search (most relevant first):\n"
+        for snippet in self.evidence.evidence(enriched_data):
+            context += f"- {snippet}\n"
+        
+        return context
+    
+    def _create_classification_prompt(self, enriched_data: Dict) -> str:
+        """Create prompt for classification (static rubric first so providers can cache it)"""
+        return f"{CLASSIFICATION_RUBRIC}\n\n{self._create_classification_context(enriched_data)}"
     
     async def classify_company(self, enriched_data: Dict) -> Dict:
         """
-        Classify a single company
+        Classify a speaker's company, reusing the result already produced for that company
+        (this run, in flight, or cached by an earlier run)
         
         Returns:
             Dictionary with category, reasoning, and confidence
         """
-        prompt = self._create_classification_prompt(enriched_data)
+        group = self.company_key(enriched_data)
+        if group in self.company_results:
+            self.fanouts += 1
+            return dict(self.company_results[group])
+        if group in self._inflight:
+            self.fanouts += 1
+            return dict(await asyncio.shield(self._inflight[group]))
         
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[group] = future
         try:
-            if hasattr(self.llm_client, 'chat'):  # OpenAI
-                response = self.llm_client.chat.completions.create(
-                    model="gpt-4.1-mini-2025-04-14",
-                    messages=[
-                        {"role": "system", "content": "You are an expert at classifying companies in the construction industry."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    response_format={"type": "json_object"}
-                )
-                result = json.loads(response.choices[0].message.content)
-            else:  # Anthropic
-                response = self.llm_client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3,
-                    max_tokens=1000
-                )
-                # Parse JSON from response
-                content = response.content[0].text
-                # Extract JSON from the response
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                else:
-                    result = {"category": "Other", "reasoning": "Failed to parse response", "confidence": 0.0}
-            
-            # Validate category
-            if result.get("category") not in self.CATEGORIES:
-                result["category"] = "Other"
-            
-            return result
-            
+            key = self._cache_key(enriched_data)
+            if key in self.cache:
+                self.cache_hits += 1
+                result = dict(self.cache[key])
+            else:
+                self.llm_calls += 1
+                result = await self._classify_uncached(enriched_data)
+                if not result.get("failed"):
+                    self.cache[key] = result
+                    self.unsaved += 1
+                    if self.unsaved >= SAVE_EVERY:
+                        self._save_cache()
+            future.set_result(result)
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[group]
+        
+        # Failures are not fanned out later: the next speaker of the company retries
+        if not result.get("failed"):
+            self.company_results[group] = result
+            self.company_inputs[group] = enriched_data
+        return dict(result)
+    
+    def input_fingerprint(self, speaker_data: Dict) -> str:
+        """Fingerprint of a classified speaker over the enrichment its company was classified from"""
+        enrichment = self.company_inputs.get(self.company_key(speaker_data), speaker_data)
+        return classification_fingerprint(speaker_data, enrichment, self)
+    
+    def reuse_previous(self, speaker: Dict, previous: Optional[Dict], enrichment: Optional[Dict]) -> bool:
+        """
+        Keep an earlier run's classification if its inputs are unchanged (--incremental)
+        
+        The inputs are the enrichment the company is classified from: the one already
+        reused for a co-worker, else the speaker's own. A kept result is registered for
+        the company, so its changed speakers fan out from it instead of calling the LLM.
+        
+        Args:
+            speaker: Parsed speaker
+            previous: The speaker's record from the previous run (None if new)
+            enrichment: The speaker's cached enrichment (None if not searched yet)
+        
+        Returns:
+            True if the previous record can be reused as is
+        """
+        if not (previous and enrichment):
+            return False
+        group = self.company_key(speaker)
+        enrichment = self.company_inputs.get(group, enrichment)
+        if previous.get('classification_fingerprint') != classification_fingerprint(speaker, enrichment, self):
+            return False
+        if group not in self.company_results:
+            self.company_results[group] = {
+                "category": previous['category'],
+                "reasoning": previous.get('classification_reasoning', ''),
+                "confidence": previous.get('classification_confidence', 0.0)
+            }
+            self.company_inputs[group] = enrichment
+        return True
+    
+    def company_stats(self) -> str:
+        """One-line summary of company-level classification"""
+        companies = len(self.company_results)
+        speakers = companies + self.fanouts
+        return (f"{companies} companies for {speakers} speakers | {self.llm_calls} LLM calls, "
+                f"{self.cache_hits} cached, {self.fanouts} fanned out")
+    
+    async def _classify_uncached(self, enriched_data: Dict) -> Dict:
+        """Call the LLM to classify a single company (schema-enforced, re-asked if invalid)"""
+        context = self._create_classification_context(enriched_data)
+        
+        def check(result: Dict) -> List[str]:
+            errors = []
+            if not 0.0 <= result["confidence"] <= 1.0:
+                errors.append("$.confidence must be between 0.0 and 1.0")
+            if not result["reasoning"].strip():
+                errors.append("$.reasoning must not be empty")
+            return errors
+        
+        try:
+            return await request_structured(
+                self,
+                system=SYSTEM_PROMPT,
+                instructions=CLASSIFICATION_RUBRIC,
+                context=context,
+                name="classify_company",
+                description="Record the company's category",
+                schema=CLASSIFICATION_SCHEMA,
+                max_tokens=self.MAX_OUTPUT_TOKENS,
+                check=check
+            )
         except Exception as e:
-            print(f"Error classifying {enriched_data.get('company', 'Unknown')}: {e}")
+            # Flagged rather than silently stored: the speaker is retried on --resume / --incremental
+            self.failures += 1
+            kind = "Invalid response" if isinstance(e, StructuredOutputError) else "Classification failed"
+            print(f"Error classifying {enriched_data.get('company', 'Unknown')}: {kind}: {e}")
             return {
                 "category": "Other",
-                "reasoning": f"Classification failed: {str(e)}",
-                "confidence": 0.0
+                "reasoning": f"{kind}: {e}",
+                "confidence": 0.0,
+                "failed": True
             }
     
+    def apply_classification(self, speaker_data: Dict, classification: Dict):
+        """Merge a classification result into speaker data (failures are marked with classification_error)"""
+        speaker_data["category"] = classification["category"]
+        speaker_data["classification_reasoning"] = classification["reasoning"]
+        speaker_data["classification_confidence"] = classification["confidence"]
+        if classification.get("failed"):
+            speaker_data["classification_error"] = classification["reasoning"]
+        else:
+            speaker_data.pop("classification_error", None)
+    
     async def classify_batch(self, enriched_speakers: List[Dict], batch_size: int = 5) -> List[Dict]:
         """
-        Classify multiple companies in parallel batches
+        Classify speakers company by company: each company is classified once and the
+        result is propagated to all of its speakers
         
         Args:
             enriched_speakers: List of enriched speaker data
-            batch_size: Number of concurrent classifications (default 5)
+            batch_size: Number of concurrent company classifications (default 5)
         
         Returns:
-            List of speakers with classification added
+            List of speakers with classification added (in input order)
         """
-        classified_speakers = []
+        # Group speakers by normalized company; the first speaker's data represents the company
+        groups: Dict[str, List[Dict]] = {}
+        for speaker_data in enriched_speakers:
+            groups.setdefault(self.company_key(speaker_data), []).append(speaker_data)
+        companies = list(groups.values())
+        classified = 0
         total = len(enriched_speakers)
         
         # Process in batches for better performance
-        for i in range(0, total, batch_size):
-            batch = enriched_speakers[i:i+batch_size]
-            
-            # Create classification tasks for parallel execution
-            tasks = []
-            for speaker_data in batch:
-                tasks.append(self.classify_company(speaker_data))
+        for i in range(0, len(companies), batch_size):
+            batch = companies[i:i+batch_size]
             
-            # Run classifications in parallel
-            classifications = await asyncio.gather(*tasks)
+            # Run classifications in parallel, one per company
+            classifications = await asyncio.gather(*(self.classify_company(members[0]) for members in batch))
             
-            # Merge classification results with speaker data
-            for speaker_data, classification in zip(batch, classifications):
-                speaker_data["category"] = classification["category"]
-                speaker_data["classification_reasoning"] = classification["reasoning"]
-                speaker_data["classification_confidence"] = classification["confidence"]
-                
-                classified_speakers.append(speaker_data)
+            # Fan each company's result out to all of its speakers
+            for members, classification in zip(batch, classifications):
+                for speaker_data in members:
+                    self.apply_classification(speaker_data, classification)
+                self.fanouts += len(members) - 1
+                classified += len(members)
                 
-                print(f"[{len(classified_speakers)}/{total}] Classified {speaker_data['company']} as {classification['category']} "
+                speakers = f" ({len(members)} speakers)" if len(members) > 1 else ""
+                print(f"[{classified}/{total}] Classified {members[0]['company']}{speakers} as {classification['category']} "
                       f"(confidence: {classification['confidence']:.2f})")
             
             # Small delay between batches to avoid rate limiting
-            if i + batch_size < total:
+            if i + batch_size < len(companies):
                 await asyncio.sleep(0.5)
         
-        return classified_speakers
+        return enriched_speakers
+
+    
+    async def iter_classified(self, enriched_speakers: AsyncIterable[Dict], batch_size: int = 5) -> AsyncIterator[Dict]:
+        """
+        Classify speakers lazily, batch by batch
+        
+        Args:
+            enriched_speakers: Async iterable of enriched speaker data
+            batch_size: Number of concurrent classifications
+        
+        Yields:
+            Speakers with classification added
+        """
+        async for batch in abatch(enriched_speakers, batch_size, delay=0.5):
+            for classified_speaker in await self.classify_batch(batch, batch_size=batch_size):
+                yield classified_speaker
 
 
 # Example usage
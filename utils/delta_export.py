@@ -0,0 +1,113 @@
+"""
+Delta export for CRM upserts
+A manifest remembers the hash of every row last exported per speaker_id, so an
+export only writes the rows that were inserted, updated or deleted since then.
+The CRM import then scales with the size of the change rather than the event.
+"""
+import itertools
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pandas as pd
+
+from .fingerprint import stable_hash
+
+
+MANIFEST_VERSION = 1
+
+CHANGE_INSERT = "insert"
+CHANGE_UPDATE = "update"
+CHANGE_DELETE = "delete"
+
+DELTA_FORMATS = ("csv", "jsonl")
+
+
+def load_manifest(manifest_file: Path) -> Dict[str, str]:
+    """Row hash per speaker_id from the last export (empty if there is none)"""
+    if not manifest_file.exists():
+        return {}
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest['rows']
+
+
+def save_manifest(manifest_file: Path, rows: Dict[str, str]):
+    """Write the manifest atomically (only after the delta itself was written)"""
+    tmp_file = manifest_file.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_file, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'exported_at': time.time(), 'rows': rows}, f)
+    os.replace(tmp_file, manifest_file)
+
+
+def row_hashes(frame: pd.DataFrame) -> Dict[str, str]:
+    """
+    Hash of each export row
+
+    Args:
+        frame: Export frame whose first column is 'Speaker ID'
+
+    Returns:
+        Dictionary of speaker_id to row hash
+    """
+    ids = frame['Speaker ID'].tolist()
+    values = frame.drop(columns='Speaker ID').itertuples(index=False, name=None)
+    return {speaker_id: stable_hash(row) for speaker_id, row in zip(ids, values)}
+
+
+def compute_delta(frame: pd.DataFrame, previous: Dict[str, str]) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """
+    Rows that changed since the previous export
+
+    Args:
+        frame: Current export frame (with 'Speaker ID')
+        previous: Manifest rows of the previous export
+
+    Returns:
+        (delta frame with a leading 'Change' column, current manifest rows)
+    """
+    current = row_hashes(frame)
+    change = frame['Speaker ID'].map(
+        lambda speaker_id: CHANGE_INSERT if speaker_id not in previous
+        else CHANGE_UPDATE if previous[speaker_id] != current[speaker_id] else None
+    )
+    changed = frame[change.notna()].assign(Change=change[change.notna()])
+
+    # Deleted speakers carry only their id
+    deleted = [speaker_id for speaker_id in previous if speaker_id not in current]
+    removed = pd.DataFrame({'Speaker ID': deleted, 'Change': CHANGE_DELETE}, columns=['Speaker ID', 'Change'])
+
+    delta = pd.concat([changed, removed], ignore_index=True).fillna('')
+    return delta[['Change'] + list(frame.columns)], current
+
+
+def write_delta(delta: pd.DataFrame, output_dir: Path, delta_format: str = "csv") -> Path:
+    """
+    Write a delta file to <output_dir>/deltas/ named by timestamp
+
+    Never overwrites an earlier delta: a second export within the same second
+    gets a -2, -3, ... suffix.
+    """
+    if delta_format not in DELTA_FORMATS:
+        raise ValueError(f"Unknown delta format '{delta_format}' (expected one of {DELTA_FORMATS})")
+    deltas_dir = output_dir / "deltas"
+    deltas_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    for run in itertools.count(1):
+        suffix = f"-{run}" if run > 1 else ""
+        delta_file = deltas_dir / f"email_list_delta_{stamp}{suffix}.{delta_format}"
+        try:
+            # Exclusive create, so concurrent exports cannot claim the same name
+            f = open(delta_file, 'x', encoding='utf-8', newline='')
+        except FileExistsError:
+            continue
+        with f:
+            if delta_format == "csv":
+                delta.to_csv(f, index=False)
+            else:
+                delta.to_json(f, orient='records', lines=True, force_ascii=False)
+        return delta_file
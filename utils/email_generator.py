@@ -3,17 +3,73 @@ Email generator for personalized outreach to conference speakers
 """
 import os
 import asyncio
-from typing import Dict, List
+import contextlib
+import functools
+import time
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional
 from dotenv import load_dotenv
 import json
 
+from .streaming import abatch
+from .fingerprint import stable_hash
+from .usage import TokenUsage
+from .structured import EMAIL_SCHEMA, StructuredOutputError, request_structured
+
+
+SYSTEM_PROMPT = "You are an expert at writing compelling B2B outreach emails for the construction technology industry."
+
+# Category-specific messaging
+CATEGORY_MESSAGING = {
+    "Builder": "As a construction professional, you understand the challenges of managing complex projects, ensuring safety, and delivering on time and budget. DroneDeploy helps contractors like you capture real-time site progress, identify issues early, and improve communication with stakeholders.",
+    "Owner": "As someone overseeing construction projects, you need visibility into progress, budget tracking, and quality assurance. DroneDeploy provides owners with unprecedented transparency into their projects through regular aerial captures and AI-powered insights."
+}
+
+# Static part of the email prompt, sent before the speaker details so provider
+# prompt caching can reuse it across calls
+EMAIL_INSTRUCTIONS = """Generate a personalized email to invite a conference speaker to visit our booth #42 at Digital Construction Week.
+
+Requirements:
+- Subject line should be compelling and relevant to their role/company
+- Email body should be 3-4 sentences
+- If they have sessions, reference their talk(s) naturally
+- Mention booth #42 and free gift
+- Professional but engaging tone
+- Focus on specific value for their role/company type
+- Include a clear call to action
+
+Return the subject line and the email body.
+
+The speaker details follow."""
+
 
 class EmailGenerator:
     """Generate personalized emails based on company category and speaker info"""
     
-    def __init__(self):
+    OPENAI_MODEL = "gpt-4.1-mini-2025-04-14"
+    ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+    TEMPERATURE = 0.7
+    # Bump when the code that builds the prompt context changes (template text is hashed directly)
+    PROMPT_VERSION = 3
+    # Output cap: subject + 3-4 sentence body (doubled on a truncated reply)
+    MAX_OUTPUT_TOKENS = 350
+    # Co-panelist companies named in a session's context
+    PANEL_COMPANIES_SHOWN = 4
+    
+    def __init__(self, offline: bool = False):
+        """
+        Args:
+            offline: Build prompts and fingerprints without an API client (used by --plan)
+        """
         load_dotenv()
-        self.llm_client = self._init_llm_client()
+        self.llm_client = None if offline else self._init_llm_client()
+        self.usage = TokenUsage()
+        self.reasks = 0
+        self.failures = 0
+        # Session URL → title and panel (parse-time session index), so each prompt can
+        # name the speaker's co-panelists
+        self.session_index: Dict[str, Dict] = {}
+        # Optional semaphore shared with other clients to cap concurrent provider calls
+        self.semaphore: Optional[asyncio.Semaphore] = None
     
     def _init_llm_client(self):
         """Initialize LLM client based on available API keys"""
@@ -26,61 +82,81 @@ class EmailGenerator:
         else:
             raise ValueError("No LLM API key found. Please set OPENAI_API_KEY or ANTHROPIC_API_KEY")
     
-    def _create_email_prompt(self, speaker_data: Dict) -> str:
-        """Create prompt for email generation with session awareness"""
+    def model_name(self) -> str:
+        """Model used by the configured provider (same preference as _init_llm_client offline)"""
+        if self.llm_client is None:
+            return self.OPENAI_MODEL if os.getenv("OPENAI_API_KEY") or not os.getenv("ANTHROPIC_API_KEY") else self.ANTHROPIC_MODEL
+        return self.OPENAI_MODEL if hasattr(self.llm_client, 'chat') else self.ANTHROPIC_MODEL
+    
+    def config_fingerprint(self) -> str:
+        """Hash of everything besides the input data that shapes a result"""
+        model = self.model_name()
+        return stable_hash(model, self.TEMPERATURE, self.PROMPT_VERSION, SYSTEM_PROMPT, EMAIL_INSTRUCTIONS, CATEGORY_MESSAGING)
+    
+    async def _call_llm(self, create, **kwargs):
+        """Run a blocking SDK call in a worker thread so parallel calls really overlap"""
+        loop = asyncio.get_running_loop()
+        async with self.semaphore or contextlib.nullcontext():
+            start = time.perf_counter()
+            try:
+                return await loop.run_in_executor(None, functools.partial(create, **kwargs))
+            finally:
+                self.usage.record_latency(time.perf_counter() - start)
+    
+    def add_sessions(self, session_index: Dict[str, Dict]):
+        """Register a session index (parser.build_session_index); events can each add theirs"""
+        self.session_index.update(session_index)
+    
+    def _panel_context(self, session: Dict) -> str:
+        """Session title with its panel size and companies, as shown in the prompt"""
+        entry = self.session_index.get(session.get('url') or session['title'])
+        context = entry['title'] if entry else session['title']
+        panel = entry['speakers'] if entry else []
+        if len(panel) > 1:
+            companies = sorted({s['company'] for s in panel if s['company']})
+            shown = ", ".join(companies[:self.PANEL_COMPANIES_SHOWN])
+            more = f" and {len(companies) - self.PANEL_COMPANIES_SHOWN} more" if len(companies) > self.PANEL_COMPANIES_SHOWN else ""
+            context += f" (panel of {len(panel)} speakers from {shown}{more})"
+        return context
+    
+    def _create_email_context(self, speaker_data: Dict) -> str:
+        """Create the per-speaker part of the email prompt"""
         name = speaker_data["name"]
         company = speaker_data["company"]
         job_title = speaker_data["job_title"]
         category = speaker_data["category"]
         sessions = speaker_data.get("sessions", [])
         
-        # Category-specific messaging
-        category_messaging = {
-            "Builder": "As a construction professional, you understand the challenges of managing complex projects, ensuring safety, and delivering on time and budget. DroneDeploy helps contractors like you capture real-time site progress, identify issues early, and improve communication with stakeholders.",
-            "Owner": "As someone overseeing construction projects, you need visibility into progress, budget tracking, and quality assurance. DroneDeploy provides owners with unprecedented transparency into their projects through regular aerial captures and AI-powered insights."
-        }
-        
-        context = category_messaging.get(category, "DroneDeploy's construction solutions help organizations capture, analyze, and share reality data from their job sites.")
+        context = CATEGORY_MESSAGING.get(category, "DroneDeploy's construction solutions help organizations capture, analyze, and share reality data from their job sites.")
         
         # Build session context
         session_context = ""
         if sessions:
             if len(sessions) == 1:
-                session_context = f"\n- Speaking session: {sessions[0]['title']}"
+                session_context = f"\n- Speaking session: {self._panel_context(sessions[0])}"
             elif len(sessions) > 1:
-                session_context = f"\n- Speaking at {len(sessions)} sessions including: {sessions[0]['title']}"
+                session_context = f"\n- Speaking at {len(sessions)} sessions including: {self._panel_context(sessions[0])}"
         
-        prompt = f"""Generate a personalized email to invite a conference speaker to visit our booth #42 at Digital Construction Week.
-
-Speaker Information:
+        return f"""Speaker Information:
 - Name: {name}
 - Company: {company}
 - Job Title: {job_title}
 - Category: {category}{session_context}
 
-Context: {context}
-
-Requirements:
-- Subject line should be compelling and relevant to their role/company
-- Email body should be 3-4 sentences
-- If they have sessions, reference their talk(s) naturally
-- Mention booth #42 and free gift
-- Professional but engaging tone
-- Focus on specific value for their role/company type
-- Include a clear call to action
-
-Provide the email in the following JSON format:
-{{
-    "subject": "Email subject line",
-    "body": "Email body text"
-}}"""
-        
-        return prompt
+Context: {context}"""
     
-    async def generate_email(self, speaker_data: Dict) -> Dict:
+    def _create_email_prompt(self, speaker_data: Dict) -> str:
+        """Create prompt for email generation (static instructions first so providers can cache them)"""
+        return f"{EMAIL_INSTRUCTIONS}\n\n{self._create_email_context(speaker_data)}"
+    
+    async def generate_email(self, speaker_data: Dict, feedback: Optional[List[str]] = None) -> Dict:
         """
         Generate personalized email for a speaker
         
+        Args:
+            speaker_data: Classified speaker
+            feedback: Reasons a previous draft failed QA (targeted regeneration)
+        
         Returns:
             Dictionary with subject and body
         """
@@ -91,47 +167,51 @@ Provide the email in the following JSON format:
                 "body": ""
             }
         
-        prompt = self._create_email_prompt(speaker_data)
+        context = self._create_email_context(speaker_data)
+        if feedback:
+            context += "\n\nA previous draft failed these checks; make sure the new email fixes them:\n- " + "\n- ".join(feedback)
+        
+        def check(result: Dict) -> List[str]:
+            errors = []
+            if not result["subject"].strip():
+                errors.append("$.subject must not be empty")
+            if not result["body"].strip():
+                errors.append("$.body must not be empty")
+            return errors
         
         try:
-            if hasattr(self.llm_client, 'chat'):  # OpenAI
-                response = self.llm_client.chat.completions.create(
-                    model="gpt-4.1-mini-2025-04-14",
-                    messages=[
-                        {"role": "system", "content": "You are an expert at writing compelling B2B outreach emails for the construction technology industry."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    response_format={"type": "json_object"}
-                )
-                result = json.loads(response.choices[0].message.content)
-            else:  # Anthropic
-                response = self.llm_client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=1000
-                )
-                # Parse JSON from response
-                content = response.content[0].text
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    result = json.loads(json_match.group())
-                else:
-                    result = {"subject": "", "body": ""}
-            
-            return result
-            
+            return await request_structured(
+                self,
+                system=SYSTEM_PROMPT,
+                instructions=EMAIL_INSTRUCTIONS,
+                context=context,
+                name="write_email",
+                description="Record the outreach email",
+                schema=EMAIL_SCHEMA,
+                max_tokens=self.MAX_OUTPUT_TOKENS,
+                check=check
+            )
         except Exception as e:
-            print(f"Error generating email for {speaker_data.get('name', 'Unknown')}: {e}")
+            # Flagged rather than silently left empty: stage 2 retries it on --resume
+            self.failures += 1
+            kind = "Invalid response" if isinstance(e, StructuredOutputError) else "Generation failed"
+            print(f"Error generating email for {speaker_data.get('name', 'Unknown')}: {kind}: {e}")
             return {
                 "subject": "",
-                "body": ""
+                "body": "",
+                "failed": True,
+                "error": f"{kind}: {e}"
             }
     
+    def apply_email(self, speaker_data: Dict, email: Dict):
+        """Merge a generated email into speaker data (failures are marked with email_error)"""
+        speaker_data["email_subject"] = email["subject"]
+        speaker_data["email_body"] = email["body"]
+        if email.get("failed"):
+            speaker_data["email_error"] = email["error"]
+        else:
+            speaker_data.pop("email_error", None)
+    
     async def generate_emails_batch(self, classified_speakers: List[Dict], batch_size: int = 5) -> List[Dict]:
         """
         Generate emails for multiple speakers in parallel batches
@@ -162,8 +242,7 @@ Provide the email in the following JSON format:
             
             # Merge email results with speaker data
             for speaker_data, email in zip(batch, emails):
-                speaker_data["email_subject"] = email["subject"]
-                speaker_data["email_body"] = email["body"]
+                self.apply_email(speaker_data, email)
                 
                 speakers_with_emails.append(speaker_data)
                 
@@ -177,6 +256,27 @@ Provide the email in the following JSON format:
         
         return speakers_with_emails
 
+    
+    async def iter_emails(self, classified_speakers: AsyncIterable[Dict], batch_size: int = 5) -> AsyncIterator[Dict]:
+        """
+        Generate emails lazily for Builders and Owners; other speakers pass through
+        
+        Args:
+            classified_speakers: Async iterable of classified speaker data
+            batch_size: Number of concurrent email generations
+        
+        Yields:
+            Speakers with email_subject and email_body set
+        """
+        async for batch in abatch(classified_speakers, batch_size):
+            targets = [s for s in batch if s.get("category") in ["Builder", "Owner"]]
+            if targets:
+                await self.generate_emails_batch(targets, batch_size=batch_size)
+            for speaker_data in batch:
+                speaker_data.setdefault("email_subject", "")
+                speaker_data.setdefault("email_body", "")
+                yield speaker_data
+
 
 # Example usage
 if __name__ == "__main__":
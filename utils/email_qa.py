@@ -0,0 +1,303 @@
+"""
+Stage 2b: local email QA with targeted regeneration
+Rule checks (booth #42, free gift, session reference, 3-4 sentences) run in a
+process pool over every generated email, and near-duplicate bodies are found
+with MinHash signatures and LSH banding. Only speakers whose email fails are
+sent back to the LLM, with the failure reasons, so regeneration cost follows
+the number of defects rather than the size of the event.
+"""
+import asyncio
+import json
+import re
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .fingerprint import email_fingerprint
+from .scheduler import RunBudget, LLM_CALL_COST, TARGET_CATEGORIES
+from . import run_ledger
+
+
+MIN_SENTENCES = 3
+MAX_SENTENCES = 4
+MAX_QA_ROUNDS = 2            # regeneration rounds for emails that keep failing
+POOL_MIN_EMAILS = 64         # below this, checking inline beats starting worker processes
+
+NEAR_DUPLICATE_JACCARD = 0.7
+SHINGLE_WORDS = 3
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16               # 16 bands x 4 rows: pairs above ~0.5 similarity become candidates
+MINHASH_PRIME = 4294967311   # smallest prime above 2**32
+
+BOOTH_PATTERN = re.compile(r"\bbooth\s*(?:#|no\.?\s*|number\s*)?42\b", re.IGNORECASE)
+GIFT_PATTERN = re.compile(r"\b(?:free|special|complimentary|exclusive)\b(?:\W+\w+){0,3}?\W+gifts?\b", re.IGNORECASE)
+TALK_PATTERN = re.compile(r"\b(?:session|talk|panel|presentation|keynote|speaking|discussion)s?\b", re.IGNORECASE)
+SENTENCE_END = re.compile(r"[.!?]+(?=[\s\"')\]]|$)")
+GREETING_PATTERN = re.compile(r"^(?:hi|hello|dear|hey)\b[^.!?]{0,40}[,!]?$", re.IGNORECASE)
+SIGN_OFF_PATTERN = re.compile(r"^(?:best|kind regards|warm regards|regards|cheers|thanks|thank you|sincerely|see you|"
+                              r"looking forward)\b[^.!?]{0,40}[,.!]?$", re.IGNORECASE)
+# Template lines left for the sender ("[Your Name]")
+PLACEHOLDER_PATTERN = re.compile(r"^\[[^\]]*\]$")
+# Quoted text such as a session title; its punctuation only ends a sentence before a capital
+QUOTE_PATTERN = re.compile(r"\"[^\"]*\"|“[^”]*”|‘[^’]*’|(?<!\w)'[^']*'(?!\w)")
+# Abbreviations whose period does not end a sentence ("Dr. Smith", "e.g.")
+ABBREVIATION_PATTERN = re.compile(r"\b(?:Dr|Prof|Mr|Mrs|Ms|St|Ltd|Inc|Co|Jr|Sr|vs|etc|e\.g|i\.e)\.", re.IGNORECASE)
+STOP_WORDS = {"the", "and", "for", "with", "from", "into", "that", "this", "what", "how", "why", "your",
+              "our", "are", "its", "their", "about", "through", "when", "where", "will", "can", "new"}
+
+# Feedback sent to the LLM for each failed rule
+RULE_MESSAGES = {
+    "subject": "The subject line is empty",
+    "booth": "The email must mention booth #42",
+    "gift": "The email must mention the free gift",
+    "session": "The email must reference the speaker's session at the conference",
+    "length": f"The body must be {MIN_SENTENCES}-{MAX_SENTENCES} sentences (greeting and sign-off excluded)",
+}
+
+
+def _quote_stand_in(match: re.Match, text: str) -> str:
+    """Replace a quotation by one word, keeping a final stop only if a new sentence follows"""
+    ends_sentence = re.search(r"[.!?]\W?$", match.group(0)) and re.match(r"\s+[A-Z]", text[match.end():])
+    return "QUOTE." if ends_sentence else "QUOTE"
+
+
+def count_sentences(body: str) -> int:
+    """Sentences in an email body, ignoring a greeting line and the sign-off"""
+    lines = [line.strip() for line in body.strip().splitlines()
+             if line.strip() and not PLACEHOLDER_PATTERN.match(line.strip())]
+    if lines and GREETING_PATTERN.match(lines[0]):
+        lines = lines[1:]
+    for i, line in enumerate(lines):
+        if SIGN_OFF_PATTERN.match(line):
+            lines = lines[:i]
+            break
+    text = " ".join(lines)
+    text = QUOTE_PATTERN.sub(lambda m: _quote_stand_in(m, text), text)
+    text = ABBREVIATION_PATTERN.sub(lambda m: m.group(0)[:-1], text)
+    sentences = len(SENTENCE_END.findall(text))
+    # Trailing text without final punctuation is still a sentence
+    if text and not re.search(r"[.!?][\"')\]]*$", text):
+        sentences += 1
+    return sentences
+
+
+def mentions_session(body: str, session_titles: List[str]) -> bool:
+    """True if the body refers to a talk, or shares at least two keywords with a session title"""
+    if TALK_PATTERN.search(body):
+        return True
+    words = set(re.findall(r"[a-z0-9]+", body.lower()))
+    for title in session_titles:
+        keywords = {w for w in re.findall(r"[a-z0-9]+", title.lower()) if len(w) > 3 and w not in STOP_WORDS}
+        if keywords and len(keywords & words) >= min(2, len(keywords)):
+            return True
+    return False
+
+
+def check_email(item: Tuple[str, str, str, List[str]]) -> Tuple[str, List[str]]:
+    """
+    Rule checks for one email (module-level so it can run in worker processes)
+
+    Args:
+        item: (speaker_id, subject, body, session titles)
+
+    Returns:
+        (speaker_id, names of failed rules)
+    """
+    speaker_id, subject, body, session_titles = item
+    failed = []
+    if not subject.strip():
+        failed.append("subject")
+    if not BOOTH_PATTERN.search(f"{subject} {body}"):
+        failed.append("booth")
+    if not GIFT_PATTERN.search(f"{subject} {body}"):
+        failed.append("gift")
+    if session_titles and not mentions_session(body, session_titles):
+        failed.append("session")
+    if not MIN_SENTENCES <= count_sentences(body) <= MAX_SENTENCES:
+        failed.append("length")
+    return speaker_id, failed
+
+
+def check_rules(items: List[Tuple[str, str, str, List[str]]], workers: Optional[int] = None) -> Dict[str, List[str]]:
+    """Run check_email over many emails, in a process pool when there are enough of them"""
+    if len(items) < POOL_MIN_EMAILS or workers == 1:
+        return dict(map(check_email, items))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(check_email, items, chunksize=max(1, len(items) // 32)))
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"[a-z0-9#']+", text.lower())
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+
+
+def find_near_duplicates(bodies: Dict[str, str], threshold: float = NEAR_DUPLICATE_JACCARD) -> Dict[str, Tuple[str, float]]:
+    """
+    Near-duplicate email bodies (word-shingle Jaccard similarity via MinHash + LSH)
+
+    Args:
+        bodies: Email body per speaker_id, in priority order (earlier emails are kept)
+        threshold: Jaccard similarity at or above which two bodies are duplicates
+
+    Returns:
+        Dictionary of speaker_id to (speaker_id of the earlier similar email, similarity)
+    """
+    ids = list(bodies)
+    shingles = [_shingles(bodies[speaker_id]) for speaker_id in ids]
+    rng = np.random.default_rng(0)
+    a = rng.integers(1, 2 ** 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, 2 ** 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    buckets: Dict[Tuple, List[int]] = {}
+    for index, shingle_set in enumerate(shingles):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+        signature = ((a[:, None] * hashes[None, :] + b[:, None]) % MINHASH_PRIME).min(axis=1)
+        for band in range(LSH_BANDS):
+            buckets.setdefault((band, signature[band * rows:(band + 1) * rows].tobytes()), []).append(index)
+
+    duplicates: Dict[str, Tuple[str, float]] = {}
+    checked = set()
+    for members in buckets.values():
+        for position, later in enumerate(members):
+            for earlier in members[:position]:
+                if (earlier, later) in checked or ids[later] in duplicates:
+                    continue
+                checked.add((earlier, later))
+                union = len(shingles[earlier] | shingles[later])
+                similarity = len(shingles[earlier] & shingles[later]) / union if union else 1.0
+                if similarity >= threshold:
+                    duplicates[ids[later]] = (ids[earlier], similarity)
+    return duplicates
+
+
+def _qa_item(speaker: Dict) -> Tuple[str, str, str, List[str]]:
+    return (speaker['speaker_id'], speaker.get('email_subject', ''), speaker.get('email_body', ''),
+            [session.get('title', '') for session in speaker.get('sessions', [])])
+
+
+async def qa_emails(output_dir="out", regenerate=True, batch_size=15, budget: RunBudget = None,
+                    workers: Optional[int] = None, generator=None) -> Dict:
+    """
+    Check every generated email and regenerate only the failing ones
+
+    Args:
+        output_dir: Directory holding speakers_with_emails.json (updated in place)
+        regenerate: Send failing emails back to the LLM with the failure reasons
+        batch_size: Number of concurrent regenerations
+        budget: Optional RunBudget; regeneration stops when it is exhausted
+        workers: Worker processes for the rule checks (default: one per CPU)
+        generator: Optional shared EmailGenerator with the session index registered
+            (e.g. the stage 2 generator); created on first regeneration otherwise
+
+    Returns:
+        QA report (also written to <output_dir>/email_qa.json)
+    """
+    print("=" * 70)
+    print("STAGE 2b: EMAIL QA")
+    print("=" * 70)
+
+    output_dir = Path(output_dir)
+    emails_file = output_dir / "speakers_with_emails.json"
+    if not emails_file.exists():
+        print("❌ Error: Run Stage 2 (email generation) first!")
+        print(f"   File not found: {emails_file}")
+        return {}
+
+    with open(emails_file, 'r') as f:
+        all_speakers = json.load(f)
+    targets = [s for s in all_speakers if s.get('category') in TARGET_CATEGORIES and s.get('email_subject')]
+    by_id = {s['speaker_id']: s for s in targets}
+    print(f"🔎 Checking {len(targets)} emails...")
+
+    start_time = time.time()
+    rule_failures = await asyncio.to_thread(check_rules, [_qa_item(s) for s in targets], workers)
+    initial_failures = None
+    regenerated = set()
+
+    for qa_round in range(MAX_QA_ROUNDS + 1):
+        duplicates = find_near_duplicates({s['speaker_id']: s.get('email_body', '') for s in targets})
+        failures: Dict[str, List[str]] = {}
+        for speaker_id, rules in rule_failures.items():
+            if rules:
+                failures[speaker_id] = [RULE_MESSAGES[rule] for rule in rules]
+        for speaker_id, (original_id, similarity) in duplicates.items():
+            failures.setdefault(speaker_id, []).append(
+                f"The body is nearly identical ({similarity:.0%}) to the email for {by_id[original_id]['name']}; "
+                f"write a distinct email for this speaker")
+
+        if initial_failures is None:
+            initial_failures = failures
+            rule_counts = Counter(rule for rules in rule_failures.values() for rule in rules)
+            print(f"   Failed: {len(failures)}/{len(targets)} | " +
+                  " | ".join(f"{rule}: {rule_counts.get(rule, 0)}" for rule in RULE_MESSAGES) +
+                  f" | near-duplicates: {len(duplicates)}")
+        else:
+            print(f"   Round {qa_round}: {len(failures)} still failing")
+
+        if not failures or not regenerate or qa_round == MAX_QA_ROUNDS:
+            break
+        to_fix = [by_id[speaker_id] for speaker_id in failures]
+        if budget and not budget.can_afford(len(to_fix) * LLM_CALL_COST):
+            budget.stopped = True
+            print(f"\n⏹️  Budget reached ({budget.summary()}); {len(to_fix)} emails left unfixed")
+            break
+
+        if generator is None:
+            from .email_generator import EmailGenerator
+            from .stage2_generate import load_session_index
+            generator = EmailGenerator()
+            # Same panel context as the stage 2 prompts
+            generator.add_sessions(load_session_index(output_dir, all_speakers))
+        print(f"\n♻️  Regenerating {len(to_fix)} failing emails with their failure reasons...")
+        for i in range(0, len(to_fix), batch_size):
+            batch = to_fix[i:i + batch_size]
+            emails = await asyncio.gather(*(generator.generate_email(s, feedback=failures[s['speaker_id']]) for s in batch))
+            for speaker, email in zip(batch, emails):
+                # A failed regeneration keeps the previous draft
+                if not email.get('failed'):
+                    generator.apply_email(speaker, email)
+                    speaker['email_fingerprint'] = email_fingerprint(speaker, generator)
+                    regenerated.add(speaker['speaker_id'])
+        if budget:
+            budget.charge(len(to_fix) * LLM_CALL_COST)
+        rule_failures.update(await asyncio.to_thread(check_rules, [_qa_item(s) for s in to_fix], workers))
+
+    for speaker in targets:
+        if speaker['speaker_id'] in failures:
+            speaker['email_qa_errors'] = failures[speaker['speaker_id']]
+        else:
+            speaker.pop('email_qa_errors', None)
+
+    with open(emails_file, 'w') as f:
+        json.dump(all_speakers, f, indent=2)
+
+    elapsed = time.time() - start_time
+    report = {
+        'checked': len(targets),
+        'failed_initially': len(initial_failures or {}),
+        'regenerated': len(regenerated),
+        'still_failing': failures,
+        'seconds': round(elapsed, 2)
+    }
+    with open(output_dir / "email_qa.json", 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print("✅ EMAIL QA COMPLETE")
+    print(f"   Checked: {report['checked']} | failed: {report['failed_initially']} | "
+          f"regenerated: {report['regenerated']} | still failing: {len(report['still_failing'])}")
+    if generator is not None:
+        print(f"   Regeneration tokens: {generator.usage.summary()}")
+    print(f"   Time: {elapsed:.1f} seconds")
+    run_ledger.record(clients=[generator], items=len(targets), errors=len(failures),
+                      failed_initially=report['failed_initially'], regenerated=report['regenerated'])
+    print(f"\n💾 Report saved to {output_dir / 'email_qa.json'}")
+    print("=" * 70)
+
+    return report
@@ -1,42 +1,171 @@
 """
 Tavily API enrichment for company information
+Search documents are stored once in a content-addressed store (URL plus content hash);
+cache entries and speaker records hold references to them
 """
 import asyncio
+import hashlib
 import json
+import re
 from pathlib import Path
-from typing import Dict, List, Optional
-from tavily import TavilyClient
+from typing import AsyncIterator, Dict, Iterable, List, Optional
 import os
 from dotenv import load_dotenv
 
+from .cache_store import SAVE_EVERY, merge_save
+from .streaming import abatch
+
+
+CACHE_VERSION = 2
+
+# Words that do not distinguish one company from another ("Jacobs UK" is "Jacobs")
+COMPANY_NOISE_WORDS = {"the", "ltd", "limited", "plc", "inc", "llc", "llp", "gmbh", "co", "group", "uk"}
+
+
+def normalize_company(company: str) -> str:
+    """Canonical company key: case, punctuation, '&' and legal/group suffixes ignored"""
+    name = company.lower().replace("&", " and ").replace("’", "'")
+    name = re.sub(r"[^\w' ]+", " ", name)
+    return " ".join(word for word in name.split() if word not in COMPANY_NOISE_WORDS)
+
+
+def merge_enrichment(speaker: Dict, enrichment: Dict) -> Dict:
+    """
+    Copy of a speaker record with its enrichment added
+
+    Enrichment may come from another speaker of the same company (cache fallback), so the
+    speaker's own company and job title always win over the enrichment's.
+    """
+    record = {**speaker, **enrichment}
+    for field in ('company', 'job_title'):
+        if field in speaker:
+            record[field] = speaker[field]
+    return record
+
+
+def document_id(doc: Dict) -> str:
+    """Content address of a search document: its URL plus a hash of its text"""
+    digest = hashlib.sha1(f"{doc.get('title', '')}\n{doc.get('content', '')}".encode('utf-8')).hexdigest()[:12]
+    return f"{doc.get('url', '')}#{digest}"
+
+
+def compact_record(record: Dict) -> Dict:
+    """Copy of an enrichment/speaker record with search results replaced by document ids"""
+    if 'search_results' not in record:
+        return record
+    compact = {key: value for key, value in record.items() if key != 'search_results'}
+    compact['search_result_ids'] = [document_id(doc) for doc in record['search_results']]
+    return compact
+
 
 class CompanyEnricher:
     """Enrich company information using Tavily API"""
     
-    def __init__(self, cache_dir: str = "cache"):
+    def __init__(self, cache_dir: str = "cache", offline: bool = False):
+        """
+        Args:
+            cache_dir: Directory of the enrichment cache
+            offline: Only read the cache, without a Tavily client (used by --plan)
+        """
         load_dotenv()
-        self.client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        if offline:
+            self.client = None
+        else:
+            # Imported lazily so that modules importing the enricher stay cheap to load
+            from tavily import TavilyClient
+            self.client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         self.cache_file = self.cache_dir / "tavily_cache.json"
+        self.documents: Dict[str, Dict] = {}
         self.cache = self._load_cache()
+        # Search query depends only on the company, so any speaker's entry serves the whole company
+        self.company_index: Dict[str, str] = {}
+        for key, entry in self.cache.items():
+            self.company_index.setdefault(normalize_company(entry.get('company', '')), key)
+        self.searches = 0
+        self.cache_hits = 0
+        self.unsaved = 0
+        # Searches in flight per company, so concurrent requests for one company share a search
+        self._inflight: Dict[str, asyncio.Future] = {}
+    
+    def intern_document(self, doc: Dict) -> Dict:
+        """Return the single shared instance of a search document"""
+        return self.documents.setdefault(document_id(doc), doc)
+    
+    def resolve_record(self, record: Dict) -> Dict:
+        """Copy of a compact record with its search result ids resolved to documents"""
+        if 'search_result_ids' not in record:
+            return record
+        resolved = {key: value for key, value in record.items() if key != 'search_result_ids'}
+        resolved['search_results'] = [
+            self.documents[doc_id] for doc_id in record['search_result_ids'] if doc_id in self.documents
+        ]
+        return resolved
     
     def _load_cache(self) -> Dict:
-        """Load cache from file"""
-        if self.cache_file.exists():
-            with open(self.cache_file, 'r') as f:
-                return json.load(f)
-        return {}
+        """Load cache from file (legacy files with inline search results are interned on load)"""
+        if not self.cache_file.exists():
+            return {}
+        
+        with open(self.cache_file, 'r') as f:
+            data = json.load(f)
+        
+        if data.get('version') == CACHE_VERSION:
+            self.documents = data['documents']
+            return {key: self.resolve_record(entry) for key, entry in data['entries'].items()}
+        
+        # Legacy format: {cache_key: {..., "search_results": [full documents]}}
+        for entry in data.values():
+            entry['search_results'] = [self.intern_document(doc) for doc in entry.get('search_results', [])]
+        return data
     
     def _save_cache(self):
-        """Save cache to file"""
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=2)
+        """Save cache to file, merged with searches other workers saved meanwhile"""
+        def merge(current):
+            if current and current.get('version') == CACHE_VERSION:
+                for doc_id, doc in current['documents'].items():
+                    self.documents.setdefault(doc_id, doc)
+                for key, entry in current['entries'].items():
+                    if key not in self.cache:
+                        self.cache[key] = self.resolve_record(entry)
+                        self.company_index.setdefault(normalize_company(entry.get('company', '')), key)
+            return {
+                'version': CACHE_VERSION,
+                'documents': self.documents,
+                'entries': {key: compact_record(entry) for key, entry in self.cache.items()}
+            }
+        
+        merge_save(self.cache_file, merge)
+        self.unsaved = 0
+    
+    def flush(self):
+        """Save new searches now (at checkpoints and stage ends; otherwise every SAVE_EVERY)"""
+        if self.unsaved:
+            self._save_cache()
     
     def _get_cache_key(self, company: str, speaker_name: str) -> str:
         """Generate cache key for company/speaker combination"""
         return f"{company}|{speaker_name}".lower()
     
+    def get_cached(self, company: str, speaker_name: str) -> Optional[Dict]:
+        """
+        Return cached enrichment for a company/speaker without calling the API
+        
+        Falls back to another speaker's entry for the same company (e.g. from another
+        event); that copy carries this speaker's company and name and no job title.
+        """
+        cached = self.cache.get(self._get_cache_key(company, speaker_name))
+        if cached is not None:
+            return cached
+        shared_key = self.company_index.get(normalize_company(company))
+        if shared_key is None:
+            return None
+        shared = {key: value for key, value in self.cache[shared_key].items() if key != 'job_title'}
+        shared['company'] = company
+        shared['speaker_name'] = speaker_name
+        return shared
+    
     async def enrich_company(self, company: str, speaker_name: str, job_title: str) -> Dict:
         """
         Enrich company information using Tavily search
@@ -46,17 +175,36 @@ class CompanyEnricher:
         """
         cache_key = self._get_cache_key(company, speaker_name)
         
-        # Check cache first
-        if cache_key in self.cache:
+        # Check cache first (exact speaker, or any speaker of the same company)
+        cached = self.get_cached(company, speaker_name)
+        if cached is not None:
             print(f"Using cached data for {company}")
-            return self.cache[cache_key]
+            self.cache_hits += 1
+            return {**cached, "job_title": job_title} if cache_key not in self.cache else cached
+        
+        company_key = normalize_company(company)
+        if company_key in self._inflight:
+            # Served from the cache once that search lands (or retried if it failed)
+            await asyncio.shield(self._inflight[company_key])
+            return await self.enrich_company(company, speaker_name, job_title)
         
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[company_key] = future
+        try:
+            return await self._search_company(company, speaker_name, job_title, cache_key)
+        finally:
+            del self._inflight[company_key]
+            future.set_result(None)
+    
+    async def _search_company(self, company: str, speaker_name: str, job_title: str, cache_key: str) -> Dict:
+        """Run the Tavily search for a company and cache the result"""
         try:
             # Search for company in construction industry context
             query = f"{company} construction industry digital transformation drone technology"
             
-            # Use Tavily search
-            search_results = self.client.search(
+            # The Tavily client blocks, so it runs in a worker thread to keep the event loop free
+            search_results = await asyncio.to_thread(
+                self.client.search,
                 query=query,
                 search_depth="advanced",
                 max_results=5
@@ -71,15 +219,19 @@ class CompanyEnricher:
             }
             
             for result in search_results.get("results", []):
-                enriched_data["search_results"].append({
+                enriched_data["search_results"].append(self.intern_document({
                     "title": result.get("title", ""),
                     "content": result.get("content", ""),
                     "url": result.get("url", "")
-                })
+                }))
             
             # Cache the result
+            self.searches += 1
             self.cache[cache_key] = enriched_data
-            self._save_cache()
+            self.company_index.setdefault(normalize_company(company), cache_key)
+            self.unsaved += 1
+            if self.unsaved >= SAVE_EVERY:
+                self._save_cache()
             
             return enriched_data
             
@@ -123,9 +275,7 @@ class CompanyEnricher:
             
             # Merge enrichment data with original speaker data
             for speaker, enrichment in zip(batch, batch_results):
-                enriched_speaker = speaker.copy()  # Keep all original data
-                enriched_speaker.update(enrichment)  # Add enrichment data
-                enriched_speakers.append(enriched_speaker)
+                enriched_speakers.append(merge_enrichment(speaker, enrichment))
             
             # Small delay to avoid rate limiting
             if i + 5 < len(speakers):
@@ -133,6 +283,22 @@ class CompanyEnricher:
         
         return enriched_speakers
 
+    
+    async def iter_enriched(self, speakers: Iterable[Dict], batch_size: int = 5) -> AsyncIterator[Dict]:
+        """
+        Enrich speakers lazily, batch by batch
+        
+        Args:
+            speakers: Iterable of speaker dictionaries (e.g. SpeakerParser.iter_speakers())
+            batch_size: Number of concurrent searches per batch
+        
+        Yields:
+            Enriched speaker data
+        """
+        async for batch in abatch(speakers, batch_size, delay=1):
+            for enriched_speaker in await self.enrich_speakers_batch(batch):
+                yield enriched_speaker
+
 
 # Example usage
 if __name__ == "__main__":
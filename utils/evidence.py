@@ -0,0 +1,190 @@
+"""
+Relevance-ranked, token-budgeted company evidence for classification prompts
+Search results are split into snippets (sentences and titles), scored with BM25
+against the company name and category cues, and the best snippets are packed
+into a fixed token budget. Evidence is computed once per company and search
+result set, and stored in cache/evidence_cache.json.
+"""
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .cache_store import SAVE_EVERY, merge_save
+from .enrichment import normalize_company
+from .fingerprint import stable_hash, enrichment_hash
+
+
+EVIDENCE_VERSION = 2
+EVIDENCE_TOKEN_BUDGET = 160
+MAX_SNIPPET_CHARS = 320
+MIN_SNIPPET_CHARS = 25
+CHARS_PER_TOKEN = 4          # same estimate as the --plan fallback without tiktoken
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+COMPANY_WEIGHT = 3.0
+
+# Terms that separate the categories of the classification rubric, with query weights.
+# Words of the Tavily query itself ("construction", "drone", "technology") are left out:
+# every result matches them, generic industry articles most of all.
+CATEGORY_CUES = {
+    "dronedeploy": 4.0, "partnership": 2.0, "partnered": 2.0, "customer": 1.5, "agreement": 1.5,
+    "contractor": 1.5, "contractors": 1.5, "builder": 1.0, "engineering": 1.0, "infrastructure": 1.0,
+    "delivers": 1.0,
+    "developer": 1.5, "owner": 1.5, "property": 1.5, "estate": 1.0, "council": 1.5, "government": 1.5,
+    "authority": 1.0, "client": 1.0,
+    "software": 1.5, "platform": 1.0, "consultancy": 1.5, "consultants": 1.5, "vendor": 1.5,
+    "aerial": 0.5, "survey": 0.5, "surveying": 0.5, "mapping": 0.5, "uav": 0.5,
+}
+
+SNIPPET_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z\"“])|\s*\[\.\.\.\]\s*|\n+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def repair_text(text: str) -> str:
+    """Undo UTF-8 text that was decoded as Latin-1 ('â\\x80\\x99' → '’'), leaving clean text untouched"""
+    if "â" not in text and "Ã" not in text:
+        return text
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_snippets(search_results: List[Dict]) -> List[str]:
+    """Titles and sentences of all results, de-duplicated, each at most MAX_SNIPPET_CHARS"""
+    snippets, seen = [], set()
+    for result in search_results:
+        parts = [result.get('title', '')] + SNIPPET_SPLIT.split(repair_text(result.get('content', '')))
+        for part in parts:
+            part = " ".join(repair_text(part).lstrip("# ").split())
+            if len(part) < MIN_SNIPPET_CHARS:
+                continue
+            if len(part) > MAX_SNIPPET_CHARS:
+                part = part[:MAX_SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+            key = part.lower()
+            if key not in seen:
+                seen.add(key)
+                snippets.append(part)
+    return snippets
+
+
+def rank_snippets(snippets: List[str], company: str) -> List[float]:
+    """
+    BM25 score of each snippet against the company name and the category cues
+
+    Args:
+        snippets: Candidate snippets (the corpus for IDF and length normalization)
+        company: Company name (its words get COMPANY_WEIGHT)
+
+    Returns:
+        Score per snippet
+    """
+    query = dict(CATEGORY_CUES)
+    for word in normalize_company(company).split():
+        query[word] = query.get(word, 0.0) + COMPANY_WEIGHT
+
+    tokenized = [TOKEN_PATTERN.findall(snippet.lower()) for snippet in snippets]
+    doc_freq = Counter(term for tokens in tokenized for term in set(tokens) if term in query)
+    average_length = sum(len(tokens) for tokens in tokenized) / len(tokenized) if tokenized else 0.0
+
+    scores = []
+    for tokens in tokenized:
+        counts = Counter(tokens)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average_length) if average_length else BM25_K1
+        score = 0.0
+        for term, weight in query.items():
+            tf = counts.get(term)
+            if tf:
+                idf = math.log(1 + (len(tokenized) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+def select_evidence(search_results: List[Dict], company: str, token_budget: int = EVIDENCE_TOKEN_BUDGET) -> List[str]:
+    """Best-scoring snippets that fit in the token budget, best first"""
+    snippets = split_snippets(search_results)
+    if not snippets:
+        return []
+    scores = rank_snippets(snippets, company)
+    ranked = sorted(range(len(snippets)), key=lambda i: (-scores[i], i))
+    # With no matching terms at all, fill the budget in the original result order
+    any_match = scores[ranked[0]] > 0.0
+
+    evidence, used = [], 0
+    for i in ranked:
+        if any_match and scores[i] == 0.0:
+            break
+        tokens = estimate_tokens(snippets[i])
+        if used + tokens > token_budget:
+            continue
+        evidence.append(snippets[i])
+        used += tokens
+    return evidence
+
+
+class EvidenceBuilder:
+    """Per-company evidence, computed once and stored alongside the other caches"""
+
+    def __init__(self, cache_dir: Optional[str] = "cache", read_only: bool = False):
+        """
+        Args:
+            cache_dir: Directory of the evidence cache (None keeps it in memory only)
+            read_only: Never write the cache file (used by --plan)
+        """
+        self.cache_file = Path(cache_dir) / "evidence_cache.json" if cache_dir else None
+        self.read_only = read_only
+        self.cache = self._load_cache()
+        self.builds = 0
+        self.cache_hits = 0
+        self.unsaved = 0
+
+    def _load_cache(self) -> Dict:
+        if not self.cache_file or not self.cache_file.exists():
+            return {}
+        with open(self.cache_file, 'r') as f:
+            return json.load(f)
+
+    def _save_cache(self):
+        """Save cache to file, merged with entries other workers saved meanwhile"""
+        if not self.cache_file or self.read_only:
+            return
+
+        def merge(current):
+            for key, evidence in (current or {}).items():
+                self.cache.setdefault(key, evidence)
+            return self.cache
+
+        merge_save(self.cache_file, merge, ensure_ascii=False)
+        self.unsaved = 0
+
+    def flush(self):
+        """Save new evidence now (at checkpoints and stage ends; otherwise every SAVE_EVERY)"""
+        if self.unsaved:
+            self._save_cache()
+
+    def config_fingerprint(self) -> str:
+        return stable_hash(EVIDENCE_VERSION, EVIDENCE_TOKEN_BUDGET, MAX_SNIPPET_CHARS, CATEGORY_CUES, COMPANY_WEIGHT)
+
+    def evidence(self, enriched_data: Dict) -> List[str]:
+        """Evidence snippets for a company's search results (cached by company and documents)"""
+        key = stable_hash(normalize_company(enriched_data.get('company', '')), enrichment_hash(enriched_data),
+                          self.config_fingerprint())
+        if key in self.cache:
+            self.cache_hits += 1
+            return self.cache[key]
+        evidence = select_evidence(enriched_data.get('search_results', []), enriched_data.get('company', ''))
+        self.builds += 1
+        self.cache[key] = evidence
+        self.unsaved += 1
+        if self.unsaved >= SAVE_EVERY:
+            self._save_cache()
+        return evidence
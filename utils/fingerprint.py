@@ -0,0 +1,64 @@
+"""
+Input fingerprints for dependency-tracked incremental re-execution
+Each stage result records a hash of everything that produced it; a rerun with
+--incremental recomputes only speakers whose fingerprint changed, and because the
+email fingerprint includes the classification fingerprint, changes cascade downstream
+"""
+import hashlib
+import json
+from typing import Dict, List
+
+from .enrichment import document_id
+
+
+def stable_hash(*parts) -> str:
+    """Short deterministic hash of JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def enrichment_hash(record: Dict) -> str:
+    """Hash of the search documents behind a record (inline results or compact ids)"""
+    if 'search_result_ids' in record:
+        doc_ids = record['search_result_ids']
+    else:
+        doc_ids = [document_id(doc) for doc in record.get('search_results', [])]
+    return stable_hash(doc_ids)
+
+
+def classification_fingerprint(speaker: Dict, enrichment: Dict, classifier) -> str:
+    """
+    Fingerprint of a classification's inputs
+
+    Args:
+        speaker: Parsed speaker (page_hash identifies the source page)
+        enrichment: Enrichment record or cache entry used for the prompt
+        classifier: CompanyClassifier (model, temperature and prompt template)
+    """
+    return stable_hash(
+        speaker.get('page_hash', ''),
+        speaker.get('company', ''),
+        speaker.get('job_title', ''),
+        enrichment_hash(enrichment),
+        classifier.config_fingerprint()
+    )
+
+
+def email_fingerprint(speaker: Dict, generator) -> str:
+    """
+    Fingerprint of an email's inputs, chained to the upstream classification
+
+    The session part is the panel context the prompt shows (title, panel size and
+    co-panelist companies), so it needs the generator's session index registered.
+    """
+    sessions: List[Dict] = speaker.get('sessions', [])
+    return stable_hash(
+        speaker.get('classification_fingerprint', ''),
+        speaker.get('category', ''),
+        speaker.get('name', ''),
+        speaker.get('company', ''),
+        speaker.get('job_title', ''),
+        [session.get('title', '') for session in sessions],
+        generator._panel_context(sessions[0]) if sessions else '',
+        generator.config_fingerprint()
+    )
@@ -0,0 +1,112 @@
+"""
+Multi-event runs: several conferences processed concurrently with shared caches
+Every event runs the usual stages into its own output directory, while the
+enrichment and classification caches (and the provider concurrency limit) are
+shared, so a company researched for one event is free for the next
+"""
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .enrichment import CompanyEnricher
+from .classifier import CompanyClassifier
+from .email_generator import EmailGenerator
+from .email_qa import qa_emails
+from .scheduler import RunBudget
+from .stage1_classify import classify_all_speakers
+from .stage2_generate import generate_all_emails
+from .stage3_export import export_to_csv
+from . import run_ledger
+
+
+# Concurrent LLM calls across all events
+MAX_CONCURRENT_CALLS = 10
+
+
+def event_name(scraped_pages_dir: str) -> str:
+    """Name of an event from its pages root (in/dcw2025/scraped_pages → dcw2025)"""
+    path = Path(scraped_pages_dir).resolve()
+    return path.parent.name if path.name == "scraped_pages" else path.name
+
+
+async def run_events(scraped_pages_dirs: List[str], output_root: str = "out/events", resume=False,
+                     incremental=False, speculate=False, budget: RunBudget = None,
+                     max_concurrent_calls: int = MAX_CONCURRENT_CALLS, regenerate=True,
+                     export_options: Optional[Dict] = None) -> Dict[str, Path]:
+    """
+    Run stages 1-3 (including email QA) for several events concurrently
+
+    Args:
+        scraped_pages_dirs: Scraped speaker page roots, one per event
+        output_root: Each event writes to <output_root>/<event name>/
+        resume: Resume each event from its checkpoints
+        incremental: Recompute only speakers whose inputs changed
+        speculate: Draft emails during classification for near-certain Builders/Owners
+        budget: Optional RunBudget shared by all events
+        max_concurrent_calls: Cap on concurrent LLM calls across all events
+        regenerate: Regenerate emails that fail QA (False only reports them)
+        export_options: Keyword arguments for export_to_csv (delta export)
+
+    Returns:
+        Dictionary of event name to output directory
+    """
+    events = {}
+    for pages_dir in scraped_pages_dirs:
+        name = event_name(pages_dir)
+        if name in events:
+            raise ValueError(f"Two events resolve to the same name '{name}'; use distinct directories")
+        events[name] = pages_dir
+
+    print("🚀 Multi-event run: " + ", ".join(events))
+    print("=" * 70)
+
+    # One set of clients: caches and token accounting are shared by every event
+    enricher = CompanyEnricher()
+    classifier = CompanyClassifier()
+    generator = EmailGenerator()
+    classifier.semaphore = generator.semaphore = asyncio.Semaphore(max_concurrent_calls)
+
+    start_time = time.time()
+    items = {}
+
+    async def run_event(name: str, pages_dir: str) -> Path:
+        output_dir = Path(output_root) / name
+        classified = await classify_all_speakers(resume=resume, batch_size=10, budget=budget, speculate=speculate,
+                                                 incremental=incremental, scraped_pages_dir=pages_dir,
+                                                 output_dir=output_dir, enricher=enricher, classifier=classifier,
+                                                 generator=generator)
+        await generate_all_emails(resume=resume, batch_size=15, budget=budget, incremental=incremental,
+                                  output_dir=output_dir, generator=generator)
+        await qa_emails(output_dir=output_dir, regenerate=regenerate, budget=budget, generator=generator)
+        export_to_csv(output_dir=output_dir, **(export_options or {}))
+        items[name] = len(classified)
+        return output_dir
+
+    # The events run concurrently on shared clients, so their usage is recorded once as one stage
+    with run_ledger.suppressed():
+        output_dirs = await asyncio.gather(*(run_event(name, pages_dir) for name, pages_dir in events.items()))
+    run_ledger.record(clients=[classifier, generator], items=sum(items.values()),
+                      tavily_searches=enricher.searches, tavily_hits=enricher.cache_hits,
+                      cache_hits=classifier.cache_hits + classifier.fanouts,
+                      cache_lookups=classifier.llm_calls + classifier.cache_hits + classifier.fanouts,
+                      errors=classifier.failures + generator.failures, events=len(events))
+
+    elapsed = time.time() - start_time
+    lookups = enricher.searches + enricher.cache_hits
+    print("\n" + "=" * 70)
+    print(f"🎉 {len(events)} EVENTS COMPLETE")
+    print(f"⏱️  Total time: {elapsed:.1f} seconds ({elapsed/60:.1f} minutes)")
+    print(f"🔍 Tavily: {enricher.searches} searches, {enricher.cache_hits} cache hits"
+          f" ({enricher.cache_hits * 100 // lookups if lookups else 0}% shared/cached)")
+    print(f"🏷️  Classifications: {classifier.company_stats()} | {classifier.usage.summary()}")
+    print(f"✉️  Email tokens: {generator.usage.summary()}")
+    if budget:
+        print(f"💰 Budget: {budget.summary()}")
+    # A delta export without --snapshot writes only to deltas/
+    export_path = 'email_list.csv' if (export_options or {}).get('snapshot', True) else 'deltas'
+    for name, output_dir in zip(events, output_dirs):
+        print(f"   {name}: {output_dir / export_path}")
+    print("=" * 70)
+
+    return dict(zip(events, output_dirs))
@@ -3,9 +3,33 @@ Enhanced HTML Parser for extracting comprehensive speaker information from confe
 Extracts: name, company, job title, sessions, image URLs, and bio (if available)
 """
 from bs4 import BeautifulSoup
+import hashlib
+from html import unescape
 from pathlib import Path
 import json
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+def build_session_index(speakers: Iterable[Dict]) -> Dict[str, Dict]:
+    """
+    Index sessions by URL so panels are known up front
+    
+    Args:
+        speakers: Parsed speaker dictionaries (with speaker_id and sessions)
+    
+    Returns:
+        Dictionary of session URL to {'title', 'speakers': [{'speaker_id', 'name', 'company'}]}
+    """
+    index = {}
+    for speaker in speakers:
+        for session in speaker.get('sessions', []):
+            entry = index.setdefault(session['url'] or session['title'], {'title': session['title'], 'speakers': []})
+            entry['speakers'].append({
+                'speaker_id': speaker.get('speaker_id', ''),
+                'name': speaker.get('name', ''),
+                'company': speaker.get('company', '')
+            })
+    return index
 
 
 class SpeakerParser:
@@ -24,9 +48,11 @@ class SpeakerParser:
         """
         try:
             with open(html_path, 'r', encoding='utf-8') as f:
-                soup = BeautifulSoup(f.read(), 'html.parser')
+                html = f.read()
+            soup = BeautifulSoup(html, 'html.parser')
             
-            speaker_info = {}
+            # Content hash of the source page (input fingerprint for incremental reruns)
+            speaker_info = {'page_hash': hashlib.sha1(html.encode('utf-8')).hexdigest()[:16]}
             
             # Extract basic details from speaker-details div
             details_div = soup.find('div', class_='speaker-details')
@@ -61,11 +87,10 @@ class SpeakerParser:
             if sessions_div:
                 sessions = []
                 for link in sessions_div.find_all('a'):
-                    session_title = link.get_text(strip=True)
+                    # Titles on the site are sometimes double-encoded ("&#038;"), so unescape once more
+                    session_title = unescape(link.get_text(strip=True))
                     session_url = link.get('href', '')
                     if session_title:
-                        # Clean up HTML entities
-                        session_title = session_title.replace('&#038;', '&').replace('&#8211;', '–')
                         sessions.append({
                             'title': session_title,
                             'url': session_url
@@ -96,17 +121,15 @@ class SpeakerParser:
             print(f"Error parsing {html_path}: {e}")
             return None
     
-    def parse_all_speakers(self) -> List[Dict]:
+    def iter_speakers(self) -> Iterator[Dict]:
         """
-        Parse all speaker HTML files with enhanced extraction
+        Parse speaker HTML files one at a time
         
-        Returns:
-            List of speaker dictionaries with all available information
+        Yields:
+            Speaker dictionaries (with speaker_id) in directory order
         """
-        speakers = []
-        
         # Get all speaker directories (sorted for consistency)
-        speaker_dirs = sorted([d for d in self.speakers_dir.iterdir() if d.is_dir()])
+        speaker_dirs = sorted(d for d in self.speakers_dir.iterdir() if d.is_dir())
         
         for speaker_dir in speaker_dirs:
             html_file = speaker_dir / "index.html"
@@ -115,25 +138,30 @@ class SpeakerParser:
                 if speaker_info:
                     # Add speaker ID from directory name
                     speaker_info['speaker_id'] = speaker_dir.name
-                    speakers.append(speaker_info)
+                    yield speaker_info
                 else:
                     print(f"Warning: Could not parse speaker from {speaker_dir.name}")
+    
+    def parse_all_speakers(self) -> List[Dict]:
+        """
+        Parse all speaker HTML files with enhanced extraction
         
-        return speakers
+        Returns:
+            List of speaker dictionaries with all available information
+        """
+        return list(self.iter_speakers())
+    
+    def save_session_index(self, speakers: Iterable[Dict], output_path) -> Dict[str, Dict]:
+        """Build the session index for parsed speakers and save it next to the stage output"""
+        index = build_session_index(speakers)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        return index
     
     def get_statistics(self, speakers: List[Dict]) -> Dict:
-        """Generate statistics about the parsed data"""
-        stats = {
-            'total_speakers': len(speakers),
-            'speakers_with_bio': sum(1 for s in speakers if s.get('bio')),
-            'speakers_with_sessions': sum(1 for s in speakers if s.get('sessions')),
-            'speakers_with_image': sum(1 for s in speakers if s.get('image_url')),
-            'empty_job_titles': sum(1 for s in speakers if not s.get('job_title')),
-            'total_sessions': sum(len(s.get('sessions', [])) for s in speakers),
-            'multi_session_speakers': sum(1 for s in speakers if len(s.get('sessions', [])) > 1),
-            'companies': len(set(s.get('company', '') for s in speakers if s.get('company')))
-        }
-        return stats
+        """Generate statistics about the parsed data (vectorized over a columnar table)"""
+        from .speaker_table import SpeakerTable
+        return SpeakerTable.from_records(speakers, keep_records=False).statistics()
     
     def save_to_json(self, speakers: List[Dict], output_path: str):
         """Save parsed speakers to JSON file with statistics"""
@@ -0,0 +1,327 @@
+"""
+Dry-run planner (main.py --plan)
+Parses speakers, probes the enrichment cache and previous stage outputs, and sizes
+prompts with the real prompt builders to estimate calls, tokens, cost and wall time
+per stage, without contacting Tavily or an LLM provider
+"""
+import json
+import math
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .parser import SpeakerParser, build_session_index
+from .enrichment import CompanyEnricher
+from .classifier import CompanyClassifier, SYSTEM_PROMPT as CLASSIFY_SYSTEM, CLASSIFICATION_RUBRIC
+from .email_generator import EmailGenerator, SYSTEM_PROMPT as EMAIL_SYSTEM, EMAIL_INSTRUCTIONS
+from .fingerprint import email_fingerprint
+from .streaming import iter_records
+from .scheduler import (
+    TARGET_CATEGORIES, TAVILY_SEARCH_COST, EMAIL_SECONDS_ESTIMATE,
+    predict_category, prioritize_speakers, target_likelihood
+)
+
+
+# USD per million tokens: (input, cached input, output)
+MODEL_PRICES = {
+    CompanyClassifier.OPENAI_MODEL: (0.40, 0.10, 1.60),
+    CompanyClassifier.ANTHROPIC_MODEL: (3.00, 0.30, 15.00),
+}
+
+# Typical completion sizes (JSON classification / subject + 3-4 sentence body)
+CLASSIFY_OUTPUT_TOKENS = 80
+EMAIL_OUTPUT_TOKENS = 150
+
+# Providers only cache prompt prefixes at least this long
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# Per-call latency used when no --profile run has been recorded
+DEFAULT_LATENCY = {
+    "enrichment.enrich_company": 2.5,
+    "classifier.classify_company": 1.5,
+    "email_generator.generate_email": EMAIL_SECONDS_ESTIMATE,
+}
+
+# Batching and pauses used by the stages (see stage1_classify / stage2_generate)
+CLASSIFY_CHUNK = 10
+CLASSIFY_BATCH = 10
+ENRICH_BATCH = 5
+ENRICH_PAUSE = 1.0
+EMAIL_CHUNK = 20
+EMAIL_BATCH = 15
+LLM_PAUSE = 0.5
+
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise ~4 characters per token"""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return len(text) // 4 + 1
+
+
+def load_recorded_latency(profile_root: str = "out/profile") -> Tuple[Dict[str, float], str]:
+    """
+    Mean provider latency per call site from the most recent --profile run
+
+    Returns:
+        Tuple of (latency by call site, description of the source)
+    """
+    latency = dict(DEFAULT_LATENCY)
+    reports = sorted(Path(profile_root).glob("*/loop_health.json"))
+    if not reports:
+        return latency, "defaults (run with --profile to record latency)"
+
+    with open(reports[-1], 'r') as f:
+        call_sites = json.load(f).get("call_sites", {})
+    for site, stats in call_sites.items():
+        if stats.get("mean_remote_wall_s"):
+            latency[site] = stats["mean_remote_wall_s"]
+    return latency, str(reports[-1])
+
+
+def llm_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """Estimated USD for a number of tokens on a model"""
+    input_price, cached_price, output_price = MODEL_PRICES.get(model, MODEL_PRICES[CompanyClassifier.OPENAI_MODEL])
+    return ((input_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + output_tokens * output_price) / 1_000_000
+
+
+def _cached_prefix_tokens(prefix_tokens: int, calls: int) -> int:
+    """Input tokens served from the provider prompt cache (every call after the first)"""
+    if prefix_tokens < PROMPT_CACHE_MIN_TOKENS or calls < 2:
+        return 0
+    return prefix_tokens * (calls - 1)
+
+
+def _batched_seconds(count: int, batch: int, latency: float, pause: float) -> float:
+    """Wall time of `count` calls run `batch` at a time with a pause between batches"""
+    batches = math.ceil(count / batch)
+    return batches * latency + max(0, batches - 1) * pause
+
+
+def _load_ids(path: Path, key: str) -> set:
+    if not path.exists():
+        return set()
+    with open(path, 'r') as f:
+        return set(json.load(f).get(key, []))
+
+
+def plan_run(resume: bool = False, incremental: bool = False,
+             scraped_pages_dir: str = "in/scraped_pages") -> Dict:
+    """
+    Estimate what a full run would do, without calling any provider
+
+    Args:
+        resume: Account for speakers already in the stage checkpoints
+        incremental: Account for previous results whose input fingerprint is unchanged
+        scraped_pages_dir: Root of the scraped speaker pages
+
+    Returns:
+        Dictionary with per-stage estimates
+    """
+    print("=" * 70)
+    print("PLAN: DRY RUN (no provider calls)")
+    print("=" * 70)
+
+    parse_start = time.time()
+    speakers = SpeakerParser(scraped_pages_dir).parse_all_speakers()
+    parse_seconds = time.time() - parse_start
+
+    enricher = CompanyEnricher(offline=True)
+    classifier = CompanyClassifier(offline=True)
+    generator = EmailGenerator(offline=True)
+    # Panel context is part of the email prompt and fingerprint, as in stage 2
+    generator.add_sessions(build_session_index(speakers))
+    latency, latency_source = load_recorded_latency()
+
+    # --- Stage 1: which speakers still need classification --------------------------
+    done_keys = set()
+    if resume:
+        checkpoint = Path("out/checkpoint_classify.json")
+        if checkpoint.exists():
+            with open(checkpoint, 'r') as f:
+                done_keys = {f"{s['name']}|{s['company']}" for s in json.load(f).get('results', [])}
+
+    previous: Dict[str, Dict] = {}
+    classified_file = Path("out/speakers_classified.json")
+    if incremental and classified_file.exists():
+        previous = {s.get('speaker_id'): s for s in iter_records(classified_file)}
+
+    to_classify: List[Dict] = []
+    reused: List[Dict] = []
+    for speaker in speakers:
+        if f"{speaker.get('name')}|{speaker.get('company')}" in done_keys:
+            continue
+        prev = previous.get(speaker['speaker_id'])
+        cached = enricher.get_cached(speaker.get('company', ''), speaker.get('name', ''))
+        if classifier.reuse_previous(speaker, prev, cached):
+            reused.append(prev)
+        else:
+            to_classify.append(speaker)
+    to_classify = prioritize_speakers(to_classify, enricher)
+
+    # Enrichment: cache probes (a key searched once in the run is cached for the rest)
+    searched = set()
+    uncached_flags = []
+    for speaker in to_classify:
+        key = enricher._get_cache_key(speaker.get('company', ''), speaker.get('name', ''))
+        uncached = enricher.get_cached(speaker.get('company', ''), speaker.get('name', '')) is None and key not in searched
+        if uncached:
+            searched.add(key)
+        uncached_flags.append(uncached)
+    searches = sum(uncached_flags)
+
+    # Classification prompts from the real builder; uncached companies get the mean cached context size.
+    # One call per company: inputs already in the classification cache (or a company planned
+    # earlier in this run) need no call.
+    classify_prefix = count_tokens(f"{CLASSIFY_SYSTEM}\n\n{CLASSIFICATION_RUBRIC}")
+    context_tokens = []
+    llm_flags = []
+    # Companies of reused speakers are registered with the classifier: their changed speakers fan out
+    planned_companies = set(classifier.company_results)
+    expected_targets: List[Tuple[Dict, str, float]] = []
+    for speaker in to_classify:
+        cached = enricher.get_cached(speaker.get('company', ''), speaker.get('name', ''))
+        enriched = {**cached, **speaker} if cached else speaker
+        known = classifier.get_cached(enriched) if cached else None
+        if known:
+            llm_flags.append(False)
+            if known['category'] in TARGET_CATEGORIES:
+                expected_targets.append((speaker, known['category'], 1.0))
+            continue
+        company = classifier.company_key(enriched)
+        llm_flags.append(company not in planned_companies)
+        if cached and company not in planned_companies:
+            context_tokens.append(count_tokens(classifier._create_classification_context(enriched)))
+        planned_companies.add(company)
+        search_results = cached.get('search_results', []) if cached else []
+        category, confidence = predict_category(speaker.get('company', ''), search_results)
+        expected_targets.append((speaker, category if category in TARGET_CATEGORIES else "Builder",
+                                 target_likelihood(category, confidence)))
+    if context_tokens:
+        mean_context = sum(context_tokens) / len(context_tokens)
+    else:
+        mean_context = count_tokens(classifier._create_classification_context({"company": "", "search_results": []})) + 150
+    classify_calls = sum(llm_flags)
+    classify_input = round(sum(context_tokens) + (classify_calls - len(context_tokens)) * mean_context) + classify_prefix * classify_calls
+    classify_cached = _cached_prefix_tokens(classify_prefix, classify_calls)
+    classify_output = classify_calls * CLASSIFY_OUTPUT_TOKENS
+
+    enrich_seconds = 0.0
+    classify_seconds = 0.0
+    for i in range(0, len(to_classify), CLASSIFY_CHUNK):
+        chunk_flags = uncached_flags[i:i + CLASSIFY_CHUNK]
+        for j in range(0, len(chunk_flags), ENRICH_BATCH):
+            if any(chunk_flags[j:j + ENRICH_BATCH]):
+                enrich_seconds += latency["enrichment.enrich_company"]
+            if j + ENRICH_BATCH < len(chunk_flags):
+                enrich_seconds += ENRICH_PAUSE
+        if any(llm_flags[i:i + CLASSIFY_CHUNK]):
+            classify_seconds += _batched_seconds(sum(llm_flags[i:i + CLASSIFY_CHUNK]), CLASSIFY_BATCH,
+                                                 latency["classifier.classify_company"], LLM_PAUSE)
+
+    # --- Stage 2: expected Builders/Owners that still need an email -----------------
+    email_done = _load_ids(Path("out/checkpoint_emails.json"), 'processed') if resume else set()
+    previous_emails: Dict[str, Dict] = {}
+    emails_file = Path("out/speakers_with_emails.json")
+    if incremental and emails_file.exists():
+        previous_emails = {s.get('speaker_id'): s for s in iter_records(emails_file)}
+
+    email_candidates = [(s, s['category'], 1.0) for s in reused if s.get('category') in TARGET_CATEGORIES]
+    email_candidates += expected_targets
+
+    email_prefix = count_tokens(f"{EMAIL_SYSTEM}\n\n{EMAIL_INSTRUCTIONS}")
+    email_calls = 0.0
+    email_input = 0.0
+    emails_reused = 0
+    for speaker, category, likelihood in email_candidates:
+        if f"{speaker.get('name')}_{speaker.get('company')}" in email_done:
+            continue
+        prev = previous_emails.get(speaker.get('speaker_id'))
+        if likelihood == 1.0 and prev and prev.get('email_subject') and \
+                prev.get('email_fingerprint') == email_fingerprint(speaker, generator):
+            emails_reused += 1
+            continue
+        email_calls += likelihood
+        email_input += likelihood * (email_prefix + count_tokens(
+            generator._create_email_context({**speaker, "category": category})))
+    email_calls_rounded = round(email_calls)
+    email_cached = _cached_prefix_tokens(email_prefix, email_calls_rounded)
+    email_output = email_calls_rounded * EMAIL_OUTPUT_TOKENS
+    email_seconds = sum(
+        _batched_seconds(min(EMAIL_CHUNK, email_calls_rounded - i), EMAIL_BATCH,
+                         latency["email_generator.generate_email"], LLM_PAUSE)
+        for i in range(0, email_calls_rounded, EMAIL_CHUNK)
+    )
+
+    classify_model = classifier.model_name()
+    email_model = generator.model_name()
+    plan = {
+        "speakers": len(speakers),
+        "latency_source": latency_source,
+        "stage1_classify": {
+            "speakers": len(to_classify),
+            "reused": len(reused) + len(done_keys),
+            "tavily_searches": searches,
+            "tavily_cache_hits": len(to_classify) - searches,
+            "companies": len(planned_companies),
+            "classification_cache_hits": len(to_classify) - classify_calls,
+            "llm_calls": classify_calls,
+            "input_tokens": classify_input,
+            "cached_input_tokens": classify_cached,
+            "output_tokens": classify_output,
+            "cost_usd": round(searches * TAVILY_SEARCH_COST
+                              + llm_cost(classify_model, classify_input, classify_cached, classify_output), 4),
+            "seconds": round(parse_seconds + enrich_seconds + classify_seconds, 1),
+        },
+        "stage2_generate": {
+            "expected_targets": round(email_calls) + emails_reused,
+            "reused": emails_reused + len(email_done),
+            "llm_calls": email_calls_rounded,
+            "input_tokens": round(email_input),
+            "cached_input_tokens": email_cached,
+            "output_tokens": email_output,
+            "cost_usd": round(llm_cost(email_model, round(email_input), email_cached, email_output), 4),
+            "seconds": round(email_seconds, 1),
+        },
+        "stage3_export": {"llm_calls": 0, "cost_usd": 0.0, "seconds": 1.0},
+    }
+
+    stage1, stage2 = plan["stage1_classify"], plan["stage2_generate"]
+    total_cost = stage1["cost_usd"] + stage2["cost_usd"]
+    total_seconds = stage1["seconds"] + stage2["seconds"] + plan["stage3_export"]["seconds"]
+    plan["total"] = {"cost_usd": round(total_cost, 4), "seconds": round(total_seconds, 1)}
+
+    print(f"📋 {len(speakers)} speakers parsed in {parse_seconds:.1f}s | models: {classify_model} / {email_model}")
+    print(f"   Latency: {latency_source}")
+    print("\n🏷️  Stage 1: enrichment + classification")
+    print(f"   Speakers: {len(to_classify)} to classify, {stage1['reused']} already done")
+    print(f"   Tavily: {searches} searches, {stage1['tavily_cache_hits']} cache hits (~${searches * TAVILY_SEARCH_COST:.2f})")
+    print(f"   LLM: {classify_calls} calls for {stage1['companies']} new companies ({stage1['classification_cache_hits']} speakers cached or shared with their company) | input {classify_input:,} tokens ({classify_cached:,} cacheable) | "
+          f"output ~{classify_output:,} tokens")
+    print(f"   Cost: ~${stage1['cost_usd']:.2f} | Time: ~{stage1['seconds'] / 60:.1f} min "
+          f"(enrich {enrich_seconds:.0f}s, classify {classify_seconds:.0f}s)")
+    print("\n✉️  Stage 2: email generation")
+    print(f"   Expected Builders/Owners: ~{stage2['expected_targets']} ({stage2['reused']} emails already done)")
+    print(f"   LLM: ~{email_calls_rounded} calls | input ~{stage2['input_tokens']:,} tokens "
+          f"({email_cached:,} cacheable) | output ~{email_output:,} tokens")
+    print(f"   Cost: ~${stage2['cost_usd']:.2f} | Time: ~{stage2['seconds'] / 60:.1f} min")
+    print("\n" + "=" * 70)
+    print(f"💰 Estimated total: ~${total_cost:.2f} | ⏱️  ~{total_seconds / 60:.1f} minutes")
+    print("=" * 70)
+
+    return plan
+
+
+if __name__ == "__main__":
+    import sys
+    plan_run(resume="--resume" in sys.argv, incremental="--incremental" in sys.argv)
@@ -0,0 +1,248 @@
+"""
+Built-in profiling and event-loop health monitoring (main.py --profile)
+- Per-stage CPU profiles (cProfile) with text summaries
+- Event-loop lag sampling, plus stacks of whatever blocked the loop (watchdog thread)
+- Awaited vs blocked time per instrumented call site
+Artifacts are written to out/profile/<timestamp>/
+"""
+import asyncio
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+LAG_INTERVAL = 0.02          # seconds between loop-lag samples
+SLOW_CALLBACK_SECONDS = 0.1  # loop stalls longer than this get a stack capture
+REMOTE_CALL_SECONDS = 0.05   # calls slower than this went to the provider (not a cache hit)
+
+# (module, class, method, call site label) instrumented while profiling
+CALL_SITES = [
+    ("utils.enrichment", "CompanyEnricher", "enrich_company", "enrichment.enrich_company"),
+    ("utils.classifier", "CompanyClassifier", "classify_company", "classifier.classify_company"),
+    ("utils.email_generator", "EmailGenerator", "generate_email", "email_generator.generate_email"),
+]
+
+_active: Optional["Profiler"] = None
+
+
+class _InstrumentedAwaitable:
+    """Drive a coroutine step by step, timing the synchronous steps (loop blocked)"""
+
+    def __init__(self, coro, on_done):
+        self.coro = coro
+        self.on_done = on_done
+
+    def __await__(self):
+        start = time.perf_counter()
+        blocked = 0.0
+        value, error = None, None
+        try:
+            while True:
+                step = time.perf_counter()
+                try:
+                    future = self.coro.throw(error) if error is not None else self.coro.send(value)
+                except StopIteration as stop:
+                    blocked += time.perf_counter() - step
+                    return stop.value
+                blocked += time.perf_counter() - step
+                value, error = None, None
+                try:
+                    value = yield future
+                except BaseException as e:
+                    error = e
+        finally:
+            self.on_done(time.perf_counter() - start, blocked)
+
+
+class Profiler:
+    """Collect CPU profiles, loop lag, slow-callback stacks and call-site timings for one run"""
+
+    def __init__(self, output_root: str = "out/profile"):
+        self.output_dir = Path(output_root) / time.strftime("%Y%m%d-%H%M%S")
+        self.stage_times: Dict[str, float] = {}
+        self.lag_samples: List[float] = []
+        self.stalls: Dict[str, Dict] = {}
+        self.call_sites: Dict[str, Dict] = {}
+        self._patched = []
+        self._last_tick = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._monitor_task = None
+        self._watchdog = None
+        self._stopping = threading.Event()
+
+    # --- call sites -----------------------------------------------------------------
+
+    def _record_call(self, site: str, wall: float, blocked: float):
+        stats = self.call_sites.setdefault(site, {"calls": 0, "wall": 0.0, "blocked": 0.0, "max_blocked": 0.0,
+                                                  "remote_calls": 0, "remote_wall": 0.0})
+        stats["calls"] += 1
+        stats["wall"] += wall
+        if wall >= REMOTE_CALL_SECONDS:
+            stats["remote_calls"] += 1
+            stats["remote_wall"] += wall
+        stats["blocked"] += blocked
+        stats["max_blocked"] = max(stats["max_blocked"], blocked)
+
+    def _instrument(self):
+        """Wrap the configured coroutine methods so each call records awaited vs blocked time"""
+        import importlib
+
+        for module_name, class_name, method_name, site in CALL_SITES:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            original = getattr(cls, method_name)
+
+            def wrapper(*args, _original=original, _site=site, **kwargs):
+                on_done = lambda wall, blocked: self._record_call(_site, wall, blocked)
+                return _InstrumentedAwaitable(_original(*args, **kwargs), on_done)
+
+            setattr(cls, method_name, wrapper)
+            self._patched.append((cls, method_name, original))
+
+    def _restore(self):
+        for cls, method_name, original in self._patched:
+            setattr(cls, method_name, original)
+        self._patched = []
+
+    # --- event loop health ----------------------------------------------------------
+
+    async def _monitor_loop(self):
+        """Sample how late the loop wakes us up (lag) and tick the watchdog"""
+        while True:
+            expected = time.perf_counter() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            now = time.perf_counter()
+            self.lag_samples.append(max(0.0, now - expected))
+            self._last_tick = now
+
+    def _watch(self):
+        """Watchdog thread: capture the loop thread's stack while the loop is stalled"""
+        stall_start, stack = None, None
+        while not self._stopping.wait(SLOW_CALLBACK_SECONDS / 4):
+            stalled_for = time.perf_counter() - self._last_tick
+            if stalled_for > SLOW_CALLBACK_SECONDS + LAG_INTERVAL:
+                if stall_start is None:
+                    stall_start = self._last_tick
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    stack = "".join(traceback.format_stack(frame, limit=15)) if frame else "<unknown>"
+            elif stall_start is not None:
+                duration = self._last_tick - stall_start - LAG_INTERVAL
+                entry = self.stalls.setdefault(stack, {"count": 0, "total": 0.0, "max": 0.0})
+                entry["count"] += 1
+                entry["total"] += duration
+                entry["max"] = max(entry["max"], duration)
+                stall_start, stack = None, None
+
+    # --- lifecycle ------------------------------------------------------------------
+
+    def start(self):
+        """Start monitoring (must be called from the running event loop)"""
+        global _active
+        _active = self
+        self._instrument()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.perf_counter()
+        self._monitor_task = asyncio.ensure_future(self._monitor_loop())
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        """Stop monitoring, restore instrumented methods and write the report"""
+        global _active
+        _active = None
+        self._stopping.set()
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        if self._watchdog:
+            self._watchdog.join()
+        self._restore()
+        self.write_report()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """CPU-profile one stage and write <name>.prof / <name>.txt"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.stage_times[name] = time.perf_counter() - start
+            profile.dump_stats(str(self.output_dir / f"{name}.prof"))
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(30)
+            (self.output_dir / f"{name}.txt").write_text(summary.getvalue())
+
+    # --- reporting ------------------------------------------------------------------
+
+    def _lag_summary(self) -> Dict:
+        samples = sorted(self.lag_samples)
+        if not samples:
+            return {"samples": 0}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1)
+
+        return {
+            "samples": len(samples),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1] * 1000, 1),
+            "over_threshold": sum(1 for s in samples if s > SLOW_CALLBACK_SECONDS)
+        }
+
+    def write_report(self):
+        """Write loop lag, slow callback stacks and call-site timings; print a summary"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        lag = self._lag_summary()
+        call_sites = {
+            site: {
+                "calls": s["calls"],
+                "wall_s": round(s["wall"], 3),
+                "awaited_s": round(s["wall"] - s["blocked"], 3),
+                "blocked_s": round(s["blocked"], 3),
+                "max_blocked_s": round(s["max_blocked"], 3),
+                "remote_calls": s["remote_calls"],
+                "mean_remote_wall_s": round(s["remote_wall"] / s["remote_calls"], 3) if s["remote_calls"] else None
+            }
+            for site, s in self.call_sites.items()
+        }
+
+        with open(self.output_dir / "loop_health.json", 'w') as f:
+            json.dump({
+                "stage_seconds": {k: round(v, 3) for k, v in self.stage_times.items()},
+                "loop_lag": lag,
+                "call_sites": call_sites
+            }, f, indent=2)
+
+        with open(self.output_dir / "slow_callbacks.txt", 'w') as f:
+            for stack, entry in sorted(self.stalls.items(), key=lambda item: -item[1]["total"]):
+                f.write(f"=== {entry['count']} stalls, {entry['total']:.2f}s total, {entry['max']:.2f}s max ===\n")
+                f.write(stack + "\n")
+
+        print("\n" + "=" * 70)
+        print("🔬 PROFILE")
+        for name, seconds in self.stage_times.items():
+            print(f"   {name}: {seconds:.1f}s (CPU profile: {self.output_dir / (name + '.prof')})")
+        if lag.get("samples"):
+            print(f"   Loop lag: p50 {lag['p50_ms']}ms | p99 {lag['p99_ms']}ms | max {lag['max_ms']}ms | "
+                  f"{len(self.stalls)} distinct blocking stacks")
+        for site, s in call_sites.items():
+            print(f"   {site}: {s['calls']} calls | awaited {s['awaited_s']}s | blocked {s['blocked_s']}s")
+        print(f"   Artifacts: {self.output_dir}")
+        print("=" * 70)
+
+
+def stage(name: str):
+    """Profile a stage if --profile is active, otherwise do nothing"""
+    return _active.stage(name) if _active else contextlib.nullcontext()
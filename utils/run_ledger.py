@@ -0,0 +1,327 @@
+"""
+Persistent run ledger (out/run_ledger.db) and cross-run comparison (main.py --compare)
+Every main.py run appends a record: configuration, status, and per-stage timings,
+item counts, LLM calls/latency/tokens, estimated cost, cache hit rates and errors.
+Stages report their metrics with record(); main.py opens and times the stages.
+"""
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+DEFAULT_DB_PATH = "out/run_ledger.db"
+
+# Additive per-stage metrics (ledger columns)
+METRICS = ["items", "llm_calls", "llm_seconds", "input_tokens", "cached_input_tokens", "output_tokens",
+           "cost_usd", "tavily_searches", "tavily_hits", "cache_hits", "cache_lookups", "errors"]
+
+_active: Optional["RunRecorder"] = None
+
+
+class RunLedger:
+    """SQLite history of pipeline runs and their stages"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                command TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                config TEXT NOT NULL
+            )
+        """)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS stages (
+                run_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                seconds REAL NOT NULL,
+                {", ".join(f"{metric} REAL NOT NULL DEFAULT 0" for metric in METRICS)},
+                extra TEXT NOT NULL DEFAULT '{{}}',
+                PRIMARY KEY (run_id, stage)
+            )
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def start_run(self, command: str, config: Dict) -> int:
+        cursor = self.conn.execute(
+            "INSERT INTO runs (started_at, command, status, config) VALUES (?, ?, 'running', ?)",
+            (time.time(), command, json.dumps(config, sort_keys=True))
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id: int, status: str, error: Optional[str] = None):
+        self.conn.execute("UPDATE runs SET finished_at = ?, status = ?, error = ? WHERE run_id = ?",
+                          (time.time(), status, error, run_id))
+        self.conn.commit()
+
+    def add_stage(self, run_id: int, stage: str, started_at: float, seconds: float, metrics: Dict, extra: Dict):
+        columns = ["run_id", "stage", "started_at", "seconds"] + METRICS + ["extra"]
+        values = [run_id, stage, started_at, seconds] + [metrics.get(m, 0) for m in METRICS] + [json.dumps(extra, sort_keys=True)]
+        self.conn.execute(f"INSERT OR REPLACE INTO stages ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                          values)
+        self.conn.commit()
+
+    def runs(self, limit: int = 10) -> List[Dict]:
+        """Most recent runs, newest first"""
+        self.conn.row_factory = sqlite3.Row
+        rows = self.conn.execute("SELECT * FROM runs ORDER BY run_id DESC LIMIT ?", (limit,)).fetchall()
+        self.conn.row_factory = None
+        return [dict(row) for row in rows]
+
+    def run(self, run_id: int) -> Optional[Dict]:
+        """A run with its stages ({stage: metrics}), or None"""
+        self.conn.row_factory = sqlite3.Row
+        row = self.conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        stages = self.conn.execute("SELECT * FROM stages WHERE run_id = ? ORDER BY started_at", (run_id,)).fetchall()
+        self.conn.row_factory = None
+        if row is None:
+            return None
+        run = dict(row)
+        run['config'] = json.loads(run['config'])
+        run['stages'] = {stage['stage']: dict(stage) for stage in stages}
+        return run
+
+
+class RunRecorder:
+    """Collects one run's stage metrics and writes them to the ledger"""
+
+    def __init__(self, ledger: RunLedger, command: str, config: Dict):
+        self.ledger = ledger
+        self.run_id = ledger.start_run(command, config)
+        self.current: Optional[Dict] = None
+        self.suppressed = 0
+        # Usage already attributed per client: clients shared by several stages count once
+        self.attributed: Dict[int, tuple] = {}  # id -> (client, usage totals)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Time a stage; metrics reported with record() while it is open are stored with it"""
+        outer = self.current
+        self.current = {"metrics": {}, "extra": {}, "clients": {}}
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stage, self.current = self.current, outer
+            self._add_usage(stage)
+            self.ledger.add_stage(self.run_id, name, started_at, seconds, stage["metrics"], stage["extra"])
+
+    def _add_usage(self, stage: Dict):
+        """Token, latency and cost totals of the LLM clients used in a stage"""
+        clients = list(stage["clients"].values())
+        if not clients:
+            return
+        from .planner import llm_cost
+
+        metrics = stage["metrics"]
+        stage["extra"]["models"] = sorted({client.model_name() for client in clients})
+        for client in clients:
+            usage = client.usage
+            totals = (usage.calls, usage.latency_seconds, usage.input_tokens, usage.cached_input_tokens,
+                      usage.output_tokens)
+            _, previous = self.attributed.get(id(client), (client, (0, 0.0, 0, 0, 0)))
+            self.attributed[id(client)] = (client, totals)
+            calls, seconds, input_tokens, cached_tokens, output_tokens = (
+                now - before for now, before in zip(totals, previous))
+            metrics["llm_calls"] = metrics.get("llm_calls", 0) + calls
+            metrics["llm_seconds"] = metrics.get("llm_seconds", 0) + seconds
+            metrics["input_tokens"] = metrics.get("input_tokens", 0) + input_tokens
+            metrics["cached_input_tokens"] = metrics.get("cached_input_tokens", 0) + cached_tokens
+            metrics["output_tokens"] = metrics.get("output_tokens", 0) + output_tokens
+            metrics["cost_usd"] = metrics.get("cost_usd", 0) + llm_cost(
+                client.model_name(), input_tokens, cached_tokens, output_tokens)
+
+
+def start(command: str, config: Dict, db_path: str = DEFAULT_DB_PATH) -> RunRecorder:
+    """Start recording a run (main.py); stages then report with record()"""
+    global _active
+    _active = RunRecorder(RunLedger(db_path), command, config)
+    return _active
+
+
+def finish(status: str = "ok", error: Optional[str] = None):
+    """Mark the active run finished and close the ledger"""
+    global _active
+    if _active is None:
+        return
+    _active.ledger.finish_run(_active.run_id, status, error)
+    _active.ledger.close()
+    _active = None
+
+
+def stage(name: str):
+    """Time and record a stage if a run is being recorded, otherwise do nothing"""
+    return _active.stage(name) if _active else contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def suppressed():
+    """Ignore record() calls (e.g. per-event stages whose shared clients are recorded once by the caller)"""
+    if _active is None:
+        yield
+        return
+    _active.suppressed += 1
+    try:
+        yield
+    finally:
+        _active.suppressed -= 1
+
+
+def record(clients=(), **metrics):
+    """
+    Report metrics for the open stage (no-op when no run or stage is being recorded)
+
+    Args:
+        clients: LLM clients (CompanyClassifier / EmailGenerator) whose token usage,
+            latency and cost belong to this stage; each is counted once per stage
+        **metrics: Additive METRICS (items, errors, tavily_searches, ...) or extra
+            values such as batch_size, stored as JSON
+    """
+    if _active is None or _active.current is None or _active.suppressed:
+        return
+    stage = _active.current
+    for client in clients:
+        if client is not None:
+            stage["clients"][id(client)] = client
+    for key, value in metrics.items():
+        if key in METRICS:
+            stage["metrics"][key] = stage["metrics"].get(key, 0) + value
+        else:
+            stage["extra"][key] = value
+
+
+def run_config() -> Dict:
+    """Configuration shared by every stage of a run"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "argv": sys.argv[1:],
+        "provider": "openai" if os.getenv("OPENAI_API_KEY") else "anthropic" if os.getenv("ANTHROPIC_API_KEY") else "",
+        "git_commit": commit,
+        "python": platform.python_version()
+    }
+
+
+# --- comparison -------------------------------------------------------------------
+
+def _totals(run: Dict) -> Dict:
+    totals = {metric: sum(stage[metric] for stage in run['stages'].values()) for metric in METRICS}
+    totals['seconds'] = (run['finished_at'] or run['started_at']) - run['started_at']
+    return totals
+
+
+def _derived(metrics: Dict) -> Dict:
+    """Throughput, latency, cache and cost figures shown by --compare"""
+    from .scheduler import TAVILY_SEARCH_COST
+
+    tavily_lookups = metrics['tavily_searches'] + metrics['tavily_hits']
+    return {
+        "seconds": metrics['seconds'],
+        "items": metrics['items'],
+        "items/s": metrics['items'] / metrics['seconds'] if metrics['seconds'] else None,
+        "llm calls": metrics['llm_calls'],
+        "llm latency (s)": metrics['llm_seconds'] / metrics['llm_calls'] if metrics['llm_calls'] else None,
+        "input tokens": metrics['input_tokens'],
+        "output tokens": metrics['output_tokens'],
+        "prompt cache %": 100 * metrics['cached_input_tokens'] / metrics['input_tokens'] if metrics['input_tokens'] else None,
+        "tavily hit %": 100 * metrics['tavily_hits'] / tavily_lookups if tavily_lookups else None,
+        "result cache hit %": 100 * metrics['cache_hits'] / metrics['cache_lookups'] if metrics['cache_lookups'] else None,
+        "cost ($)": metrics['cost_usd'] + metrics['tavily_searches'] * TAVILY_SEARCH_COST,
+        "errors": metrics['errors'],
+    }
+
+
+def _format(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float) and not value.is_integer():
+        return f"{value:,.3f}" if abs(value) < 10 else f"{value:,.1f}"
+    return f"{int(value):,}"
+
+
+def _delta(a, b) -> str:
+    if a is None or b is None:
+        return ""
+    if a == 0:
+        return "" if b == 0 else "new"
+    return f"{(b - a) / abs(a) * 100:+.0f}%"
+
+
+def compare_runs(run_a: Optional[int] = None, run_b: Optional[int] = None, db_path: str = DEFAULT_DB_PATH) -> bool:
+    """
+    Print throughput, latency and cost deltas between two runs (default: the last two)
+
+    Returns:
+        False if the runs could not be found
+    """
+    if not Path(db_path).exists():
+        print(f"❌ No run ledger yet ({db_path}); it is written by every main.py run")
+        return False
+    ledger = RunLedger(db_path)
+    try:
+        if run_a is None or run_b is None:
+            recent = ledger.runs(limit=2)
+            if len(recent) < 2:
+                print("❌ Need at least two recorded runs to compare")
+                return False
+            run_a, run_b = recent[1]['run_id'], recent[0]['run_id']
+        runs = [ledger.run(run_a), ledger.run(run_b)]
+    finally:
+        ledger.close()
+    for run_id, run in zip((run_a, run_b), runs):
+        if run is None:
+            print(f"❌ Run {run_id} not found in {db_path}")
+            return False
+
+    print("=" * 78)
+    print(f"📈 RUN COMPARISON: #{run_a} → #{run_b}")
+    print("=" * 78)
+    for run in runs:
+        started = time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started_at']))
+        config = run['config']
+        print(f"   #{run['run_id']}: {started} | {run['command']} | {run['status']} | "
+              f"commit {config.get('git_commit') or '?'} | {' '.join(config.get('argv', [])) or '(default run)'}")
+
+    sections = [("TOTAL", _totals(runs[0]), _totals(runs[1]))]
+    for name in dict.fromkeys([*runs[0]['stages'], *runs[1]['stages']]):
+        a, b = runs[0]['stages'].get(name), runs[1]['stages'].get(name)
+        if a and b:
+            sections.append((name, a, b))
+        else:
+            print(f"   {name}: only in run #{run_a if a else run_b}")
+
+    for name, a, b in sections:
+        print(f"\n   {name}")
+        print(f"   {'':<20}{'#' + str(run_a):>14}{'#' + str(run_b):>14}{'Δ':>9}")
+        derived_a, derived_b = _derived(a), _derived(b)
+        for label in derived_a:
+            if derived_a[label] in (None, 0) and derived_b[label] in (None, 0):
+                continue
+            print(f"   {label:<20}{_format(derived_a[label]):>14}{_format(derived_b[label]):>14}"
+                  f"{_delta(derived_a[label], derived_b[label]):>9}")
+    print("=" * 78)
+    return True
@@ -0,0 +1,172 @@
+"""
+Priority scheduling and run budgets for the pipeline
+Scores speakers cheaply (no API calls) so likely Builders/Owners are processed first,
+and enforces optional wall-time and spend limits across stages
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .enrichment import normalize_company
+
+
+# Rough per-call cost estimates in USD (used for --max-cost accounting)
+TAVILY_SEARCH_COST = 0.016   # advanced search = 2 credits
+LLM_CALL_COST = 0.002        # ~$0.80 for 400 speakers with gpt-4.1-mini
+
+# Rough wall time per email generation call, reserved while classifying
+EMAIL_SECONDS_ESTIMATE = 1.5
+
+# Categories that receive outreach emails
+TARGET_CATEGORIES = ["Builder", "Owner"]
+
+# Existing DroneDeploy customers (see classification prompt)
+KNOWN_CUSTOMERS = ["kier", "laing o'rourke", "laing o’rourke", "laing o'rouke"]
+
+KNOWN_COMPETITORS = ["dronedeploy", "propeller", "pix4d", "skycatch"]
+
+KNOWN_BUILDERS = [
+    "multiplex", "balfour beatty", "skanska", "mace", "sisk", "kiewit", "bouygues",
+    "bovis", "mcalpine", "gilbert ash", "bam", "volkerwessels", "vinci", "ferrovial",
+    "graham", "wates", "structure tone", "henry boot", "mclaren"
+]
+
+KNOWN_PARTNERS = ["autodesk", "trimble", "oracle", "microsoft", "procore", "bentley"]
+
+BUILDER_KEYWORDS = ["construction", "contractor", "builders", "civil engineering", "engineering services"]
+
+OWNER_KEYWORDS = [
+    "council", "authority", "homes", "housing", "properties", "property", "estates",
+    "developments", "airport", "heathrow", "nhs", "government", "department for",
+    "corporation", "wharf", "grosvenor", "severn trent", "infrastructure organisation"
+]
+
+# Checked before builder keywords ("Autodesk Construction Solutions" is a Partner)
+STRONG_PARTNER_KEYWORDS = ["software", "solutions", "technologies", "university", "institute", "academy"]
+
+PARTNER_KEYWORDS = ["technology", "consulting", "consultancy", "digital", "systems", "architects", "architecture"]
+
+CUSTOMER_PHRASES = [
+    "partnership with dronedeploy", "partners with dronedeploy", "uses dronedeploy",
+    "chosen dronedeploy", "dronedeploy customer", "agreement with dronedeploy"
+]
+
+# Likelihood that a speaker with no local signal turns out to be a Builder/Owner
+UNKNOWN_PRIOR = 0.3
+
+
+def _mentions(name: str, phrases: List[str]) -> bool:
+    """True if any phrase occurs in the padded, normalized name as whole words ("mace" not in "pharmaceutical")"""
+    return any(f" {phrase} " in name for phrase in phrases)
+
+
+def predict_category(company: str, search_results: Optional[List[Dict]] = None) -> Tuple[str, float]:
+    """
+    Predict a company's category from its name and any cached search results
+
+    Returns:
+        Tuple of (category, confidence); confidence is 0.0 when there is no signal
+    """
+    if not company:
+        return "Other", 0.5
+
+    # Padded so phrases match whole words only; possessives count as the word ("University's")
+    name = f" {normalize_company(company)} ".replace("'s ", " ")
+
+    if _mentions(name, KNOWN_CUSTOMERS):
+        return "Customer", 0.9
+
+    if _mentions(name, KNOWN_COMPETITORS):
+        return "Competitor", 0.9
+
+    # Cached enrichment can reveal existing DroneDeploy customers
+    for result in search_results or []:
+        text = f"{result.get('title', '')} {result.get('content', '')}".lower()
+        if company.lower() in text and any(phrase in text for phrase in CUSTOMER_PHRASES):
+            return "Customer", 0.7
+
+    if _mentions(name, KNOWN_PARTNERS) or _mentions(name, STRONG_PARTNER_KEYWORDS):
+        return "Partner", 0.7
+
+    if _mentions(name, BUILDER_KEYWORDS) or _mentions(name, KNOWN_BUILDERS):
+        return "Builder", 0.85
+
+    if _mentions(name, OWNER_KEYWORDS):
+        return "Owner", 0.7
+
+    if _mentions(name, PARTNER_KEYWORDS):
+        return "Partner", 0.6
+
+    return "Other", 0.0
+
+
+def target_likelihood(category: str, confidence: float) -> float:
+    """Convert a predicted category into the likelihood of being a Builder/Owner"""
+    if category in TARGET_CATEGORIES:
+        return confidence
+    if confidence == 0.0:
+        return UNKNOWN_PRIOR
+    return (1 - confidence) * UNKNOWN_PRIOR
+
+
+def prioritize_speakers(speakers: List[Dict], enricher=None) -> List[Dict]:
+    """
+    Order speakers so likely Builders/Owners come first
+
+    Ties are broken in favour of speakers with cached enrichment (cheaper to process),
+    then by speaker_id for a stable order.
+
+    Args:
+        speakers: Parsed speaker dictionaries
+        enricher: Optional CompanyEnricher whose cache is consulted (no API calls)
+
+    Returns:
+        New list of speakers in processing order
+    """
+    def sort_key(speaker: Dict):
+        cached = enricher.get_cached(speaker.get('company', ''), speaker.get('name', '')) if enricher else None
+        search_results = cached.get('search_results', []) if cached else []
+        category, confidence = predict_category(speaker.get('company', ''), search_results)
+        return (-target_likelihood(category, confidence), cached is None, speaker.get('speaker_id', ''))
+
+    return sorted(speakers, key=sort_key)
+
+
+class RunBudget:
+    """Wall-time and spend limits shared across pipeline stages"""
+
+    def __init__(self, deadline: Optional[float] = None, max_cost: Optional[float] = None):
+        """
+        Args:
+            deadline: Maximum wall time in seconds (None for unlimited)
+            max_cost: Maximum estimated spend in USD (None for unlimited)
+        """
+        self.deadline = deadline
+        self.max_cost = max_cost
+        self.start_time = time.time()
+        self.spent = 0.0
+        self.stopped = False
+
+    def elapsed(self) -> float:
+        """Seconds since the budget started"""
+        return time.time() - self.start_time
+
+    def charge(self, cost: float):
+        """Record estimated spend"""
+        self.spent += cost
+
+    def can_afford(self, cost: float, seconds: float = 0.0) -> bool:
+        """Check whether work with the given estimated cost and duration fits the budget"""
+        if self.max_cost is not None and self.spent + cost > self.max_cost:
+            return False
+        if self.deadline is not None and self.elapsed() + seconds > self.deadline:
+            return False
+        return True
+
+    def summary(self) -> str:
+        """One-line description of budget usage"""
+        parts = [f"{self.elapsed():.0f}s elapsed", f"~${self.spent:.3f} spent"]
+        if self.deadline is not None:
+            parts[0] += f" of {self.deadline:.0f}s"
+        if self.max_cost is not None:
+            parts[1] += f" of ${self.max_cost:.2f}"
+        return ", ".join(parts)
@@ -0,0 +1,178 @@
+"""
+Long-running HTTP service wrapping the pipeline with warm caches and pooled clients
+Parses the speaker directory and loads the Tavily cache once, reuses one set of
+provider clients, and coalesces concurrent requests for the same speaker
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from .parser import SpeakerParser, build_session_index
+from .enrichment import CompanyEnricher, merge_enrichment
+from .classifier import CompanyClassifier
+from .email_generator import EmailGenerator
+from .scheduler import TARGET_CATEGORIES
+
+
+class PipelineService:
+    """Single-speaker and bulk classification/email generation with warm state"""
+
+    def __init__(self, scraped_pages_dir: str = "in/scraped_pages", concurrency: int = 10):
+        self.parser = SpeakerParser(scraped_pages_dir)
+        self.enricher = CompanyEnricher()
+        self.classifier = CompanyClassifier()
+        self.generator = EmailGenerator()
+        self.concurrency = concurrency
+        self._speakers: Optional[Dict[str, Dict]] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {"requests": 0, "processed": 0, "coalesced": 0, "errors": 0}
+
+    @property
+    def speakers(self) -> Dict[str, Dict]:
+        """Parsed speakers by speaker_id (parsed once on first use)"""
+        if self._speakers is None:
+            self._speakers = {s['speaker_id']: s for s in self.parser.parse_all_speakers()}
+            self.generator.add_sessions(build_session_index(self._speakers.values()))
+        return self._speakers
+
+    def _speaker_key(self, speaker: Dict) -> str:
+        """Coalescing key for a speaker"""
+        return speaker.get('speaker_id') or f"{speaker.get('name', '')}|{speaker.get('company', '')}".lower()
+
+    async def _run_pipeline(self, speaker: Dict) -> Dict:
+        """Enrich, classify and (for Builders/Owners) draft an email for one speaker"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self._semaphore:
+            enrichment = await self.enricher.enrich_company(
+                speaker.get('company', ''),
+                speaker.get('name', ''),
+                speaker.get('job_title', '')
+            )
+            record = merge_enrichment(speaker, enrichment)
+
+            classification = await self.classifier.classify_company(record)
+            self.classifier.apply_classification(record, classification)
+
+            record['email_subject'] = ''
+            record['email_body'] = ''
+            if record['category'] in TARGET_CATEGORIES:
+                email = await self.generator.generate_email(record)
+                self.generator.apply_email(record, email)
+
+        self.stats["processed"] += 1
+        # Search results stay in the enrichment cache; keep responses small
+        record.pop('search_results', None)
+        return record
+
+    async def process_speaker(self, speaker: Dict) -> Dict:
+        """Process one speaker, sharing the in-flight result with identical concurrent requests"""
+        key = self._speaker_key(speaker)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_pipeline(speaker))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def process_batch(self, speakers: List[Dict]) -> List[Dict]:
+        """Process many speakers concurrently (bounded by the service concurrency)"""
+        return await asyncio.gather(*(self.process_speaker(s) for s in speakers))
+
+
+def _resolve_speaker(service: PipelineService, item) -> Dict:
+    """Accept either a speaker_id string or a speaker dictionary"""
+    if isinstance(item, str):
+        speaker = service.speakers.get(item)
+        if speaker is None:
+            raise web.HTTPNotFound(text=f"Unknown speaker_id: {item}")
+        return speaker
+    if isinstance(item, dict) and (item.get('name') or item.get('company')):
+        speaker = {'name': '', 'company': '', 'job_title': '', 'bio': '', 'sessions': []}
+        speaker.update(item)
+        return speaker
+    raise web.HTTPBadRequest(text="Expected a speaker_id or an object with name/company")
+
+
+def create_app(service: PipelineService) -> web.Application:
+    """Build the aiohttp application exposing the service"""
+    routes = web.RouteTableDef()
+
+    @routes.get('/health')
+    async def health(request):
+        return web.json_response({
+            "status": "ok",
+            "speakers_loaded": len(service._speakers or {}),
+            "cache_entries": len(service.enricher.cache),
+            "inflight": len(service._inflight),
+            **service.stats
+        })
+
+    @routes.get('/speakers/{speaker_id}')
+    async def get_speaker(request):
+        return web.json_response(_resolve_speaker(service, request.match_info['speaker_id']))
+
+    @routes.post('/speakers/{speaker_id}/process')
+    async def process_known_speaker(request):
+        service.stats["requests"] += 1
+        speaker = _resolve_speaker(service, request.match_info['speaker_id'])
+        return web.json_response(await service.process_speaker(speaker))
+
+    @routes.post('/process')
+    async def process_speaker(request):
+        service.stats["requests"] += 1
+        speaker = _resolve_speaker(service, await request.json())
+        return web.json_response(await service.process_speaker(speaker))
+
+    @routes.post('/process/batch')
+    async def process_batch(request):
+        service.stats["requests"] += 1
+        payload = await request.json()
+        items = payload.get('speaker_ids', []) + payload.get('speakers', [])
+        speakers = [_resolve_speaker(service, item) for item in items]
+        start = time.time()
+        results = await service.process_batch(speakers)
+        return web.json_response({"results": results, "elapsed": round(time.time() - start, 3)})
+
+    @web.middleware
+    async def count_errors(request, handler):
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            service.stats["errors"] += 1
+            return web.json_response({"error": str(e)}, status=500)
+
+    app = web.Application(middlewares=[count_errors])
+    app.add_routes(routes)
+    return app
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8080):
+    """Run the service until interrupted"""
+    print("🛰️  Starting pipeline service")
+    start = time.time()
+    service = PipelineService()
+    # Warm the speaker index before accepting traffic
+    print(f"   Loaded {len(service.speakers)} speakers and {len(service.enricher.cache)} cached enrichments "
+          f"in {time.time() - start:.1f}s")
+
+    runner = web.AppRunner(create_app(service))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f"   Listening on http://{host}:{port}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        service.enricher.flush()
+        service.classifier.flush()
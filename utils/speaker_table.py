@@ -0,0 +1,156 @@
+"""
+Columnar (pandas/NumPy-backed) view of parsed and classified speakers
+Statistics, category filters, sorting and joins run vectorized instead of as
+repeated Python passes over lists of dicts
+"""
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from .enrichment import normalize_company
+
+
+# Export order: Builders first, then Owners, then others
+CATEGORY_ORDER = {'Builder': 0, 'Owner': 1, 'Customer': 2, 'Partner': 3, 'Competitor': 4, 'Other': 5}
+
+# Scalar speaker fields kept as columns (nested data such as search results stays in the records)
+COLUMNS = {
+    'speaker_id': '',
+    'name': '',
+    'company': '',
+    'job_title': '',
+    'bio': '',
+    'image_url': '',
+    'category': 'Other',
+    'classification_confidence': 0.0,
+    'email_subject': '',
+    'email_body': ''
+}
+
+EXPORT_COLUMNS = {
+    'name': 'Speaker Name',
+    'job_title': 'Speaker Title',
+    'company': 'Speaker Company',
+    'category': 'Company Category',
+    'email_subject': 'Email Subject',
+    'email_body': 'Email Body'
+}
+
+
+class SpeakerTable:
+    """Columnar speaker table; row positions map back to the source records"""
+
+    def __init__(self, df: pd.DataFrame, records: Optional[List[Dict]] = None):
+        self.df = df
+        self.records = records
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], keep_records: bool = True) -> "SpeakerTable":
+        """
+        Build a table in one pass over the records
+
+        Args:
+            records: Speaker dictionaries (any iterable, consumed once)
+            keep_records: Keep the source dicts so filtered rows can be mapped back
+        """
+        columns = {column: [] for column in COLUMNS}
+        columns['sessions'] = []
+        kept = [] if keep_records else None
+
+        for record in records:
+            for column, default in COLUMNS.items():
+                value = record.get(column)
+                columns[column].append(default if value is None else value)
+            columns['sessions'].append(len(record.get('sessions') or []))
+            if kept is not None:
+                kept.append(record)
+
+        df = pd.DataFrame(columns)
+        df['classification_confidence'] = df['classification_confidence'].astype(float)
+        return cls(df, kept)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def _subset(self, df: pd.DataFrame) -> "SpeakerTable":
+        return SpeakerTable(df, self.records)
+
+    def to_records(self) -> List[Dict]:
+        """Source records for the rows of this table (requires keep_records)"""
+        if self.records is None:
+            raise ValueError("Table was built without keep_records")
+        return [self.records[i] for i in self.df.index]
+
+    def statistics(self) -> Dict:
+        """Same statistics as SpeakerParser.get_statistics, computed column-wise"""
+        df = self.df
+        sessions = df['sessions']
+        companies = df.loc[df['company'] != '', 'company']
+        return {
+            'total_speakers': len(df),
+            'speakers_with_bio': int((df['bio'] != '').sum()),
+            'speakers_with_sessions': int((sessions > 0).sum()),
+            'speakers_with_image': int((df['image_url'] != '').sum()),
+            'empty_job_titles': int((df['job_title'] == '').sum()),
+            'total_sessions': int(sessions.sum()),
+            'multi_session_speakers': int((sessions > 1).sum()),
+            'companies': int(companies.nunique())
+        }
+
+    def category_counts(self) -> Dict[str, int]:
+        """Number of speakers per category"""
+        return {category: int(count) for category, count in self.df['category'].value_counts().items()}
+
+    def company_consistency(self) -> Dict:
+        """
+        How consistently speakers of the same (normalized) company are classified
+
+        Returns:
+            Dictionary with companies, multi_speaker_companies, inconsistent_companies
+            (multi-speaker companies with more than one category) and consistency_pct
+        """
+        df = self.df[self.df['company'] != '']
+        categories = df['category'].groupby(df['company'].map(normalize_company)).agg(['size', 'nunique'])
+        multi = categories[categories['size'] > 1]
+        inconsistent = int((multi['nunique'] > 1).sum())
+        return {
+            'companies': len(categories),
+            'multi_speaker_companies': len(multi),
+            'inconsistent_companies': inconsistent,
+            'consistency_pct': round(100 * (1 - inconsistent / len(multi)), 1) if len(multi) else 100.0
+        }
+
+    def email_count(self) -> int:
+        return int((self.df['email_subject'] != '').sum())
+
+    def filter_categories(self, categories: Iterable[str]) -> "SpeakerTable":
+        """Rows whose category is one of `categories`"""
+        return self._subset(self.df[self.df['category'].isin(list(categories))])
+
+    def sort_for_export(self) -> "SpeakerTable":
+        """Sort by category (Builders first), company, then name"""
+        order = self.df['category'].map(CATEGORY_ORDER).fillna(len(CATEGORY_ORDER))
+        df = self.df.assign(_order=order).sort_values(['_order', 'company', 'name'], kind='stable')
+        return self._subset(df.drop(columns='_order'))
+
+    def join(self, other: pd.DataFrame, on: str = 'speaker_id', suffix: str = '_joined') -> "SpeakerTable":
+        """
+        Left-join another frame (e.g. email or enrichment results) on a key column
+
+        Non-empty values from `other` replace existing columns of the same name.
+        """
+        merged = self.df.merge(other, on=on, how='left', suffixes=('', suffix))
+        merged.index = self.df.index
+        for column in other.columns:
+            joined = f"{column}{suffix}"
+            if joined in merged.columns:
+                merged[column] = merged[joined].where(merged[joined].notna() & (merged[joined] != ''), merged[column])
+                merged = merged.drop(columns=joined)
+        return self._subset(merged)
+
+    def to_export_frame(self, with_id: bool = False) -> pd.DataFrame:
+        """DataFrame with the CSV column names of out/email_list.csv (optionally led by 'Speaker ID')"""
+        df = self.df[list(EXPORT_COLUMNS)].rename(columns=EXPORT_COLUMNS)
+        if with_id:
+            df.insert(0, 'Speaker ID', self.df['speaker_id'])
+        return df
@@ -0,0 +1,128 @@
+"""
+Speculative email generation during classification
+For speakers whose local prior strongly predicts Builder or Owner, the email is drafted
+in parallel with classification and kept only if the classification agrees
+"""
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+from .classifier import CompanyClassifier
+from .email_generator import EmailGenerator
+from .scheduler import predict_category, TARGET_CATEGORIES
+
+
+# Minimum prior confidence before an email is drafted speculatively
+SPECULATION_THRESHOLD = 0.8
+
+
+class SpeculationStats:
+    """Track committed vs wasted speculative email calls"""
+
+    def __init__(self):
+        self.launched = 0
+        self.committed = 0
+        self.discarded = 0
+        self.latency_saved = 0.0
+        self.wasted_seconds = 0.0
+
+    def report(self):
+        """Print a summary of speculation outcomes"""
+        if not self.launched:
+            return
+        hit_rate = self.committed * 100 // self.launched
+        print(f"\n🔮 Speculative emails: {self.committed}/{self.launched} committed ({hit_rate}%)")
+        print(f"   Latency saved: {self.latency_saved:.1f}s | Wasted calls: {self.discarded} ({self.wasted_seconds:.1f}s)")
+
+
+async def _timed(coro) -> Tuple[Dict, float]:
+    """Await a coroutine and return its result with the elapsed seconds"""
+    start = time.time()
+    result = await coro
+    return result, time.time() - start
+
+
+def speculative_category(speaker_data: Dict, threshold: float = SPECULATION_THRESHOLD):
+    """Return the predicted target category if the prior is strong enough, else None"""
+    category, confidence = predict_category(speaker_data.get("company", ""), speaker_data.get("search_results", []))
+    if category in TARGET_CATEGORIES and confidence >= threshold:
+        return category
+    return None
+
+
+async def classify_batch_speculative(classifier: CompanyClassifier, generator: EmailGenerator,
+                                     enriched_speakers: List[Dict], stats: SpeculationStats,
+                                     batch_size: int = 5,
+                                     threshold: float = SPECULATION_THRESHOLD) -> List[Dict]:
+    """
+    Classify speakers like CompanyClassifier.classify_batch, drafting emails speculatively
+
+    Speakers whose email was committed get email_subject/email_body and
+    email_speculative=True so stage 2 skips them.
+
+    Args:
+        classifier: Classifier used for the authoritative category
+        generator: Email generator used for speculative drafts
+        enriched_speakers: List of enriched speaker data
+        stats: SpeculationStats updated in place
+        batch_size: Number of concurrent classifications
+        threshold: Minimum prior confidence to speculate
+
+    Returns:
+        List of speakers with classification (and committed emails) added
+    """
+    classified_speakers = []
+    total = len(enriched_speakers)
+
+    for i in range(0, total, batch_size):
+        batch = enriched_speakers[i:i+batch_size]
+
+        classify_tasks = []
+        email_tasks = []
+        for speaker_data in batch:
+            classify_tasks.append(asyncio.create_task(_timed(classifier.classify_company(speaker_data))))
+
+            predicted = speculative_category(speaker_data, threshold)
+            if predicted:
+                draft = dict(speaker_data, category=predicted)
+                email_tasks.append((predicted, asyncio.create_task(_timed(generator.generate_email(draft)))))
+                stats.launched += 1
+            else:
+                email_tasks.append((None, None))
+
+        classifications = await asyncio.gather(*classify_tasks)
+
+        for speaker_data, (classification, classify_seconds), (predicted, email_task) in zip(batch, classifications, email_tasks):
+            classifier.apply_classification(speaker_data, classification)
+            classified_speakers.append(speaker_data)
+
+            print(f"[{len(classified_speakers)}/{total}] Classified {speaker_data['company']} as {classification['category']} "
+                  f"(confidence: {classification['confidence']:.2f})")
+
+            if email_task is None:
+                continue
+
+            if classification["category"] == predicted:
+                email, email_seconds = await email_task
+                if email["subject"]:
+                    speaker_data["email_subject"] = email["subject"]
+                    speaker_data["email_body"] = email["body"]
+                    speaker_data["email_speculative"] = True
+                    stats.committed += 1
+                    # Sequential cost would be classify + email; speculation pays only the max
+                    stats.latency_saved += min(classify_seconds, email_seconds)
+                    continue
+            else:
+                # The provider call itself still runs to completion in its worker thread
+                email_task.cancel()
+                try:
+                    _, email_seconds = await email_task
+                except asyncio.CancelledError:
+                    email_seconds = classify_seconds
+            stats.discarded += 1
+            stats.wasted_seconds += email_seconds
+
+        if i + batch_size < total:
+            await asyncio.sleep(0.5)
+
+    return classified_speakers
@@ -10,23 +10,49 @@ from typing import List, Dict
 import sys
 
 from .parser import SpeakerParser
-from .enrichment import CompanyEnricher
+from .enrichment import CompanyEnricher, compact_record
 from .classifier import CompanyClassifier
+from .email_generator import EmailGenerator
+from .fingerprint import email_fingerprint
+from .streaming import iter_records
+from .speaker_table import SpeakerTable
+from . import run_ledger
+from .speculative import classify_batch_speculative, SpeculationStats
+from .scheduler import (
+    RunBudget, prioritize_speakers, TARGET_CATEGORIES,
+    TAVILY_SEARCH_COST, LLM_CALL_COST, EMAIL_SECONDS_ESTIMATE
+)
 
 
-async def classify_all_speakers(resume=False, batch_size=10):
+async def classify_all_speakers(resume=False, batch_size=10, budget: RunBudget = None, speculate=False,
+                                incremental=False, scraped_pages_dir="in/scraped_pages", output_dir="out",
+                                enricher: CompanyEnricher = None, classifier: CompanyClassifier = None,
+                                generator: EmailGenerator = None):
     """
     Classify all speakers with high parallelization
     
+    Speakers most likely to be Builders/Owners are processed first, so a run
+    stopped by its budget has already covered the valuable speakers.
+    
     Args:
         resume: Resume from checkpoint if True
         batch_size: Number of concurrent classifications
+        budget: Optional RunBudget; stops cleanly (with checkpoint) when exhausted
+        speculate: Draft emails in parallel with classification for near-certain Builders/Owners
+        incremental: Reuse previous results whose input fingerprint (page, enrichment,
+            prompt template, model, temperature) is unchanged
+        scraped_pages_dir: Root of the scraped speaker pages
+        output_dir: Directory for the checkpoint and output files
+        enricher, classifier, generator: Optional shared clients (e.g. across events),
+            created here if not given
     """
     print("=" * 70)
     print("STAGE 1: CLASSIFICATION")
     print("=" * 70)
     
-    checkpoint_file = Path("out/checkpoint_classify.json")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_file = output_dir / "checkpoint_classify.json"
     processed_speaker_ids = set()
     all_results = []
     
@@ -35,7 +61,8 @@ async def classify_all_speakers(resume=False, batch_size=10):
         print("📂 Resuming from checkpoint...")
         with open(checkpoint_file, 'r') as f:
             checkpoint_data = json.load(f)
-            all_results = checkpoint_data['results']
+            # Speakers whose classification failed validation are retried
+            all_results = [s for s in checkpoint_data['results'] if not s.get('classification_error')]
             # Create unique speaker IDs instead of just tracking companies
             processed_speaker_ids = {
                 f"{s['name']}|{s['company']}" 
@@ -47,8 +74,9 @@ async def classify_all_speakers(resume=False, batch_size=10):
     
     # Parse speakers
     print("📋 Loading speaker data...")
-    parser = SpeakerParser("in/scraped_pages")
+    parser = SpeakerParser(scraped_pages_dir)
     all_speakers = parser.parse_all_speakers()
+    session_index = parser.save_session_index(all_speakers, output_dir / "sessions.json")
     
     # Filter out already processed (by unique speaker ID, not just company)
     speakers_to_process = []
@@ -67,8 +95,34 @@ async def classify_all_speakers(resume=False, batch_size=10):
     print()
     
     # Initialize services
-    enricher = CompanyEnricher()
-    classifier = CompanyClassifier()
+    enricher = enricher or CompanyEnricher()
+    classifier = classifier or CompanyClassifier()
+    generator = (generator or EmailGenerator()) if speculate else None
+    if generator:
+        generator.add_sessions(session_index)
+    speculation_stats = SpeculationStats()
+    
+    # Reuse previous results whose inputs are unchanged
+    output_file = output_dir / "speakers_classified.json"
+    if incremental and output_file.exists():
+        previous = {s.get('speaker_id'): s for s in iter_records(output_file)}
+        changed = []
+        reused = 0
+        for s in speakers_to_process:
+            prev = previous.get(s['speaker_id'])
+            cached = enricher.get_cached(s.get('company', ''), s.get('name', ''))
+            # Kept results also seed the classifier, so changed co-workers fan out from them
+            if classifier.reuse_previous(s, prev, cached):
+                all_results.append(prev)
+                processed_speaker_ids.add(f"{s['name']}|{s['company']}")
+                reused += 1
+            else:
+                changed.append(s)
+        speakers_to_process = changed
+        print(f"♻️  Incremental: {reused} unchanged speakers reused, {len(changed)} to recompute")
+    
+    # Likely Builders/Owners first (cheap local scoring, no API calls)
+    speakers_to_process = prioritize_speakers(speakers_to_process, enricher)
     
     # Statistics
     categories = {"Builder": 0, "Owner": 0, "Partner": 0, "Customer": 0, "Competitor": 0, "Other": 0}
@@ -76,11 +130,28 @@ async def classify_all_speakers(resume=False, batch_size=10):
     
     # Process in chunks for checkpointing
     checkpoint_interval = 10
+    chunk_times = []
+    already_done = len(all_results)
     
     for i in range(0, len(speakers_to_process), checkpoint_interval):
         chunk = speakers_to_process[i:i+checkpoint_interval]
         chunk_num = (len(all_results) // checkpoint_interval) + 1
         
+        # Estimate chunk cost (cache hits are free) and keep room for the emails already due
+        uncached = sum(1 for s in chunk if enricher.get_cached(s.get('company', ''), s.get('name', '')) is None)
+        chunk_cost = uncached * TAVILY_SEARCH_COST + len(chunk) * LLM_CALL_COST
+        if budget:
+            targets_found = sum(1 for s in all_results
+                                if s.get('category') in TARGET_CATEGORIES and not s.get('email_subject'))
+            chunk_time = sum(chunk_times) / len(chunk_times) if chunk_times else 0.0
+            if not budget.can_afford(chunk_cost + targets_found * LLM_CALL_COST,
+                                     chunk_time + targets_found * EMAIL_SECONDS_ESTIMATE):
+                budget.stopped = True
+                print(f"\n⏹️  Budget reached ({budget.summary()})")
+                print(f"   Stopping with {len(speakers_to_process) - i} speakers left; use --resume to continue")
+                break
+        chunk_start = time.time()
+        
         print(f"\n📦 Processing chunk {chunk_num} ({len(chunk)} speakers)...")
         
         # Enrich
@@ -89,10 +160,22 @@ async def classify_all_speakers(resume=False, batch_size=10):
         
         # Classify with high parallelization
         print(f"   🏷️ Classifying with {batch_size} parallel calls...")
-        classified = await classifier.classify_batch(enriched, batch_size=batch_size)
+        if generator:
+            launched_before = speculation_stats.launched
+            classified = await classify_batch_speculative(
+                classifier, generator, enriched, speculation_stats, batch_size=batch_size
+            )
+            chunk_cost += (speculation_stats.launched - launched_before) * LLM_CALL_COST
+        else:
+            classified = await classifier.classify_batch(enriched, batch_size=batch_size)
         
         # Update statistics
         for speaker in classified:
+            # Failed classifications get no fingerprint, so --incremental recomputes them
+            if not speaker.get('classification_error'):
+                speaker['classification_fingerprint'] = classifier.input_fingerprint(speaker)
+            if speaker.get('email_speculative'):
+                speaker['email_fingerprint'] = email_fingerprint(speaker, generator)
             cat = speaker.get('category', 'Other')
             categories[cat] += 1
             all_results.append(speaker)
@@ -101,8 +184,11 @@ async def classify_all_speakers(resume=False, batch_size=10):
             processed_speaker_ids.add(speaker_id)
         
         # Save checkpoint
+        # Search documents stay in the enrichment store; records keep references, so it is saved first
+        enricher.flush()
+        classifier.flush()
         checkpoint_data = {
-            'results': all_results,
+            'results': [compact_record(s) for s in all_results],
             'processed': list(processed_speaker_ids),  # Save speaker IDs not companies
             'timestamp': time.time()
         }
@@ -118,11 +204,16 @@ async def classify_all_speakers(resume=False, batch_size=10):
         print(f"   Speed: {rate:.1f} speakers/sec | ETA: {eta/60:.1f} minutes")
         print(f"   Builders: {categories['Builder']} | Owners: {categories['Owner']} | Customers: {categories['Customer']}")
         print(f"   💾 Checkpoint saved")
+        
+        chunk_times.append(time.time() - chunk_start)
+        if budget:
+            budget.charge(chunk_cost)
     
     # Save final results
-    output_file = Path("out/speakers_classified.json")
+    enricher.flush()
+    classifier.flush()
     with open(output_file, 'w') as f:
-        json.dump(all_results, f, indent=2)
+        json.dump([compact_record(s) for s in all_results], f, indent=2)
     
     # Final report
     elapsed = time.time() - start_time
@@ -134,6 +225,25 @@ async def classify_all_speakers(resume=False, batch_size=10):
     for cat, count in sorted(categories.items()):
         if count > 0:
             print(f"   {cat}: {count}")
+    consistency = SpeakerTable.from_records(all_results, keep_records=False).company_consistency()
+    print(f"\n🏢 Companies: {classifier.company_stats()}")
+    print(f"   Consistency: {consistency['consistency_pct']}% of {consistency['multi_speaker_companies']} "
+          f"multi-speaker companies share one category ({consistency['inconsistent_companies']} inconsistent)")
+    print(f"   Evidence: {classifier.evidence.builds} companies ranked, {classifier.evidence.cache_hits} reused")
+    print(f"\n🧮 Classification tokens: {classifier.usage.summary()}")
+    print(f"   Re-asks for invalid replies: {classifier.reasks}")
+    failed = [s for s in all_results if s.get('classification_error')]
+    if failed:
+        print(f"   ⚠️  {len(failed)} classifications failed (marked with classification_error, "
+              f"retried by --resume or --incremental)")
+    if generator:
+        print(f"   Speculative email tokens: {generator.usage.summary()}")
+    speculation_stats.report()
+    run_ledger.record(clients=[classifier, generator], items=len(all_results) - already_done,
+                      tavily_searches=enricher.searches, tavily_hits=enricher.cache_hits,
+                      cache_hits=classifier.cache_hits + classifier.fanouts,
+                      cache_lookups=classifier.llm_calls + classifier.cache_hits + classifier.fanouts,
+                      errors=len(failed), batch_size=batch_size, reasks=classifier.reasks)
     print(f"\n💾 Results saved to {output_file}")
     print("=" * 70)
     
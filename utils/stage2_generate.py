@@ -9,35 +9,56 @@ from typing import List, Dict
 import sys
 
 from .email_generator import EmailGenerator
+from .parser import build_session_index
+from .fingerprint import email_fingerprint
+from .streaming import iter_records
+from .scheduler import RunBudget, LLM_CALL_COST, TARGET_CATEGORIES
+from .speaker_table import SpeakerTable
+from . import run_ledger
 
 
-async def generate_all_emails(resume=False, batch_size=15):
+def load_session_index(output_dir: Path, all_speakers: List[Dict]) -> Dict[str, Dict]:
+    """Session index from parse time (rebuilt from the classified speakers for older outputs)"""
+    sessions_file = Path(output_dir) / "sessions.json"
+    if sessions_file.exists():
+        with open(sessions_file, 'r') as f:
+            return json.load(f)
+    return build_session_index(all_speakers)
+
+
+async def generate_all_emails(resume=False, batch_size=15, budget: RunBudget = None, incremental=False,
+                              output_dir="out", generator: EmailGenerator = None):
     """
     Generate emails for all Builders and Owners
     
     Args:
         resume: Resume from checkpoint if True
         batch_size: Number of concurrent email generations
+        budget: Optional RunBudget; stops cleanly (with checkpoint) when exhausted
+        incremental: Reuse previous emails whose input fingerprint (classification,
+            speaker details, prompt template, model, temperature) is unchanged
+        output_dir: Directory holding the stage 1 output; checkpoint and output go here too
+        generator: Optional shared EmailGenerator (e.g. across events), created here if not given
     """
     print("=" * 70)
     print("STAGE 2: EMAIL GENERATION")
     print("=" * 70)
     
     # Load classified speakers
-    classified_file = Path("out/speakers_classified.json")
+    output_dir = Path(output_dir)
+    classified_file = output_dir / "speakers_classified.json"
     if not classified_file.exists():
         print("❌ Error: Run Stage 1 (classification) first!")
-        print("   File not found: out/speakers_classified.json")
+        print(f"   File not found: {classified_file}")
         return []
     
     with open(classified_file, 'r') as f:
         all_speakers = json.load(f)
     
-    # Filter for Builders and Owners only
-    target_speakers = [
-        s for s in all_speakers 
-        if s.get('category') in ['Builder', 'Owner']
-    ]
+    # Filter for Builders and Owners only (vectorized over the columnar table)
+    table = SpeakerTable.from_records(all_speakers)
+    target_speakers = table.filter_categories(TARGET_CATEGORIES).to_records()
+    speakers_by_id = {f"{s.get('name')}_{s.get('company')}": s for s in all_speakers}
     
     print(f"📊 Found {len(target_speakers)} Builders/Owners (from {len(all_speakers)} total)")
     
@@ -46,7 +67,7 @@ async def generate_all_emails(resume=False, batch_size=15):
         return all_speakers
     
     # Check for resume
-    checkpoint_file = Path("out/checkpoint_emails.json")
+    checkpoint_file = output_dir / "checkpoint_emails.json"
     processed_ids = set()
     
     if resume and checkpoint_file.exists():
@@ -65,25 +86,64 @@ async def generate_all_emails(resume=False, batch_size=15):
             
             print(f"   Loaded {len(processed_ids)} previously generated emails")
     
+    # Registered before any fingerprint is taken, since panel context is part of it
+    session_index = load_session_index(output_dir, all_speakers)
+    
+    # Emails drafted speculatively during classification are already done
+    speculative_ids = {
+        f"{s.get('name')}_{s.get('company')}"
+        for s in target_speakers
+        if s.get('email_speculative') and s.get('email_subject')
+    }
+    if speculative_ids:
+        print(f"🔮 {len(speculative_ids)} emails already drafted speculatively in Stage 1")
+    
+    # Reuse previous emails whose inputs are unchanged (Stage 1 changes cascade via the fingerprint)
+    reused_ids = set()
+    output_file = output_dir / "speakers_with_emails.json"
+    if incremental and output_file.exists():
+        generator = generator or EmailGenerator()
+        generator.add_sessions(session_index)
+        previous = {s.get('speaker_id'): s for s in iter_records(output_file)}
+        for s in target_speakers:
+            prev = previous.get(s.get('speaker_id'))
+            fingerprint = email_fingerprint(s, generator)
+            if prev and prev.get('email_subject') and prev.get('email_fingerprint') == fingerprint:
+                s['email_subject'] = prev['email_subject']
+                s['email_body'] = prev['email_body']
+                s['email_fingerprint'] = fingerprint
+                reused_ids.add(f"{s.get('name')}_{s.get('company')}")
+        # Speculative drafts from Stage 1 count only if they are still current
+        for s in target_speakers:
+            key = f"{s.get('name')}_{s.get('company')}"
+            if key in speculative_ids and s.get('email_fingerprint') != email_fingerprint(s, generator):
+                speculative_ids.discard(key)
+        print(f"♻️  Incremental: {len(reused_ids)} unchanged emails reused")
+    
     # Filter out already processed
+    done_ids = processed_ids | speculative_ids | reused_ids
     speakers_to_process = [
         s for s in target_speakers
-        if f"{s.get('name')}_{s.get('company')}" not in processed_ids
+        if f"{s.get('name')}_{s.get('company')}" not in done_ids
     ]
     
     if not speakers_to_process:
         print("✅ All emails already generated!")
+        with open(output_file, 'w') as f:
+            json.dump(all_speakers, f, indent=2)
         return all_speakers
     
     print(f"📧 To generate: {len(speakers_to_process)} emails")
     print()
     
     # Initialize email generator
-    generator = EmailGenerator()
+    if generator is None:
+        generator = EmailGenerator()
+    generator.add_sessions(session_index)
     
     # Statistics
     start_time = time.time()
-    emails_generated = len(processed_ids)
+    emails_generated = len(done_ids)
     email_map = {}
     
     # Load existing email map if resuming
@@ -94,11 +154,22 @@ async def generate_all_emails(resume=False, batch_size=15):
     
     # Process in chunks for checkpointing
     checkpoint_interval = 20
+    chunk_times = []
     
     for i in range(0, len(speakers_to_process), checkpoint_interval):
         chunk = speakers_to_process[i:i+checkpoint_interval]
         chunk_num = (emails_generated // checkpoint_interval) + 1
         
+        chunk_cost = len(chunk) * LLM_CALL_COST
+        if budget:
+            chunk_time = sum(chunk_times) / len(chunk_times) if chunk_times else 0.0
+            if not budget.can_afford(chunk_cost, chunk_time):
+                budget.stopped = True
+                print(f"\n⏹️  Budget reached ({budget.summary()})")
+                print(f"   Stopping with {len(speakers_to_process) - i} emails left; use --generate --resume to continue")
+                break
+        chunk_start = time.time()
+        
         print(f"\n📦 Generating emails for chunk {chunk_num} ({len(chunk)} speakers)...")
         
         # Generate emails with high parallelization
@@ -107,7 +178,9 @@ async def generate_all_emails(resume=False, batch_size=15):
         # Update all speakers list and email map
         for speaker in chunk_with_emails:
             speaker_id = f"{speaker.get('name')}_{speaker.get('company')}"
-            processed_ids.add(speaker_id)
+            # Failed emails stay out of the checkpoint so --resume retries them
+            if not speaker.get('email_error'):
+                processed_ids.add(speaker_id)
             
             if speaker.get('email_subject'):
                 emails_generated += 1
@@ -117,11 +190,11 @@ async def generate_all_emails(resume=False, batch_size=15):
                 }
                 
                 # Update in main list
-                for s in all_speakers:
-                    if s.get('name') == speaker.get('name') and s.get('company') == speaker.get('company'):
-                        s['email_subject'] = speaker['email_subject']
-                        s['email_body'] = speaker['email_body']
-                        break
+                s = speakers_by_id.get(speaker_id)
+                if s is not None:
+                    s['email_subject'] = speaker['email_subject']
+                    s['email_body'] = speaker['email_body']
+                    s['email_fingerprint'] = email_fingerprint(s, generator)
         
         # Save checkpoint
         checkpoint_data = {
@@ -141,9 +214,12 @@ async def generate_all_emails(resume=False, batch_size=15):
         print(f"\n📊 Progress: {emails_generated}/{len(target_speakers)} emails")
         print(f"   Speed: {rate:.1f} emails/sec | ETA: {eta/60:.1f} minutes")
         print(f"   💾 Checkpoint saved")
+        
+        chunk_times.append(time.time() - chunk_start)
+        if budget:
+            budget.charge(chunk_cost)
     
     # Save final results with emails
-    output_file = Path("out/speakers_with_emails.json")
     with open(output_file, 'w') as f:
         json.dump(all_speakers, f, indent=2)
     
@@ -154,6 +230,13 @@ async def generate_all_emails(resume=False, batch_size=15):
     print(f"   Time: {elapsed:.1f} seconds ({elapsed/60:.1f} minutes)")
     print(f"   Generated: {emails_generated} emails")
     print(f"   Skipped: {len(all_speakers) - emails_generated} (Partners/Competitors/Customers)")
+    print(f"   Tokens: {generator.usage.summary()} | re-asks: {generator.reasks}")
+    failed = [s for s in all_speakers if s.get('email_error')]
+    if failed:
+        print(f"   ⚠️  {len(failed)} emails failed (marked with email_error, retried by --generate --resume)")
+    run_ledger.record(clients=[generator], items=emails_generated - len(done_ids),
+                      cache_hits=len(done_ids), cache_lookups=len(target_speakers),
+                      errors=len(failed), batch_size=batch_size, reasks=generator.reasks)
     print(f"\n💾 Results saved to {output_file}")
     print("=" * 70)
     
@@ -1,69 +1,76 @@
 """
 Stage 3: Export final results to CSV
 """
-import json
-import pandas as pd
 from pathlib import Path
 
+from .delta_export import load_manifest, save_manifest, compute_delta, write_delta, CHANGE_INSERT, CHANGE_UPDATE, CHANGE_DELETE
+from .speaker_table import SpeakerTable
+from . import run_ledger
+from .streaming import iter_records
 
-def export_to_csv():
-    """Export final results to CSV format"""
+
+def export_to_csv(input_file=None, output_dir="out", delta=False, delta_format="csv", snapshot=True):
+    """
+    Export final results to CSV format
+    
+    Args:
+        input_file: Stage output to export (.json array or .jsonl); defaults to the
+            stage 2 output, falling back to the stage 1 output
+        output_dir: Directory holding the stage outputs and receiving email_list.csv
+        delta: Also write only the rows inserted, updated or deleted since the last delta
+            export (tracked in export_manifest.json) to <output_dir>/deltas/
+        delta_format: "csv" or "jsonl" for the delta file
+        snapshot: Write the full email_list.csv as well
+    """
     print("=" * 70)
     print("STAGE 3: CSV EXPORT")
     print("=" * 70)
     
     # Load speakers with emails
-    input_file = Path("out/speakers_with_emails.json")
-    if not input_file.exists():
-        # Try classified file if emails not generated yet
-        input_file = Path("out/speakers_classified.json")
+    if input_file is not None:
+        input_file = Path(input_file)
+    else:
+        input_file = Path(output_dir) / "speakers_with_emails.json"
         if not input_file.exists():
-            print("❌ Error: No data to export!")
-            print("   Run Stage 1 (classification) first")
-            return False
-    
-    print(f"📂 Loading data from {input_file}...")
-    with open(input_file, 'r') as f:
-        speakers = json.load(f)
+            # Try classified file if emails not generated yet
+            input_file = Path(output_dir) / "speakers_classified.json"
+    if not input_file.exists():
+        print("❌ Error: No data to export!")
+        print("   Run Stage 1 (classification) first")
+        return False
     
-    print(f"📊 Processing {len(speakers)} speakers...")
+    # Records are read incrementally; only scalar columns are kept in memory
+    print(f"📂 Streaming data from {input_file}...")
+    table = SpeakerTable.from_records(iter_records(input_file), keep_records=False)
     
-    # Prepare data for CSV
-    csv_data = []
-    emails_count = 0
+    print(f"📊 Processing {len(table)} speakers...")
+    emails_count = table.email_count()
     
-    for speaker in speakers:
-        # Ensure all fields exist
-        speaker_name = speaker.get('name', '')
-        job_title = speaker.get('job_title', '')
-        company = speaker.get('company', '')
-        category = speaker.get('category', 'Other')
-        email_subject = speaker.get('email_subject', '')
-        email_body = speaker.get('email_body', '')
-        
-        if email_subject:
-            emails_count += 1
-        
-        csv_data.append({
-            'Speaker Name': speaker_name,
-            'Speaker Title': job_title,
-            'Speaker Company': company,
-            'Company Category': category,
-            'Email Subject': email_subject,
-            'Email Body': email_body
-        })
+    # Sort by category (Builders first, then Owners, then others)
+    df = table.sort_for_export().to_export_frame(with_id=True)
     
-    # Create DataFrame and save to CSV
-    df = pd.DataFrame(csv_data)
+    if delta:
+        manifest_file = Path(output_dir) / "export_manifest.json"
+        changes, rows = compute_delta(df, load_manifest(manifest_file))
+        counts = changes['Change'].value_counts()
+        run_ledger.record(delta_rows=len(changes))
+        print(f"\n🔀 Delta: {counts.get(CHANGE_INSERT, 0)} inserted | {counts.get(CHANGE_UPDATE, 0)} updated | "
+              f"{counts.get(CHANGE_DELETE, 0)} deleted | {len(df) - len(changes) + counts.get(CHANGE_DELETE, 0)} unchanged")
+        if len(changes):
+            delta_file = write_delta(changes, Path(output_dir), delta_format)
+            save_manifest(manifest_file, rows)
+            print(f"   Delta written to {delta_file}")
+        else:
+            print("   No changes since the last delta export")
     
-    # Sort by category (Builders first, then Owners, then others)
-    category_order = {'Builder': 0, 'Owner': 1, 'Customer': 2, 'Partner': 3, 'Competitor': 4, 'Other': 5}
-    df['sort_order'] = df['Company Category'].map(category_order).fillna(6)
-    df = df.sort_values(['sort_order', 'Speaker Company', 'Speaker Name'])
-    df = df.drop('sort_order', axis=1)
+    df = df.drop(columns='Speaker ID')
+    run_ledger.record(items=len(df))
+    if not snapshot:
+        print("=" * 70)
+        return True
     
     # Save to CSV
-    output_file = Path("out/email_list.csv")
+    output_file = Path(output_dir) / "email_list.csv"
     df.to_csv(output_file, index=False)
     
     # Statistics
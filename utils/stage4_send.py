@@ -0,0 +1,343 @@
+"""
+Stage 4: Outbound Email Delivery
+Sends generated emails over a pool of persistent async SMTP connections with a
+global concurrency cap and per-domain throttling. Every send is recorded in a
+SQLite ledger keyed by speaker_id, so reruns never send to the same speaker twice.
+"""
+import asyncio
+import contextlib
+import csv
+import os
+import sqlite3
+import time
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .fingerprint import stable_hash
+from .streaming import iter_records
+from . import run_ledger
+
+
+STATUS_SENDING = "sending"    # claimed; a crash here leaves the outcome unknown, so it is never retried
+STATUS_SENT = "sent"
+STATUS_BOUNCED = "bounced"    # permanent (5xx) rejection
+STATUS_FAILED = "failed"      # transient failure; retried on the next run
+
+MAX_ATTEMPTS = 3
+DEFAULT_CONNECTIONS = 10
+DEFAULT_DOMAIN_CONCURRENCY = 2
+DEFAULT_DOMAIN_RATE = 10.0    # messages per second per recipient domain
+
+
+class SendLedger:
+    """SQLite record of every delivery attempt, keyed by speaker_id"""
+
+    def __init__(self, db_path: str = "out/send_log.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; claims are made with BEGIN IMMEDIATE so concurrent senders cannot both win
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sends (
+                speaker_id TEXT PRIMARY KEY,
+                recipient TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                smtp_code INTEGER,
+                error TEXT,
+                updated_at REAL
+            )
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def claim(self, speaker_id: str, recipient: str, message_id: str) -> bool:
+        """
+        Mark a speaker as being sent to, unless it was already sent, bounced,
+        left in flight by a crashed run, or has used up its attempts
+
+        Returns:
+            True if the caller may send
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT status, attempts FROM sends WHERE speaker_id = ?", (speaker_id,)
+            ).fetchone()
+            if row and (row[0] != STATUS_FAILED or row[1] >= MAX_ATTEMPTS):
+                self.conn.execute("COMMIT")
+                return False
+            self.conn.execute(
+                """INSERT INTO sends (speaker_id, recipient, message_id, status, attempts, updated_at)
+                   VALUES (?, ?, ?, ?, 1, ?)
+                   ON CONFLICT(speaker_id) DO UPDATE SET
+                       recipient = excluded.recipient, status = excluded.status,
+                       attempts = attempts + 1, error = NULL, updated_at = excluded.updated_at""",
+                (speaker_id, recipient, message_id, STATUS_SENDING, time.time())
+            )
+            self.conn.execute("COMMIT")
+            return True
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def settled_ids(self) -> set:
+        """Speakers that must not be attempted again (everything except retryable failures)"""
+        rows = self.conn.execute(
+            "SELECT speaker_id FROM sends WHERE status != ? OR attempts >= ?", (STATUS_FAILED, MAX_ATTEMPTS)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def record(self, speaker_id: str, status: str, smtp_code: Optional[int] = None, error: Optional[str] = None):
+        """Store the outcome of a claimed send"""
+        self.conn.execute(
+            "UPDATE sends SET status = ?, smtp_code = ?, error = ?, updated_at = ? WHERE speaker_id = ?",
+            (status, smtp_code, error, time.time(), speaker_id)
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of speakers per send status"""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM sends GROUP BY status").fetchall())
+
+    def failures(self) -> List[Dict]:
+        """Bounced and failed sends with their SMTP code and error"""
+        rows = self.conn.execute(
+            "SELECT speaker_id, recipient, status, smtp_code, error FROM sends WHERE status IN (?, ?)",
+            (STATUS_BOUNCED, STATUS_FAILED)
+        ).fetchall()
+        return [dict(zip(("speaker_id", "recipient", "status", "smtp_code", "error"), row)) for row in rows]
+
+
+class SMTPPool:
+    """Fixed-size pool of persistent SMTP connections, reused across messages"""
+
+    def __init__(self, size: int, **smtp_options):
+        import aiosmtplib
+
+        self.size = size
+        self.smtp_options = smtp_options
+        self.idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self.idle.put_nowait(aiosmtplib.SMTP(**smtp_options))
+        self.connects = 0
+
+    async def acquire(self):
+        """Borrow a connected client; it is reconnected lazily if the server dropped it"""
+        smtp = await self.idle.get()
+        try:
+            if not smtp.is_connected:
+                await smtp.connect()
+                self.connects += 1
+        except BaseException:
+            self.idle.put_nowait(smtp)
+            raise
+        return smtp
+
+    def release(self, smtp):
+        self.idle.put_nowait(smtp)
+
+    async def close(self):
+        while not self.idle.empty():
+            smtp = self.idle.get_nowait()
+            if smtp.is_connected:
+                with contextlib.suppress(Exception):
+                    await smtp.quit()
+
+
+class DomainThrottle:
+    """Per-recipient-domain concurrency limit and minimum spacing between sends"""
+
+    def __init__(self, concurrency: int = DEFAULT_DOMAIN_CONCURRENCY, rate: float = DEFAULT_DOMAIN_RATE):
+        self.concurrency = concurrency
+        self.interval = 1.0 / rate if rate else 0.0
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.next_slot: Dict[str, float] = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, domain: str):
+        semaphore = self.semaphores.setdefault(domain, asyncio.Semaphore(self.concurrency))
+        async with semaphore:
+            # Reserve the next start time for this domain, then wait for it
+            now = time.monotonic()
+            start = max(now, self.next_slot.get(domain, now))
+            self.next_slot[domain] = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+def load_recipients(recipients_file: str) -> Dict[str, str]:
+    """
+    Read speaker_id → email address from a CSV with `speaker_id` and `email` columns
+
+    Speaker pages carry no addresses, so recipients come from the CRM export.
+    """
+    path = Path(recipients_file)
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return {row['speaker_id']: row['email'].strip() for row in csv.DictReader(f) if row.get('email')}
+
+
+def build_message(speaker: Dict, recipient: str, sender: str, message_id: str) -> EmailMessage:
+    """Plain-text message for one speaker's generated email"""
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = speaker['email_subject']
+    message['Message-ID'] = message_id
+    message.set_content(speaker['email_body'])
+    return message
+
+
+async def send_all_emails(input_file: str = "out/speakers_with_emails.json",
+                          recipients_file: str = "in/recipients.csv",
+                          ledger_path: str = "out/send_log.db",
+                          connections: int = DEFAULT_CONNECTIONS,
+                          domain_concurrency: int = DEFAULT_DOMAIN_CONCURRENCY,
+                          domain_rate: float = DEFAULT_DOMAIN_RATE):
+    """
+    Send every generated email that has not been sent before
+
+    Args:
+        input_file: Stage 2 output (.json or .jsonl)
+        recipients_file: CSV mapping speaker_id to email address
+        ledger_path: SQLite send ledger
+        connections: Persistent SMTP connections (also the global concurrency cap)
+        domain_concurrency: Concurrent sends per recipient domain
+        domain_rate: Maximum messages per second per recipient domain
+
+    Returns:
+        Send counts by status
+    """
+    import aiosmtplib
+
+    print("=" * 70)
+    print("STAGE 4: EMAIL DELIVERY")
+    print("=" * 70)
+
+    load_dotenv()
+    sender = os.getenv("SMTP_FROM", "gtm@localhost")
+    smtp_options = {
+        "hostname": os.getenv("SMTP_HOST", "localhost"),
+        "port": int(os.getenv("SMTP_PORT", "1025")),
+        "username": os.getenv("SMTP_USERNAME") or None,
+        "password": os.getenv("SMTP_PASSWORD") or None,
+        "start_tls": os.getenv("SMTP_STARTTLS", "").lower() in ("1", "true", "yes"),
+        "timeout": 30
+    }
+    # Sink testing only: address speakers without a CRM address as <speaker_id>@<domain>
+    test_domain = os.getenv("SMTP_TEST_DOMAIN")
+
+    input_path = Path(input_file)
+    if not input_path.exists():
+        print(f"❌ Input file not found: {input_path}")
+        print("   Please run stage 2 first: python main.py --generate")
+        return {}
+
+    recipients = load_recipients(recipients_file)
+    ledger = SendLedger(ledger_path)
+
+    messages = []
+    no_address = 0
+    for speaker in iter_records(input_path):
+        if not (speaker.get('email_subject') and speaker.get('email_body')):
+            continue
+        speaker_id = speaker['speaker_id']
+        recipient = recipients.get(speaker_id) or (f"{speaker_id}@{test_domain}" if test_domain else None)
+        if not recipient:
+            no_address += 1
+            continue
+        domain = recipient.rsplit('@', 1)[-1].lower()
+        # Stable per speaker and email content, so retries of the same email keep one Message-ID
+        message_id = f"<{speaker_id}.{stable_hash(speaker['email_subject'], speaker['email_body'])}@{sender.rsplit('@', 1)[-1]}>"
+        messages.append((speaker, recipient, domain, message_id))
+
+    print(f"📬 {len(messages)} emails with recipients ({no_address} without an address in {recipients_file})")
+    print(f"   SMTP {smtp_options['hostname']}:{smtp_options['port']} | {connections} connections | "
+          f"{domain_concurrency} per domain at ≤{domain_rate:g}/s")
+
+    settled = ledger.settled_ids()
+    pending = [item for item in messages if item[0]['speaker_id'] not in settled]
+    skipped = len(messages) - len(pending)
+
+    pool = SMTPPool(connections, **smtp_options)
+    throttle = DomainThrottle(domain_concurrency, domain_rate)
+    unreachable = 0
+    attempted = 0
+    undelivered = 0
+
+    async def deliver(speaker: Dict, recipient: str, domain: str, message_id: str):
+        nonlocal skipped, unreachable, attempted, undelivered
+        speaker_id = speaker['speaker_id']
+        message = build_message(speaker, recipient, sender, message_id)
+
+        async with throttle.slot(domain):
+            try:
+                smtp = await pool.acquire()
+            except (aiosmtplib.SMTPException, OSError):
+                # Nothing was claimed, so the next run retries this speaker
+                unreachable += 1
+                return
+
+            try:
+                # Claim only once a connection is ready, so a crash leaves few sends in doubt
+                if not ledger.claim(speaker_id, recipient, message_id):
+                    skipped += 1
+                    return
+                attempted += 1
+                await smtp.send_message(message)
+                ledger.record(speaker_id, STATUS_SENT, 250)
+            except aiosmtplib.SMTPRecipientsRefused as e:
+                undelivered += 1
+                refusal = e.recipients[0]
+                status = STATUS_BOUNCED if refusal.code >= 500 else STATUS_FAILED
+                ledger.record(speaker_id, status, refusal.code, refusal.message)
+            except aiosmtplib.SMTPResponseException as e:
+                undelivered += 1
+                status = STATUS_BOUNCED if e.code >= 500 else STATUS_FAILED
+                ledger.record(speaker_id, status, e.code, e.message)
+            except (aiosmtplib.SMTPException, OSError) as e:
+                # Connection-level problem: the pooled client reconnects on next use
+                undelivered += 1
+                ledger.record(speaker_id, STATUS_FAILED, None, str(e))
+            finally:
+                pool.release(smtp)
+
+    start_time = time.time()
+    try:
+        await asyncio.gather(*(deliver(*item) for item in pending))
+    finally:
+        await pool.close()
+        elapsed = time.time() - start_time
+
+    counts = ledger.counts()
+    failures = ledger.failures()
+    ledger.close()
+    run_ledger.record(items=attempted, errors=undelivered, skipped=skipped, unreachable=unreachable,
+                      connections=pool.connects)
+
+    print("\n" + "=" * 70)
+    print("✅ DELIVERY COMPLETE")
+    print(f"   Time: {elapsed:.1f} seconds | Attempted: {attempted} "
+          f"({attempted / elapsed * 60 if elapsed else 0:.0f}/min over {pool.connects} connections)")
+    print(f"   Skipped (already sent, bounced or in doubt): {skipped}")
+    if unreachable:
+        print(f"   ⚠️  {unreachable} not attempted: could not connect to the SMTP server (rerun to retry)")
+    print(f"   Ledger: {counts}")
+    for failure in failures[:10]:
+        print(f"   ⚠️  {failure['status']}: {failure['recipient']} ({failure['smtp_code']}) {failure['error']}")
+    print(f"\n💾 Send ledger: {ledger_path}")
+    print("=" * 70)
+
+    return counts
+
+
+if __name__ == "__main__":
+    asyncio.run(send_all_emails())
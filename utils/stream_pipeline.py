@@ -0,0 +1,87 @@
+"""
+Streaming pipeline: parse → enrich → classify → email → JSONL at a fixed memory ceiling
+Speakers flow through async generators in small batches and are written out as soon
+as they are done, so memory does not grow with the size of the speaker directory
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+from .parser import SpeakerParser
+from .enrichment import CompanyEnricher, compact_record
+from .classifier import CompanyClassifier
+from .email_generator import EmailGenerator
+from .streaming import iter_jsonl
+from . import run_ledger
+
+
+async def run_streaming(output_file: str = "out/speakers_with_emails.jsonl", resume=False, batch_size=10,
+                        scraped_pages_dir: str = "in/scraped_pages"):
+    """
+    Run stages 1 and 2 as one stream, appending finished speakers to a JSONL file
+
+    Args:
+        output_file: JSONL output (one speaker per line)
+        resume: Skip speakers already present in output_file
+        batch_size: Speakers in flight per step
+        scraped_pages_dir: Root of the scraped speaker pages
+    """
+    print("=" * 70)
+    print("STREAMING PIPELINE: CLASSIFICATION + EMAIL GENERATION")
+    print("=" * 70)
+
+    output_path = Path(output_file)
+    done_ids = set()
+    if resume and output_path.exists():
+        done_ids = {record.get('speaker_id') for record in iter_jsonl(output_path)}
+        print(f"📂 Resuming: {len(done_ids)} speakers already in {output_path}")
+    elif output_path.exists():
+        output_path.unlink()
+
+    parser = SpeakerParser(scraped_pages_dir)
+    enricher = CompanyEnricher()
+    classifier = CompanyClassifier()
+    generator = EmailGenerator()
+    # Panels must be known before the first email, so a first pass over the pages indexes
+    # the sessions (only titles and co-panelist names/companies are kept)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    generator.add_sessions(parser.save_session_index(parser.iter_speakers(), output_path.parent / "sessions.json"))
+
+    speakers = (s for s in parser.iter_speakers() if s['speaker_id'] not in done_ids)
+    enriched = enricher.iter_enriched(speakers, batch_size=batch_size)
+    classified = classifier.iter_classified(enriched, batch_size=batch_size)
+    with_emails = generator.iter_emails(classified, batch_size=batch_size)
+
+    start_time = time.time()
+    processed = 0
+    emails = 0
+    with open(output_path, 'a', encoding='utf-8') as f:
+        async for speaker in with_emails:
+            f.write(json.dumps(compact_record(speaker), ensure_ascii=False) + "\n")
+            f.flush()
+            processed += 1
+            if speaker.get('email_subject'):
+                emails += 1
+
+    enricher.flush()
+    classifier.flush()
+
+    elapsed = time.time() - start_time
+    print("\n" + "=" * 70)
+    print("✅ STREAMING RUN COMPLETE")
+    print(f"   Time: {elapsed:.1f} seconds ({elapsed/60:.1f} minutes)")
+    print(f"   Processed: {processed} speakers | Emails: {emails}")
+    print(f"   Classification tokens: {classifier.usage.summary()}")
+    print(f"   Email tokens: {generator.usage.summary()}")
+    run_ledger.record(clients=[classifier, generator], items=processed, tavily_searches=enricher.searches,
+                      tavily_hits=enricher.cache_hits, batch_size=batch_size)
+    print(f"\n💾 Results appended to {output_path}")
+    print("=" * 70)
+
+    return output_path
+
+
+if __name__ == "__main__":
+    asyncio.run(run_streaming(resume="--resume" in sys.argv))
@@ -0,0 +1,105 @@
+"""
+Streaming helpers for bounded-memory runs
+Incremental readers for JSON array / JSONL stage files and async batching of iterables
+"""
+import asyncio
+import json
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Union
+
+
+def iter_json_array(path: Union[str, Path], chunk_size: int = 65536) -> Iterator[Dict]:
+    """
+    Yield the elements of a top-level JSON array without loading the whole file
+
+    Only one element (plus a read chunk) is held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path} does not contain a JSON array")
+        buffer = buffer[1:]
+        eof = False
+
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(','):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith(']'):
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer)
+                # A scalar cut at the chunk boundary ("45" of "456", "-3.2" of "-3.2e5") decodes
+                # as well, so an element is complete only once the delimiter after it is read
+                complete = buffer[end:].lstrip()[:1] in (',', ']')
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+
+            if not complete:
+                if eof:
+                    raise ValueError(f"{path} does not contain a complete JSON array")
+                # Element spans the chunk boundary; read more and retry
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+
+            yield item
+            buffer = buffer[end:]
+
+
+def iter_jsonl(path: Union[str, Path]) -> Iterator[Dict]:
+    """Yield one record per non-empty line of a JSONL file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_records(path: Union[str, Path]) -> Iterator[Dict]:
+    """Yield records from a stage file (.jsonl, or a .json array) incrementally"""
+    if Path(path).suffix == '.jsonl':
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+async def abatch(items: Union[Iterable, AsyncIterable], size: int, delay: float = 0.0) -> AsyncIterator[List]:
+    """
+    Group a sync or async iterable into lists of `size`
+
+    Args:
+        items: Source iterable (consumed lazily)
+        size: Batch size
+        delay: Seconds to wait between batches (rate limiting)
+    """
+    batch = []
+    first = True
+
+    async def flush():
+        nonlocal first
+        if not first and delay:
+            await asyncio.sleep(delay)
+        first = False
+
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            batch.append(item)
+            if len(batch) == size:
+                await flush()
+                yield batch
+                batch = []
+    else:
+        for item in items:
+            batch.append(item)
+            if len(batch) == size:
+                await flush()
+                yield batch
+                batch = []
+
+    if batch:
+        await flush()
+        yield batch
@@ -0,0 +1,179 @@
+"""
+Schema-enforced structured outputs for both LLM providers
+OpenAI calls use a strict JSON-schema response format and Anthropic calls use a
+forced tool call. Every reply is validated locally. Invalid or truncated replies
+get a targeted re-ask that quotes the errors, and a reply that is still invalid
+raises StructuredOutputError instead of silently becoming a default value.
+"""
+import json
+from typing import Callable, Dict, List, Optional
+
+
+MAX_REASKS = 2
+
+CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string", "enum": ["Builder", "Owner", "Partner", "Competitor", "Customer", "Other"]},
+        "reasoning": {"type": "string", "description": "One sentence explaining the classification"},
+        "confidence": {"type": "number", "description": "Between 0.0 and 1.0"}
+    },
+    "required": ["category", "reasoning", "confidence"],
+    "additionalProperties": False
+}
+
+EMAIL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "subject": {"type": "string", "description": "Email subject line"},
+        "body": {"type": "string", "description": "Email body text, 3-4 sentences"}
+    },
+    "required": ["subject", "body"],
+    "additionalProperties": False
+}
+
+_TYPES = {"object": dict, "string": str, "number": (int, float), "integer": int, "boolean": bool, "array": list}
+
+
+class StructuredOutputError(Exception):
+    """A model reply that still violates its schema after all re-asks"""
+
+
+def validate(value, schema: Dict, path: str = "$") -> List[str]:
+    """
+    Check a value against the JSON-schema subset used here (type, enum, properties,
+    required, additionalProperties, items)
+
+    Returns:
+        List of error messages (empty if valid)
+    """
+    expected = schema.get("type")
+    if expected and (not isinstance(value, _TYPES[expected]) or (expected != "boolean" and isinstance(value, bool))):
+        return [f"{path} must be a {expected}"]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path} must be one of {schema['enum']}")
+
+    if expected == "object":
+        properties = schema.get("properties", {})
+        for name in schema.get("required", []):
+            if name not in value:
+                errors.append(f"{path}.{name} is required")
+        for name, item in value.items():
+            if name in properties:
+                errors.extend(validate(item, properties[name], f"{path}.{name}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}.{name} is not allowed")
+    elif expected == "array" and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def _reask_text(errors: List[str]) -> str:
+    return ("Your previous answer was invalid:\n- " + "\n- ".join(errors)
+            + "\nReply again with a corrected answer that fixes only these problems.")
+
+
+async def request_structured(llm, *, system: str, instructions: str, context: str, name: str,
+                             description: str, schema: Dict, max_tokens: int,
+                             check: Optional[Callable[[Dict], List[str]]] = None) -> Dict:
+    """
+    Ask the configured provider for an object matching `schema`
+
+    Args:
+        llm: CompanyClassifier or EmailGenerator (provides llm_client, _call_llm, usage,
+            model names, TEMPERATURE and a `reasks` counter)
+        system: System prompt
+        instructions: Static task instructions (sent first so providers can cache them)
+        context: Per-item part of the prompt
+        name: Schema / tool name
+        description: Tool description (Anthropic)
+        schema: JSON schema of the expected object
+        max_tokens: Output token cap for the task (doubled when a reply is truncated)
+        check: Optional semantic validation returning error messages
+
+    Returns:
+        The validated object
+
+    Raises:
+        StructuredOutputError: If the reply is still invalid after MAX_REASKS re-asks
+    """
+    openai = hasattr(llm.llm_client, 'chat')
+    if openai:
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": f"{instructions}\n\n{context}"}
+        ]
+    else:
+        messages = [{"role": "user", "content": context}]
+
+    errors: List[str] = []
+    for attempt in range(MAX_REASKS + 1):
+        if attempt:
+            llm.reasks += 1
+        if openai:
+            response = await llm._call_llm(
+                llm.llm_client.chat.completions.create,
+                model=llm.OPENAI_MODEL,
+                messages=messages,
+                temperature=llm.TEMPERATURE,
+                max_completion_tokens=max_tokens,
+                response_format={"type": "json_schema",
+                                 "json_schema": {"name": name, "strict": True, "schema": schema}}
+            )
+            llm.usage.record(response)
+            choice = response.choices[0]
+            content = choice.message.content or ""
+            if getattr(choice.message, 'refusal', None):
+                raise StructuredOutputError(f"Model refused: {choice.message.refusal}")
+            truncated = choice.finish_reason == "length"
+            try:
+                result = json.loads(content)
+            except json.JSONDecodeError as e:
+                result, errors = None, [f"reply is not valid JSON ({e.msg})"]
+            messages = messages + [{"role": "assistant", "content": content}]
+        else:
+            response = await llm._call_llm(
+                llm.llm_client.messages.create,
+                model=llm.ANTHROPIC_MODEL,
+                # Instructions go in a cached system block; only the per-item context varies
+                system=[
+                    {"type": "text", "text": f"{system}\n\n{instructions}",
+                     "cache_control": {"type": "ephemeral"}}
+                ],
+                messages=messages,
+                tools=[{"name": name, "description": description, "input_schema": schema}],
+                tool_choice={"type": "tool", "name": name},
+                temperature=llm.TEMPERATURE,
+                max_tokens=max_tokens
+            )
+            llm.usage.record(response)
+            truncated = response.stop_reason == "max_tokens"
+            tool_use = next((block for block in response.content if block.type == "tool_use"), None)
+            result = tool_use.input if tool_use is not None else None
+            if tool_use is None:
+                errors = [f"reply did not call the {name} tool"]
+            messages = messages + [{"role": "assistant", "content": response.content}]
+
+        if result is not None:
+            errors = validate(result, schema)
+            if not errors and check:
+                errors = check(result)
+        if not errors:
+            return result
+        if truncated:
+            errors = ["reply was cut off at the output token limit; answer more briefly"] + errors
+            max_tokens *= 2
+
+        if openai:
+            messages.append({"role": "user", "content": _reask_text(errors)})
+        elif tool_use is not None:
+            messages.append({"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": tool_use.id, "is_error": True, "content": _reask_text(errors)}
+            ]})
+        else:
+            messages.append({"role": "user", "content": _reask_text(errors)})
+
+    raise StructuredOutputError("; ".join(errors))
@@ -0,0 +1,80 @@
+"""
+Token accounting for LLM calls, including provider prompt-cache hits
+"""
+from typing import Dict
+
+
+class TokenUsage:
+    """Accumulate input/output tokens and cached vs uncached input per client"""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.cache_write_tokens = 0
+        self.output_tokens = 0
+        self.latency_seconds = 0.0
+
+    def record(self, response) -> Dict:
+        """
+        Record the usage block of an OpenAI or Anthropic response
+
+        Returns:
+            Dictionary with this call's input, cached_input, cache_write and output tokens
+        """
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return {}
+
+        if hasattr(usage, 'prompt_tokens'):  # OpenAI (caching is automatic for long prefixes)
+            details = getattr(usage, 'prompt_tokens_details', None)
+            cached = getattr(details, 'cached_tokens', 0) or 0
+            call = {
+                "input": usage.prompt_tokens,
+                "cached_input": cached,
+                "cache_write": 0,
+                "output": usage.completion_tokens
+            }
+        else:  # Anthropic (input_tokens excludes cache reads/writes)
+            cached = getattr(usage, 'cache_read_input_tokens', 0) or 0
+            written = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+            call = {
+                "input": usage.input_tokens + cached + written,
+                "cached_input": cached,
+                "cache_write": written,
+                "output": usage.output_tokens
+            }
+
+        self.calls += 1
+        self.input_tokens += call["input"]
+        self.cached_input_tokens += call["cached_input"]
+        self.cache_write_tokens += call["cache_write"]
+        self.output_tokens += call["output"]
+        return call
+
+    def record_latency(self, seconds: float):
+        """Add the wall time of one provider request (measured around the SDK call)"""
+        self.latency_seconds += seconds
+
+    @property
+    def uncached_input_tokens(self) -> int:
+        return self.input_tokens - self.cached_input_tokens
+
+    def summary(self) -> str:
+        """One-line description of token usage"""
+        if not self.calls:
+            return "no LLM calls"
+        hit_rate = self.cached_input_tokens * 100 // self.input_tokens if self.input_tokens else 0
+        return (f"{self.calls} calls | input {self.input_tokens:,} tokens "
+                f"({self.cached_input_tokens:,} cached, {hit_rate}%) | output {self.output_tokens:,} tokens")
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+            "uncached_input_tokens": self.uncached_input_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_seconds": round(self.latency_seconds, 3)
+        }
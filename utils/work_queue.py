@@ -0,0 +1,376 @@
+"""
+Lease-based work queue for multi-process / multi-host execution
+Work items (speaker_id x stage) live in a SQLite database; workers lease batches,
+heartbeat while processing, and expired leases are handed to other workers
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .enrichment import compact_record
+from . import run_ledger
+from .scheduler import TARGET_CATEGORIES, prioritize_speakers
+
+
+STAGE_CLASSIFY = "classify"
+STAGE_EMAIL = "email"
+
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+# Local workers run this script with the current interpreter, whatever the working directory
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+
+
+class WorkQueue:
+    """SQLite-backed queue of (speaker_id, stage) work items with leases"""
+
+    def __init__(self, db_path: str = "out/work_queue.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_items (
+                speaker_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                payload TEXT NOT NULL,
+                result TEXT,
+                worker_id TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL,
+                PRIMARY KEY (speaker_id, stage)
+            )
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, stage: str, items: List[Tuple[str, Dict]], priority_start: int = 0) -> int:
+        """
+        Add work items (ignored if already queued)
+
+        Args:
+            stage: Stage name
+            items: List of (speaker_id, payload) in processing order
+            priority_start: Priority of the first item (lower runs first)
+
+        Returns:
+            Number of newly queued items
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO work_items (speaker_id, stage, priority, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(speaker_id, stage, priority_start + i, json.dumps(payload), now)
+                 for i, (speaker_id, payload) in enumerate(items)]
+            )
+            added = self.conn.total_changes - before
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease(self, stage: str, worker_id: str, limit: int = 10,
+              lease_seconds: float = LEASE_SECONDS) -> List[Tuple[str, Dict]]:
+        """Atomically lease up to `limit` pending (or expired) items of a stage"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases with no attempts left will never be picked up again
+            self.conn.execute("""
+                UPDATE work_items SET status = 'failed', error = 'lease expired', worker_id = NULL, updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, now, MAX_ATTEMPTS))
+            rows = self.conn.execute("""
+                SELECT speaker_id, payload FROM work_items
+                WHERE stage = ? AND attempts < ?
+                  AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                ORDER BY priority LIMIT ?
+            """, (stage, MAX_ATTEMPTS, now, limit)).fetchall()
+            self.conn.executemany("""
+                UPDATE work_items SET status = 'leased', worker_id = ?, lease_expires = ?,
+                       attempts = attempts + 1, updated_at = ?
+                WHERE speaker_id = ? AND stage = ?
+            """, [(worker_id, now + lease_seconds, now, speaker_id, stage) for speaker_id, _ in rows])
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [(speaker_id, json.loads(payload)) for speaker_id, payload in rows]
+
+    def heartbeat(self, worker_id: str, lease_seconds: float = LEASE_SECONDS):
+        """Extend every lease held by a worker"""
+        now = time.time()
+        self.conn.execute(
+            "UPDATE work_items SET lease_expires = ?, updated_at = ? WHERE worker_id = ? AND status = 'leased'",
+            (now + lease_seconds, now, worker_id)
+        )
+
+    def complete(self, speaker_id: str, stage: str, worker_id: str, result: Dict) -> bool:
+        """
+        Store an item's result; classified Builders/Owners get an email item queued
+
+        Returns:
+            False if the worker no longer holds the lease (the result is dropped)
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = self.conn.execute("""
+                UPDATE work_items SET status = 'done', result = ?, lease_expires = NULL, error = NULL, updated_at = ?
+                WHERE speaker_id = ? AND stage = ? AND worker_id = ? AND status = 'leased'
+            """, (json.dumps(result), now, speaker_id, stage, worker_id)).rowcount
+            if updated and stage == STAGE_CLASSIFY and result.get('category') in TARGET_CATEGORIES:
+                priority = self.conn.execute(
+                    "SELECT priority FROM work_items WHERE speaker_id = ? AND stage = ?", (speaker_id, stage)
+                ).fetchone()[0]
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO work_items (speaker_id, stage, priority, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (speaker_id, STAGE_EMAIL, priority, json.dumps(result), now)
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return bool(updated)
+
+    def fail(self, speaker_id: str, stage: str, worker_id: str, error: str) -> bool:
+        """
+        Release an item for retry (or mark it failed once attempts are exhausted)
+
+        Returns:
+            False if the worker no longer holds the lease (the item is left alone)
+        """
+        return bool(self.conn.execute("""
+            UPDATE work_items
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                error = ?, worker_id = NULL, lease_expires = NULL, updated_at = ?
+            WHERE speaker_id = ? AND stage = ? AND worker_id = ? AND status = 'leased'
+        """, (MAX_ATTEMPTS, error, time.time(), speaker_id, stage, worker_id)).rowcount)
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Item counts by stage and status"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for stage, status, count in self.conn.execute(
+            "SELECT stage, status, COUNT(*) FROM work_items GROUP BY stage, status"
+        ):
+            counts.setdefault(stage, {})[status] = count
+        return counts
+
+    def has_open_work(self) -> bool:
+        """True while any item is pending or leased"""
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM work_items WHERE status IN ('pending', 'leased')"
+        ).fetchone()
+        return row[0] > 0
+
+    def payloads(self, stage: str) -> List[Dict]:
+        """Input payload of every item of a stage, in priority order"""
+        return [
+            json.loads(payload)
+            for payload, in self.conn.execute(
+                "SELECT payload FROM work_items WHERE stage = ? ORDER BY priority", (stage,)
+            )
+        ]
+
+    def results(self, stage: str) -> Dict[str, Dict]:
+        """Completed results of a stage by speaker_id"""
+        return {
+            speaker_id: json.loads(result)
+            for speaker_id, result in self.conn.execute(
+                "SELECT speaker_id, result FROM work_items WHERE stage = ? AND status = 'done' ORDER BY priority",
+                (stage,)
+            )
+        }
+
+
+async def _heartbeat_loop(queue: WorkQueue, worker_id: str):
+    """Keep this worker's leases alive while it processes a batch"""
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        queue.heartbeat(worker_id)
+
+
+async def run_worker(db_path: str = "out/work_queue.db", batch_size: int = 10, poll_interval: float = 2.0):
+    """
+    Pull classify and email items until the queue is drained
+
+    Several workers (processes or hosts sharing the filesystem) can run against one queue.
+    """
+    from .enrichment import CompanyEnricher
+    from .classifier import CompanyClassifier
+    from .email_generator import EmailGenerator
+    from .fingerprint import email_fingerprint
+    from .parser import build_session_index
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(db_path)
+    enricher = CompanyEnricher()
+    classifier = CompanyClassifier()
+    generator = EmailGenerator()
+    # Every speaker is queued for classification, so the queue knows all panels
+    generator.add_sessions(build_session_index(queue.payloads(STAGE_CLASSIFY)))
+    heartbeat = asyncio.ensure_future(_heartbeat_loop(queue, worker_id))
+    processed = 0
+    errors = 0
+
+    print(f"👷 Worker {worker_id} started on {db_path}")
+
+    try:
+        while True:
+            # Emails first: they finish work that has already been paid for
+            stage = STAGE_EMAIL
+            items = queue.lease(STAGE_EMAIL, worker_id, limit=batch_size)
+            if not items:
+                stage = STAGE_CLASSIFY
+                items = queue.lease(STAGE_CLASSIFY, worker_id, limit=batch_size)
+
+            if not items:
+                if not queue.has_open_work():
+                    break
+                # Other workers still hold leases that may expire back to us
+                await asyncio.sleep(poll_interval)
+                continue
+
+            speaker_ids = [speaker_id for speaker_id, _ in items]
+            payloads = [payload for _, payload in items]
+            try:
+                if stage == STAGE_CLASSIFY:
+                    enriched = await enricher.enrich_speakers_batch(payloads)
+                    results = await classifier.classify_batch(enriched, batch_size=batch_size)
+                else:
+                    results = await generator.generate_emails_batch(payloads, batch_size=batch_size)
+            except Exception as e:
+                print(f"Error processing {stage} batch: {e}")
+                for speaker_id in speaker_ids:
+                    queue.fail(speaker_id, stage, worker_id, str(e))
+                errors += len(speaker_ids)
+                continue
+
+            stale = 0
+            for speaker_id, result in zip(speaker_ids, results):
+                error = result.get('classification_error' if stage == STAGE_CLASSIFY else 'email_error')
+                # Same fingerprints as the batch stages, so a later --incremental run reuses these results
+                if not error and stage == STAGE_CLASSIFY:
+                    result['classification_fingerprint'] = classifier.input_fingerprint(result)
+                elif not error and result.get('email_subject'):
+                    result['email_fingerprint'] = email_fingerprint(result, generator)
+                if error:
+                    # Invalid model output: release the item for another attempt
+                    held = queue.fail(speaker_id, stage, worker_id, error)
+                    errors += held
+                else:
+                    held = queue.complete(speaker_id, stage, worker_id, compact_record(result))
+                # Our lease expired and the item went to another worker: that worker's result counts
+                stale += not held
+            if stale:
+                print(f"⚠️ Dropped {stale} {stage} results whose lease expired")
+            processed += len(results) - stale
+    finally:
+        heartbeat.cancel()
+        queue.close()
+        enricher.flush()
+        classifier.flush()
+        run_ledger.record(clients=[classifier, generator], items=processed, errors=errors,
+                          tavily_searches=enricher.searches, tavily_hits=enricher.cache_hits,
+                          batch_size=batch_size, worker_id=worker_id)
+
+    print(f"👷 Worker {worker_id} finished ({processed} items)")
+    return processed
+
+
+def merge_results(queue: WorkQueue) -> List[Dict]:
+    """
+    Write queue results to the stage output files read by stage 2/3
+
+    Returns:
+        Merged speaker records (classified, with emails where generated)
+    """
+    classified = queue.results(STAGE_CLASSIFY)
+    emails = queue.results(STAGE_EMAIL)
+
+    all_results = []
+    for speaker_id, speaker in classified.items():
+        email = emails.get(speaker_id, {})
+        speaker['email_subject'] = email.get('email_subject', speaker.get('email_subject', ''))
+        speaker['email_body'] = email.get('email_body', speaker.get('email_body', ''))
+        if email.get('email_fingerprint'):
+            speaker['email_fingerprint'] = email['email_fingerprint']
+        all_results.append(speaker)
+
+    with open(Path("out/speakers_classified.json"), 'w') as f:
+        json.dump(all_results, f, indent=2)
+    with open(Path("out/speakers_with_emails.json"), 'w') as f:
+        json.dump(all_results, f, indent=2)
+
+    return all_results
+
+
+def run_distributed(workers: int = 4, db_path: str = "out/work_queue.db",
+                    scraped_pages_dir: str = "in/scraped_pages") -> List[Dict]:
+    """
+    Queue all speakers, run local worker processes until drained, and merge results
+
+    Extra workers on other hosts can join with `python main.py --worker --queue <db_path>`.
+    """
+    from .parser import SpeakerParser
+
+    print("=" * 70)
+    print(f"DISTRIBUTED RUN: {workers} local workers")
+    print("=" * 70)
+
+    queue = WorkQueue(db_path)
+    parser = SpeakerParser(scraped_pages_dir)
+    speakers = parser.parse_all_speakers()
+    # Stage 2 and QA read the same index the workers build from the queue
+    parser.save_session_index(speakers, Path("out/sessions.json"))
+    speakers = prioritize_speakers(speakers)
+    added = queue.enqueue(STAGE_CLASSIFY, [(s['speaker_id'], s) for s in speakers])
+    print(f"📋 Queued {added} new speakers ({len(speakers)} total) in {db_path}")
+
+    start_time = time.time()
+    processes = [
+        subprocess.Popen([sys.executable, str(MAIN_SCRIPT), "--worker", "--queue", db_path])
+        for _ in range(workers)
+    ]
+
+    while any(p.poll() is None for p in processes):
+        time.sleep(5)
+        counts = queue.counts()
+        classify = counts.get(STAGE_CLASSIFY, {})
+        email = counts.get(STAGE_EMAIL, {})
+        print(f"📊 Classified: {classify.get('done', 0)}/{sum(classify.values())} | "
+              f"Emails: {email.get('done', 0)}/{sum(email.values())} | "
+              f"Elapsed: {time.time() - start_time:.0f}s")
+
+    all_results = merge_results(queue)
+    failed = sum(stage_counts.get('failed', 0) for stage_counts in queue.counts().values())
+    queue.close()
+    # Token usage and latency are recorded by each worker process in its own run
+    run_ledger.record(items=len(all_results), errors=failed, workers=workers)
+
+    print("\n" + "=" * 70)
+    print("✅ DISTRIBUTED RUN COMPLETE")
+    print(f"   Time: {time.time() - start_time:.1f} seconds")
+    print(f"   Classified: {len(all_results)} | Emails: {sum(1 for s in all_results if s.get('email_subject'))}")
+    if failed:
+        print(f"   ⚠️ Failed items: {failed} (see error column in {db_path})")
+    print("=" * 70)
+
+    return all_results